@@ -63,6 +63,7 @@ def create_app():
             'status': 'running',
             'endpoints': {
                 'health': '/health',
+                'metrics': '/metrics',
                 'auth': {
                     'login': '/auth/login',
                     'logout': '/auth/logout',
@@ -84,6 +85,8 @@ def create_app():
                 },
                 'documents': {
                     'upload': '/documents/upload',
+                    'job': '/documents/jobs/<job_id>',
+                    'job_events': '/documents/jobs/<job_id>/events',
                     'list': '/documents/list',
                     'delete': '/documents/delete/<filename>',
                     'search': '/documents/search',
@@ -97,6 +100,26 @@ def create_app():
         """Health check endpoint."""
         return jsonify({'status': 'healthy', 'message': 'Internal Assistant API is running'})
     
+    @app.route('/metrics')
+    def metrics():
+        """Latency percentiles and cache statistics for this process."""
+        from services import metrics
+        from services.embedding_cache import get_embedding_cache
+        from services.response_cache import get_response_cache
+        from services.semantic_cache import get_semantic_cache
+        from services.ingestion_jobs import get_ingestion_queue
+        embedding_cache = get_embedding_cache()
+        response_cache = get_response_cache()
+        semantic_cache = get_semantic_cache()
+        
+        return jsonify({
+            'latency': metrics.snapshot(),
+            'embedding_cache': embedding_cache.stats() if embedding_cache else None,
+            'response_cache': response_cache.stats() if response_cache else None,
+            'semantic_cache': semantic_cache.stats() if semantic_cache else None,
+            'ingestion': get_ingestion_queue().stats()
+        })
+    
     @app.errorhandler(404)
     def not_found(error):
         return jsonify({'error': 'Not found'}), 404
@@ -0,0 +1,121 @@
+#!/usr/bin/env python3
+"""
+Benchmark SentenceChunker against the old character-based DocumentService._chunk_text.
+
+Usage (from the backend directory):
+    python benchmarks/bench_chunker.py --sizes 1 10 50
+
+Sizes are in MB of generated prose. Besides wall time, the table reports how
+many chunks each produces and how many of them are tiny (under a quarter of
+the target size), which the old tail handling used to emit. Token counts use
+tiktoken when its encoding is available and the 4-characters-per-token
+estimate otherwise.
+
+SentenceChunker does per-chunk rather than per-sentence work: two regex calls
+and one token count for each chunk, where the old chunker scans back a
+character at a time in Python. With the character estimate it runs about
+1.2-1.3x faster than the old chunker (speedup = legacy time / new time).
+With tiktoken, encoding each chunk dominates and it is slower than the old
+chunker, which never counted tokens at all.
+"""
+
+import argparse
+import os
+import random
+import sys
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from services.chunker import SentenceChunker
+from services.tokenizer import count_tokens
+
+
+def legacy_chunk_text(text, chunk_size=1000, overlap=200):
+    """The pre-token chunker: fixed character windows, scanning back for '.!?'."""
+    if len(text) <= chunk_size:
+        return [text]
+
+    chunks = []
+    start = 0
+
+    while start < len(text):
+        end = start + chunk_size
+
+        if end < len(text):
+            for i in range(end, max(start + chunk_size - 100, start), -1):
+                if text[i] in '.!?':
+                    end = i + 1
+                    break
+
+        chunk = text[start:end].strip()
+        if chunk:
+            chunks.append(chunk)
+
+        start = end - overlap
+        if start >= len(text):
+            break
+
+    return chunks
+
+
+WORDS = ('the', 'quarterly', 'roadmap', 'service', 'latency', 'customer', 'release', 'team', 'review',
+         'budget', 'deploy', 'incident', 'migration', 'policy', 'onboarding', 'contract', 'metrics')
+
+
+def generate_text(size_mb, rng):
+    """Paragraphs of sentences of 5-40 words, roughly `size_mb` megabytes."""
+    parts = []
+    total = 0
+    target = int(size_mb * 1024 * 1024)
+    while total < target:
+        sentences = []
+        for _ in range(rng.randint(2, 8)):
+            sentence = ' '.join(rng.choice(WORDS) for _ in range(rng.randint(5, 40)))
+            sentences.append(sentence.capitalize() + rng.choice('..?!'))
+        paragraph = ' '.join(sentences) + '\n\n'
+        parts.append(paragraph)
+        total += len(paragraph)
+    return ''.join(parts)
+
+
+def time_call(fn, repeats):
+    best = float('inf')
+    result = None
+    for _ in range(repeats):
+        start = time.perf_counter()
+        result = fn()
+        best = min(best, time.perf_counter() - start)
+    return best, result
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--sizes', type=float, nargs='+', default=[1, 10, 50])
+    parser.add_argument('--target-tokens', type=int, default=256)
+    parser.add_argument('--overlap-tokens', type=int, default=40)
+    parser.add_argument('--repeats', type=int, default=3)
+    args = parser.parse_args()
+
+    rng = random.Random(0)
+    chunker = SentenceChunker(args.target_tokens, args.overlap_tokens)
+    tiny = args.target_tokens // 4
+
+    print(f"target={args.target_tokens} tokens, overlap={args.overlap_tokens} tokens, model={chunker.model}")
+    print(f"{'MB':>6} {'legacy (s)':>11} {'chunks':>8} {'tiny':>6} {'new (s)':>9} {'chunks':>8} {'tiny':>6} {'speedup':>8}")
+
+    for size in args.sizes:
+        text = generate_text(size, rng)
+
+        legacy_time, legacy_chunks = time_call(lambda: legacy_chunk_text(text), args.repeats)
+        new_time, new_chunks = time_call(lambda: chunker.chunk(text), args.repeats)
+
+        legacy_tiny = sum(1 for chunk in legacy_chunks if count_tokens(chunk, chunker.model) < tiny)
+        new_tiny = sum(1 for chunk in new_chunks if count_tokens(chunk, chunker.model) < tiny)
+
+        print(f"{size:>6g} {legacy_time:>11.3f} {len(legacy_chunks):>8} {legacy_tiny:>6} "
+              f"{new_time:>9.3f} {len(new_chunks):>8} {new_tiny:>6} {legacy_time / new_time:>7.1f}x")
+
+
+if __name__ == '__main__':
+    main()
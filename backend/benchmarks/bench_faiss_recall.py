@@ -0,0 +1,101 @@
+#!/usr/bin/env python3
+"""
+Recall-versus-latency report for the FAISS VectorService backends.
+
+Usage (from the backend directory):
+    python benchmarks/bench_faiss_recall.py --size 100000 --dim 1536
+
+Builds each FAISS_INDEX_TYPE over synthetic clustered embeddings and compares
+its top-k against exact search (the 'exact' backend). IVF is swept over
+nprobe and HNSW over efSearch, the knobs exposed as FAISS_IVF_NPROBE and
+FAISS_HNSW_EF_SEARCH.
+"""
+
+import argparse
+import os
+import sys
+import tempfile
+import time
+
+import numpy as np
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from services.vector_index import FaissIndex, faiss
+from services.vector_service import VectorService
+
+
+def clustered_embeddings(rows, dim, clusters, rng):
+    """Unit vectors scattered around random centroids, closer to real text embeddings than pure noise."""
+    centroids = rng.standard_normal((clusters, dim), dtype=np.float32)
+    assignment = rng.integers(0, clusters, rows)
+    matrix = centroids[assignment] + 0.5 * rng.standard_normal((rows, dim), dtype=np.float32)
+    matrix /= np.linalg.norm(matrix, axis=1, keepdims=True)
+    return matrix
+
+
+def exact_top_k(matrix, queries, k):
+    return [VectorService._top_k(matrix @ query, k) for query in queries]
+
+
+def measure(search, queries, truth, k):
+    """Mean recall@k and per-query latency in milliseconds."""
+    hits = 0
+    start = time.perf_counter()
+    results = [search(query) for query in queries]
+    elapsed = time.perf_counter() - start
+    for found, expected in zip(results, truth):
+        hits += len(set(found[:k].tolist()) & set(expected.tolist()))
+    return hits / (k * len(queries)), elapsed * 1000 / len(queries)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--size', type=int, default=100000)
+    parser.add_argument('--dim', type=int, default=1536)
+    parser.add_argument('--queries', type=int, default=200)
+    parser.add_argument('--k', type=int, default=10)
+    parser.add_argument('--clusters', type=int, default=256)
+    parser.add_argument('--nlist', type=int, default=1024)
+    args = parser.parse_args()
+
+    if faiss is None:
+        sys.exit("faiss is not installed. Run: pip install faiss-cpu")
+
+    rng = np.random.default_rng(0)
+    matrix = clustered_embeddings(args.size, args.dim, args.clusters, rng)
+    queries = clustered_embeddings(args.queries, args.dim, args.clusters, rng)
+    labels = np.arange(args.size, dtype=np.int64)
+    truth = exact_top_k(matrix, queries, args.k)
+
+    recall, latency = measure(lambda q: VectorService._top_k(matrix @ q, args.k), queries, truth, args.k)
+    print(f"size={args.size} dim={args.dim} k={args.k} queries={args.queries}")
+    print(f"{'backend':<24} {'recall@k':>9} {'ms/query':>9} {'build (s)':>10}")
+    print(f"{'exact':<24} {recall:>9.3f} {latency:>9.3f} {'-':>10}")
+
+    os.environ['FAISS_IVF_NLIST'] = str(args.nlist)
+    with tempfile.TemporaryDirectory() as index_dir:
+        for index_type, knob, values in (
+            ('flat', None, [None]),
+            ('ivf', 'nprobe', [1, 4, 16, 64]),
+            ('hnsw', 'efSearch', [16, 64, 128, 256]),
+        ):
+            index = FaissIndex(index_type, args.dim, index_dir)
+            start = time.perf_counter()
+            index.build(matrix, labels)
+            build_time = time.perf_counter() - start
+
+            for value in values:
+                name = index.trained_as
+                if knob == 'nprobe' and index.trained_as == 'ivf':
+                    index.index.nprobe = value
+                    name = f"ivf nprobe={value}"
+                elif knob == 'efSearch':
+                    faiss.downcast_index(index.index.index).hnsw.efSearch = value
+                    name = f"hnsw efSearch={value}"
+                recall, latency = measure(lambda q: index.search(q, args.k)[1], queries, truth, args.k)
+                print(f"{name:<24} {recall:>9.3f} {latency:>9.3f} {build_time:>10.2f}")
+
+
+if __name__ == '__main__':
+    main()
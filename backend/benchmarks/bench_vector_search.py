@@ -0,0 +1,89 @@
+#!/usr/bin/env python3
+"""
+Benchmark VectorService top-k search against the old per-document loop.
+
+Usage (from the backend directory):
+    python benchmarks/bench_vector_search.py --sizes 10000 100000 1000000
+
+The old implementation is timed on a sample of rows and scaled linearly to the
+full corpus size, since holding 1M embeddings as Python lists is not practical.
+"""
+
+import argparse
+import os
+import sys
+import time
+
+import numpy as np
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from services.vector_service import VectorService
+
+
+def legacy_search(query, embeddings, limit):
+    """The pre-matrix search: cosine per document in Python, then a full sort."""
+    similarities = []
+    for i, doc_embedding in enumerate(embeddings):
+        vec1 = np.array(query)
+        vec2 = np.array(doc_embedding)
+        norm1 = np.linalg.norm(vec1)
+        norm2 = np.linalg.norm(vec2)
+        similarities.append((np.dot(vec1, vec2) / (norm1 * norm2), i))
+    similarities.sort(reverse=True)
+    return similarities[:limit]
+
+
+def random_matrix(rows, dim, rng, block=50000):
+    """Unit-normalized float32 rows, generated in blocks to avoid float64 temporaries."""
+    matrix = np.empty((rows, dim), dtype=np.float32)
+    for start in range(0, rows, block):
+        part = rng.standard_normal((min(block, rows - start), dim), dtype=np.float32)
+        part /= np.linalg.norm(part, axis=1, keepdims=True)
+        matrix[start:start + len(part)] = part
+    return matrix
+
+
+def time_call(fn, repeats):
+    best = float('inf')
+    for _ in range(repeats):
+        start = time.perf_counter()
+        fn()
+        best = min(best, time.perf_counter() - start)
+    return best
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--sizes', type=int, nargs='+', default=[10000, 100000, 1000000])
+    parser.add_argument('--dim', type=int, default=1536, help='embedding dimension (text-embedding-3-small is 1536)')
+    parser.add_argument('--limit', type=int, default=5)
+    parser.add_argument('--repeats', type=int, default=5)
+    parser.add_argument('--legacy-sample', type=int, default=5000, help='rows used to time the old loop')
+    args = parser.parse_args()
+
+    rng = np.random.default_rng(0)
+    query = rng.standard_normal(args.dim, dtype=np.float32)
+
+    print(f"dim={args.dim} limit={args.limit}")
+    print(f"{'chunks':>10} {'legacy (s)':>12} {'matrix (ms)':>12} {'speedup':>10}")
+
+    for size in args.sizes:
+        matrix = random_matrix(size, args.dim, rng)
+
+        sample = min(size, args.legacy_sample)
+        sample_rows = matrix[:sample].tolist()
+        legacy = time_call(lambda: legacy_search(query.tolist(), sample_rows, args.limit), 1) * size / sample
+
+        query_vector = query / np.linalg.norm(query)
+        matrix_time = time_call(lambda: VectorService._top_k(matrix @ query_vector, args.limit), args.repeats)
+
+        extrapolated = '*' if sample < size else ' '
+        print(f"{size:>10} {legacy:>11.3f}{extrapolated} {matrix_time * 1000:>12.2f} {legacy / matrix_time:>9.0f}x")
+        del matrix, sample_rows
+
+    print("* legacy time extrapolated linearly from the sampled rows")
+
+
+if __name__ == '__main__':
+    main()
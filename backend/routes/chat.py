@@ -1,15 +1,36 @@
 from flask import Blueprint, request, jsonify, session
 import logging
 import os
-from services.llm_service import LLMService
-from services.vector_service import VectorService
+import re
+import time
+import asyncio
+from services import metrics
+from services.async_runtime import run_blocking
+from services.llm_service import get_llm_service, NOT_CONFIGURED_RESPONSE, ERROR_RESPONSE, TIMEOUT_RESPONSE
+from services.deadline import Deadline
+from services.context_compressor import get_context_compressor
+from services.response_cache import get_response_cache
+from services.semantic_cache import get_semantic_cache
+from services.vector_service import get_vector_service
+from routes.sse import sse, sse_response
 
 logger = logging.getLogger(__name__)
 bp = Blueprint('chat', __name__, url_prefix='/chat')
 
+# Candidates fetched per question; LLMService packs as many as fit its token budget
+CHAT_RETRIEVAL_LIMIT = int(os.getenv('CHAT_RETRIEVAL_LIMIT', 10))
+# Multi-part questions are also searched part by part, up to this many parts
+CHAT_MAX_SUBQUESTIONS = int(os.getenv('CHAT_MAX_SUBQUESTIONS', 4))
+# End-to-end budget for /chat/send and /chat/stream, shared by embedding, retrieval and generation
+CHAT_DEADLINE_SECONDS = float(os.getenv('CHAT_DEADLINE_SECONDS', 30))
+
 @bp.route('/send', methods=['POST'])
-def send_message():
-    """Send a message to the AI assistant."""
+async def send_message():
+    """Send a message to the AI assistant.
+    
+    Retrieval runs on the async runtime's executor and generation on its
+    event loop, so slow upstream calls don't each pin a worker of their own.
+    """
     try:
         if 'user_email' not in session:
             return jsonify({'error': 'Not authenticated'}), 401
@@ -21,23 +42,96 @@ def send_message():
         if not message:
             return jsonify({'error': 'Message is required'}), 400
         
+        start = time.perf_counter()
+        deadline = Deadline(CHAT_DEADLINE_SECONDS)
+        
         # Get relevant context based on user role
-        vector_service = VectorService()
-        relevant_docs = vector_service.search(message, user_role)
+        try:
+            relevant_docs = await asyncio.wait_for(_retrieve(message, user_role, deadline), deadline.remaining())
+        except asyncio.TimeoutError:
+            logger.warning(f"Chat retrieval exceeded the {CHAT_DEADLINE_SECONDS}s deadline")
+            return jsonify({'error': 'Request timed out'}), 504
+        
+        # The same question over the same retrieved chunks gets the same answer
+        response_cache = get_response_cache()
+        cache_key = response_cache.key(message, user_role, relevant_docs) if response_cache else None
+        cached = response_cache.get(cache_key) if response_cache else None
+        if cached:
+            metrics.latency('chat.send_cached').record((time.perf_counter() - start) * 1000)
+            return jsonify({
+                'response': cached['response'],
+                'sources': cached['sources'],
+                'cached': True
+            })
+        
+        llm_service = get_llm_service()
+        
+        # Paraphrases of an earlier question from the same role reuse its answer;
+        # the query embedding is already in the embedding cache from the search
+        semantic_cache = get_semantic_cache()
+        query_embedding = await run_blocking(llm_service.get_embeddings, message, deadline=deadline) if semantic_cache else None
+        similar = semantic_cache.lookup(user_role, query_embedding) if query_embedding else None
+        if similar:
+            metrics.latency('chat.send_cached').record((time.perf_counter() - start) * 1000)
+            return jsonify({
+                'response': similar['response'],
+                'sources': similar['sources'],
+                'cached': True
+            })
+        
+        # Merge overlapping chunks and keep only the sentences relevant to the question
+        context_docs = await run_blocking(get_context_compressor().compress, message, relevant_docs, deadline=deadline)
         
         # Generate response using LLM
-        llm_service = LLMService()
-        response = llm_service.generate_response(message, relevant_docs, user_role)
+        response = await llm_service.agenerate_response(message, context_docs, user_role, deadline=deadline)
+        sources = relevant_docs[:3]  # Return top 3 sources
+        
+        if response not in (NOT_CONFIGURED_RESPONSE, ERROR_RESPONSE, TIMEOUT_RESPONSE):
+            if response_cache:
+                response_cache.put(cache_key, response, sources, relevant_docs)
+            if query_embedding:
+                tokens = llm_service.estimate_tokens(message, context_docs, user_role, response)
+                semantic_cache.store(user_role, message, query_embedding, response, sources, relevant_docs, tokens)
+        metrics.latency('chat.send').record((time.perf_counter() - start) * 1000)
         
         return jsonify({
             'response': response,
-            'sources': relevant_docs[:3]  # Return top 3 sources
+            'sources': sources,
+            'cached': False
         })
         
     except Exception as e:
         logger.error(f"Chat error: {e}")
         return jsonify({'error': 'Internal server error'}), 500
 
+async def _retrieve(message: str, user_role: str, deadline: Deadline = None):
+    """Search for the whole message and each part of a multi-part question concurrently.
+    
+    Results are merged by chunk id, keeping each chunk's best similarity.
+    """
+    vector_service = get_vector_service()
+    queries = [message] + _split_question(message)
+    results = await asyncio.gather(*(
+        run_blocking(vector_service.search, query, user_role, limit=CHAT_RETRIEVAL_LIMIT, deadline=deadline)
+        for query in queries
+    ))
+    
+    merged = {}
+    for docs in results:
+        for doc in docs:
+            key = doc.get('id') or doc['content']
+            if key not in merged or doc['similarity'] > merged[key]['similarity']:
+                merged[key] = doc
+    return sorted(merged.values(), key=lambda doc: doc['similarity'], reverse=True)
+
+def _split_question(message: str):
+    """Sub-questions of a multi-part message, or [] for a single question."""
+    parts = [part.strip() for part in re.split(r'(?<=\?)\s+|\n+|;\s*', message)]
+    parts = [part for part in parts if len(part.split()) >= 3]
+    if len(parts) <= 1:
+        return []
+    return parts[:CHAT_MAX_SUBQUESTIONS]
+
 @bp.route('/history', methods=['GET'])
 def get_chat_history():
     """Get chat history for the current user."""
@@ -55,7 +149,14 @@ def get_chat_history():
 
 @bp.route('/stream', methods=['POST'])
 def stream_message():
-    """Stream a message response (for future implementation)."""
+    """Stream a message response as Server-Sent Events.
+    
+    Emits one 'sources' event with the retrieved context, 'token' events as
+    the model generates, then a 'done' event with usage and timings (or an
+    'error' event if generation fails). Answers come from and go to the same
+    response and semantic caches as /chat/send; a cached answer is replayed
+    as token events and its 'done' event has cached set.
+    """
     try:
         if 'user_email' not in session:
             return jsonify({'error': 'Not authenticated'}), 401
@@ -67,18 +168,88 @@ def stream_message():
         if not message:
             return jsonify({'error': 'Message is required'}), 400
         
-        # For MVP, return regular response
-        # This would be replaced with streaming implementation
-        vector_service = VectorService()
-        relevant_docs = vector_service.search(message, user_role)
+        start = time.perf_counter()
+        deadline = Deadline(CHAT_DEADLINE_SECONDS)
         
-        llm_service = LLMService()
-        response = llm_service.generate_response(message, relevant_docs, user_role)
+        def generate():
+            # Retrieved the same way as /chat/send, so both endpoints share cached answers
+            try:
+                relevant_docs = asyncio.run(asyncio.wait_for(_retrieve(message, user_role, deadline), deadline.remaining()))
+            except asyncio.TimeoutError:
+                logger.warning(f"Chat retrieval exceeded the {CHAT_DEADLINE_SECONDS}s deadline")
+                yield sse('error', {'error': TIMEOUT_RESPONSE})
+                return
+            retrieval_ms = (time.perf_counter() - start) * 1000
+            metrics.latency('chat.retrieval').record(retrieval_ms)
+            
+            llm_service = get_llm_service()
+            response_cache = get_response_cache()
+            cache_key = response_cache.key(message, user_role, relevant_docs) if response_cache else None
+            cached = response_cache.get(cache_key) if response_cache else None
+            
+            semantic_cache = get_semantic_cache()
+            query_embedding = None
+            if not cached and semantic_cache:
+                query_embedding = llm_service.get_embeddings(message, deadline=deadline)
+                cached = semantic_cache.lookup(user_role, query_embedding) if query_embedding else None
+            
+            if cached:
+                # Replayed as token events, so the client renders it like a live answer
+                yield sse('sources', {'sources': cached['sources'], 'retrieval_ms': round(retrieval_ms, 2)})
+                for piece in re.findall(r'\s*\S+|\s+$', cached['response']):
+                    yield sse('token', {'content': piece})
+                total_ms = (time.perf_counter() - start) * 1000
+                metrics.latency('chat.stream_cached').record(total_ms)
+                yield sse('done', {
+                    'usage': None,
+                    'model': None,
+                    'cached': True,
+                    'timings': {'retrieval_ms': round(retrieval_ms, 2), 'ttft_ms': None, 'total_ms': round(total_ms, 2)}
+                })
+                return
+            
+            sources = relevant_docs[:3]
+            yield sse('sources', {'sources': sources, 'retrieval_ms': round(retrieval_ms, 2)})
+            
+            context_docs = get_context_compressor().compress(message, relevant_docs, deadline)
+            
+            ttft_ms = None
+            pieces = []
+            for event in llm_service.stream_response(message, context_docs, user_role, deadline=deadline):
+                if event['type'] == 'delta':
+                    if ttft_ms is None:
+                        # Time to first token is measured from the request, retrieval included
+                        ttft_ms = (time.perf_counter() - start) * 1000
+                        metrics.latency('chat.ttft').record(ttft_ms)
+                    pieces.append(event['content'])
+                    yield sse('token', {'content': event['content']})
+                elif event['type'] == 'error':
+                    yield sse('error', {'error': event['error']})
+                    return
+                else:
+                    # Only answers streamed to the end are cached
+                    response = ''.join(pieces)
+                    if response not in (NOT_CONFIGURED_RESPONSE, ERROR_RESPONSE, TIMEOUT_RESPONSE):
+                        if response_cache:
+                            response_cache.put(cache_key, response, sources, relevant_docs)
+                        if query_embedding:
+                            tokens = event['usage']['total_tokens'] if event['usage'] else llm_service.estimate_tokens(message, context_docs, user_role, response)
+                            semantic_cache.store(user_role, message, query_embedding, response, sources, relevant_docs, tokens)
+                    
+                    total_ms = (time.perf_counter() - start) * 1000
+                    metrics.latency('chat.stream_total').record(total_ms)
+                    yield sse('done', {
+                        'usage': event['usage'],
+                        'model': event.get('model'),
+                        'cached': False,
+                        'timings': {
+                            'retrieval_ms': round(retrieval_ms, 2),
+                            'ttft_ms': round(ttft_ms, 2) if ttft_ms is not None else None,
+                            'total_ms': round(total_ms, 2)
+                        }
+                    })
         
-        return jsonify({
-            'response': response,
-            'sources': relevant_docs[:3]
-        })
+        return sse_response(generate())
         
     except Exception as e:
         logger.error(f"Stream chat error: {e}")
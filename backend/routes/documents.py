@@ -1,8 +1,11 @@
 from flask import Blueprint, request, jsonify, session
 import logging
 import os
+import uuid
 from werkzeug.utils import secure_filename
 from services.document_service import DocumentService
+from services.ingestion_jobs import get_ingestion_queue, IngestionQueueFull, IngestionInProgress
+from routes.sse import sse, sse_response
 from datetime import datetime
 
 logger = logging.getLogger(__name__)
@@ -11,6 +14,9 @@ bp = Blueprint('documents', __name__, url_prefix='/documents')
 # Allowed file extensions
 ALLOWED_EXTENSIONS = {'pdf', 'docx', 'doc'}
 
+# Idle job event streams send a keepalive comment this often
+JOB_EVENTS_KEEPALIVE_SECONDS = float(os.getenv('JOB_EVENTS_KEEPALIVE_SECONDS', 15))
+
 def allowed_file(filename):
     """Check if file extension is allowed."""
     return '.' in filename and \
@@ -18,7 +24,11 @@ def allowed_file(filename):
 
 @bp.route('/upload', methods=['POST'])
 def upload_document():
-    """Upload and process one or more documents."""
+    """Queue one or more documents for processing.
+    
+    Files are saved and handed to the ingestion queue; the response (202)
+    carries a job id per file, which /documents/jobs/<job_id> reports on.
+    """
     try:
         if 'user_email' not in session:
             return jsonify({'error': 'Not authenticated'}), 401
@@ -37,11 +47,12 @@ def upload_document():
         
         # Create document service
         doc_service = DocumentService()
+        ingestion_queue = get_ingestion_queue()
         
         results = []
-        total_chunks_added = 0
-        total_files_processed = 0
+        total_files_queued = 0
         duplicates_found = []
+        queue_full = False
         
         for file in files:
             if file.filename == '':
@@ -59,7 +70,7 @@ def upload_document():
             # Secure the filename
             filename = secure_filename(file.filename)
             
-            # Check for duplicate before processing
+            # Check for duplicate before queueing
             if doc_service.check_duplicate_file(filename, user_role):
                 duplicates_found.append(filename)
                 results.append({
@@ -70,56 +81,150 @@ def upload_document():
                 })
                 continue
             
-            # Save file temporarily
-            temp_path = os.path.join(doc_service.upload_dir, filename)
+            if ingestion_queue.in_progress(filename, user_role):
+                results.append({
+                    'filename': filename,
+                    'success': False,
+                    'error': 'File is already being processed'
+                })
+                continue
+            
+            # Save file under a unique name; the job removes it when done
+            temp_path = os.path.join(doc_service.upload_dir, f'{uuid.uuid4().hex}_{filename}')
             file.save(temp_path)
             
             try:
-                # Process the document
-                result = doc_service.process_document(temp_path, filename, user_role)
+                job = ingestion_queue.submit(temp_path, filename, session['user_email'], user_role)
+                total_files_queued += 1
+                results.append({
+                    'filename': filename,
+                    'success': True,
+                    'job_id': job['id'],
+                    'status': job['status']
+                })
+                
+            except IngestionInProgress:
+                # Another request queued the same file since the check above
+                os.remove(temp_path)
+                results.append({
+                    'filename': filename,
+                    'success': False,
+                    'error': 'File is already being processed'
+                })
                 
-                if result['success']:
-                    total_chunks_added += result['chunks_added']
-                    total_files_processed += 1
-                    results.append({
-                        'filename': filename,
-                        'success': True,
-                        'chunks_added': result['chunks_added'],
-                        'total_chunks': result['total_chunks'],
-                        'file_size': result['file_size']
-                    })
-                else:
-                    results.append({
-                        'filename': filename,
-                        'success': False,
-                        'error': result['error']
-                    })
-                    
-            except Exception as e:
-                logger.error(f"Error processing file {filename}: {e}")
+            except IngestionQueueFull as e:
+                logger.warning(f"Ingestion queue full, rejecting {filename}: {e}")
+                os.remove(temp_path)
+                queue_full = True
                 results.append({
                     'filename': filename,
                     'success': False,
-                    'error': f'Failed to process document: {str(e)}'
+                    'error': 'Too many documents are being processed, try again shortly'
                 })
-            finally:
-                # Clean up temporary file
-                if os.path.exists(temp_path):
-                    os.remove(temp_path)
+        
+        # Nothing could be queued because the workers are saturated
+        status = 503 if queue_full and not total_files_queued else 202
         
         # Return summary and individual results
-        return jsonify({
-            'message': f'Processed {len(files)} files',
-            'total_files_processed': total_files_processed,
-            'total_chunks_added': total_chunks_added,
+        response = {
+            'message': f'Queued {total_files_queued} of {len(files)} files',
+            'total_files_queued': total_files_queued,
             'duplicates_found': duplicates_found,
             'results': results
-        }), 200
+        }
+        if status == 503:
+            response['error'] = 'Too many documents are being processed, try again shortly'
+        return jsonify(response), status
         
     except Exception as e:
         logger.error(f"Document upload error: {e}")
         return jsonify({'error': 'Internal server error'}), 500
 
+@bp.route('/jobs/<job_id>', methods=['GET'])
+def get_job(job_id):
+    """Get the status and progress of an ingestion job."""
+    try:
+        if 'user_email' not in session:
+            return jsonify({'error': 'Not authenticated'}), 401
+        
+        job = _user_job(job_id)
+        if not job:
+            return jsonify({'error': 'Job not found'}), 404
+        
+        return jsonify(_job_response(job)), 200
+        
+    except Exception as e:
+        logger.error(f"Get ingestion job error: {e}")
+        return jsonify({'error': 'Internal server error'}), 500
+
+@bp.route('/jobs/<job_id>/events', methods=['GET'])
+def job_events(job_id):
+    """Stream an ingestion job's progress as Server-Sent Events.
+    
+    Emits a 'progress' event whenever the job changes and a final 'done'
+    event once it has succeeded or failed.
+    """
+    try:
+        if 'user_email' not in session:
+            return jsonify({'error': 'Not authenticated'}), 401
+        
+        job = _user_job(job_id)
+        if not job:
+            return jsonify({'error': 'Job not found'}), 404
+        
+        ingestion_queue = get_ingestion_queue()
+        
+        def generate():
+            current = job
+            while True:
+                if current is None:
+                    yield sse('error', {'error': 'Job not found'})
+                    return
+                if current['status'] in ('succeeded', 'failed'):
+                    yield sse('done', _job_response(current))
+                    return
+                yield sse('progress', _job_response(current))
+                
+                version = current['version']
+                current = ingestion_queue.wait_for_update(job_id, version, JOB_EVENTS_KEEPALIVE_SECONDS)
+                while current is not None and current['version'] == version:
+                    # Comment line keeps idle connections from being closed by proxies
+                    yield ': keepalive\n\n'
+                    current = ingestion_queue.wait_for_update(job_id, version, JOB_EVENTS_KEEPALIVE_SECONDS)
+        
+        return sse_response(generate())
+        
+    except Exception as e:
+        logger.error(f"Ingestion job events error: {e}")
+        return jsonify({'error': 'Internal server error'}), 500
+
+def _user_job(job_id: str):
+    """The job if it exists and belongs to the signed-in user."""
+    job = get_ingestion_queue().get(job_id)
+    if not job or job['user_email'] != session.get('user_email'):
+        return None
+    return job
+
+def _job_response(job: dict) -> dict:
+    result = job['result'] or {}
+    return {
+        'job_id': job['id'],
+        'filename': job['filename'],
+        'status': job['status'],
+        'progress': job['progress'],
+        'error': job['error'],
+        'chunks_added': result.get('chunks_added'),
+        'chunks_reused': result.get('chunks_reused'),
+        'chunks_embedded': result.get('chunks_embedded'),
+        'chunks_removed': result.get('chunks_removed'),
+        'total_chunks': result.get('total_chunks'),
+        'file_size': result.get('file_size'),
+        'replaced': result.get('replaced', False),
+        'created_at': job['created_at'],
+        'started_at': job['started_at'],
+        'finished_at': job['finished_at']
+    }
+
 @bp.route('/list', methods=['GET'])
 def list_documents():
     """Get list of uploaded documents."""
@@ -194,8 +299,8 @@ def search_documents():
             return jsonify({'error': 'Query is required'}), 400
         
         # Use the existing vector service for search
-        from services.vector_service import VectorService
-        vector_service = VectorService()
+        from services.vector_service import get_vector_service
+        vector_service = get_vector_service()
         
         # Search for documents with uploaded_document source
         results = vector_service.search(query, user_role)
@@ -227,12 +332,11 @@ def save_documents():
         doc_service = DocumentService()
         
         # Force save using the document service's vector service
-        doc_service.vector_service._save_documents()
+        doc_service.vector_service.save()
         
         # Check if save was successful
-        import os
-        docs_file = os.path.join(doc_service.vector_service.vector_db_path, 'documents.json')
-        embeddings_file = os.path.join(doc_service.vector_service.vector_db_path, 'embeddings.json')
+        docs_file = doc_service.vector_service.docs_file
+        embeddings_file = doc_service.vector_service.embeddings_file
         
         docs_saved = os.path.exists(docs_file) and os.path.getsize(docs_file) > 2
         embeddings_saved = os.path.exists(embeddings_file) and os.path.getsize(embeddings_file) > 2
@@ -241,8 +345,8 @@ def save_documents():
             'message': 'Documents saved to disk',
             'documents_saved': docs_saved,
             'embeddings_saved': embeddings_saved,
-            'documents_count': len(doc_service.vector_service.documents),
-            'embeddings_count': len(doc_service.vector_service.embeddings)
+            'documents_count': doc_service.vector_service.count(),
+            'embeddings_count': doc_service.vector_service.count()
         }), 200
         
     except Exception as e:
@@ -251,7 +355,11 @@ def save_documents():
 
 @bp.route('/replace', methods=['POST'])
 def replace_document():
-    """Replace an existing document with a new one."""
+    """Queue a new version of an existing document to replace it.
+    
+    Runs as an ingestion job like /upload (202 with a job id), so it shares
+    the queue's limits and never overlaps another job for the same file.
+    """
     try:
         if 'user_email' not in session:
             return jsonify({'error': 'Not authenticated'}), 401
@@ -279,31 +387,33 @@ def replace_document():
         
         # Create document service
         doc_service = DocumentService()
+        ingestion_queue = get_ingestion_queue()
+        
+        # A replace diffs against the stored chunks, so it must not run alongside
+        # an upload or replace of the same file that is still indexing them
+        if ingestion_queue.in_progress(filename, user_role):
+            return jsonify({'error': 'File is already being processed'}), 409
         
-        # Save file temporarily
-        temp_path = os.path.join(doc_service.upload_dir, filename)
+        # Save file under a unique name; the job removes it when done
+        temp_path = os.path.join(doc_service.upload_dir, f'{uuid.uuid4().hex}_{filename}')
         file.save(temp_path)
         
         try:
-            # Process the document with replace flag
-            result = doc_service.process_document(temp_path, filename, user_role, replace_existing=True)
-            
-            if result['success']:
-                return jsonify({
-                    'message': 'Document replaced successfully',
-                    'filename': filename,
-                    'chunks_added': result['chunks_added'],
-                    'total_chunks': result['total_chunks'],
-                    'file_size': result['file_size'],
-                    'replaced': True
-                }), 200
-            else:
-                return jsonify({'error': result['error']}), 400
-                
-        finally:
-            # Clean up temporary file
-            if os.path.exists(temp_path):
-                os.remove(temp_path)
+            job = ingestion_queue.submit(temp_path, filename, session['user_email'], user_role, replace_existing=True)
+        except IngestionInProgress:
+            os.remove(temp_path)
+            return jsonify({'error': 'File is already being processed'}), 409
+        except IngestionQueueFull as e:
+            logger.warning(f"Ingestion queue full, rejecting replacement of {filename}: {e}")
+            os.remove(temp_path)
+            return jsonify({'error': 'Too many documents are being processed, try again shortly'}), 503
+        
+        return jsonify({
+            'message': 'Document queued for replacement',
+            'filename': filename,
+            'job_id': job['id'],
+            'status': job['status']
+        }), 202
         
     except Exception as e:
         logger.error(f"Document replace error: {e}")
@@ -0,0 +1,19 @@
+import json
+from typing import Iterable
+from flask import Response, stream_with_context
+
+def sse(event: str, data: dict) -> str:
+    """Format one Server-Sent Event."""
+    return f"event: {event}\ndata: {json.dumps(data)}\n\n"
+
+def sse_response(events: Iterable[str]) -> Response:
+    """Stream already formatted events as a text/event-stream response."""
+    return Response(
+        stream_with_context(events),
+        mimetype='text/event-stream',
+        headers={
+            'Cache-Control': 'no-cache',
+            # Stop nginx-style proxies from buffering the stream
+            'X-Accel-Buffering': 'no'
+        }
+    )
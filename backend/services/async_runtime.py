@@ -0,0 +1,50 @@
+import os
+import asyncio
+import logging
+import threading
+import functools
+from concurrent.futures import ThreadPoolExecutor
+from typing import Any, Awaitable, Callable
+
+logger = logging.getLogger(__name__)
+
+_loop = None
+_loop_lock = threading.Lock()
+
+# Blocking work (vector search, cache lookups) awaited from async views
+_executor = ThreadPoolExecutor(
+    max_workers=int(os.getenv('ASYNC_EXECUTOR_WORKERS', 16)),
+    thread_name_prefix='chat-io'
+)
+
+def get_loop() -> asyncio.AbstractEventLoop:
+    """The process-wide event loop that all async upstream (OpenAI) I/O runs on.
+
+    Flask gives every async view its own short-lived loop, so clients holding
+    pooled connections live here instead, on one long-running daemon thread.
+    """
+    global _loop
+    if _loop is None:
+        with _loop_lock:
+            if _loop is None:
+                loop = asyncio.new_event_loop()
+                thread = threading.Thread(target=loop.run_forever, name='async-runtime', daemon=True)
+                thread.start()
+                _loop = loop
+                logger.info("Started async runtime event loop")
+    return _loop
+
+async def run_on_runtime(coro: Awaitable) -> Any:
+    """Await a coroutine on the shared runtime loop from any other loop."""
+    loop = get_loop()
+    try:
+        if asyncio.get_running_loop() is loop:
+            return await coro
+    except RuntimeError:
+        pass
+    return await asyncio.wrap_future(asyncio.run_coroutine_threadsafe(coro, loop))
+
+async def run_blocking(fn: Callable, *args, **kwargs) -> Any:
+    """Run a blocking call on the shared executor without blocking the event loop."""
+    loop = asyncio.get_running_loop()
+    return await loop.run_in_executor(_executor, functools.partial(fn, *args, **kwargs))
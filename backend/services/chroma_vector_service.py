@@ -0,0 +1,259 @@
+import os
+import logging
+import json
+import uuid
+from typing import List, Dict, Any
+from services.llm_service import get_llm_service
+from services.deadline import Deadline
+from services.vector_service import ROLE_ACCESS_RULES, DEFAULT_ALLOWED_SOURCES, _access_key
+
+logger = logging.getLogger(__name__)
+
+class _SuppliedEmbeddings:
+    """Embedding function placeholder: we always pass embeddings in, so Chroma never loads a model."""
+
+    def __call__(self, input):
+        raise ValueError("ChromaVectorService supplies embeddings explicitly")
+
+class ChromaVectorService:
+    """VectorService backed by a local persistent Chroma collection.
+
+    Chunks, embeddings and metadata all live in Chroma; role filtering and
+    deletes are expressed as metadata `where` clauses. Selected with
+    VECTOR_BACKEND=chroma.
+    """
+
+    def __init__(self):
+        try:
+            self.llm_service = get_llm_service()
+            # Check if LLM service is properly initialized
+            if not self.llm_service.client:
+                logger.warning("ChromaVectorService: LLM service not properly initialized - embeddings will not work")
+        except Exception as e:
+            logger.error(f"ChromaVectorService: Failed to initialize LLM service: {e}")
+            self.llm_service = None
+
+        self.vector_db_path = os.getenv('VECTOR_DB_PATH', os.path.join(os.path.dirname(os.path.dirname(__file__)), 'embeddings'))
+        self.chroma_path = os.getenv('CHROMA_PATH', os.path.join(self.vector_db_path, 'chroma'))
+        self.collection_name = os.getenv('CHROMA_COLLECTION', 'internal_assistant')
+
+        import chromadb
+        from chromadb.config import Settings
+
+        os.makedirs(self.chroma_path, exist_ok=True)
+        # Telemetry off: the store must work without network access
+        self.client = chromadb.PersistentClient(path=self.chroma_path, settings=Settings(anonymized_telemetry=False))
+        self.collection = self.client.get_or_create_collection(
+            name=self.collection_name,
+            metadata={'hnsw:space': 'cosine'},
+            embedding_function=_SuppliedEmbeddings()
+        )
+        logger.info(f"Chroma collection '{self.collection_name}' opened at {self.chroma_path} ({self.collection.count()} chunks)")
+
+        # Callbacks told the ids of chunks that were deleted or changed
+        self._listeners = []
+
+    @property
+    def docs_file(self) -> str:
+        # Chroma keeps documents and embeddings in the same SQLite file
+        return os.path.join(self.chroma_path, 'chroma.sqlite3')
+
+    @property
+    def embeddings_file(self) -> str:
+        return self.docs_file
+
+    def search(self, query: str, user_role: str, limit: int = 5, deadline: Deadline = None) -> List[Dict]:
+        """Search for relevant documents based on query and user role."""
+        try:
+            # If LLM service is not available, return empty results
+            if not self.llm_service or not self.llm_service.client:
+                logger.warning("ChromaVectorService: Cannot perform search - LLM service not available")
+                return []
+
+            if limit <= 0 or not self.collection.count():
+                return []
+
+            # Get query embedding
+            query_embedding = self.llm_service.get_embeddings(query, deadline=deadline)
+            if not query_embedding:
+                logger.warning("ChromaVectorService: Failed to generate query embedding")
+                return []
+
+            result = self.collection.query(
+                query_embeddings=[query_embedding],
+                n_results=limit,
+                where=self._role_filter(user_role),
+                include=['documents', 'metadatas', 'distances']
+            )
+
+            filtered_docs = []
+            for chunk_id, content, metadata, distance in zip(result['ids'][0], result['documents'][0], result['metadatas'][0], result['distances'][0]):
+                doc = self._to_document(chunk_id, content, metadata)
+                filtered_docs.append({
+                    'id': doc['id'],
+                    'content': doc['content'],
+                    'source': doc['source'],
+                    'metadata': doc['metadata'],
+                    # Cosine distance back to the similarity the exact backend reports
+                    'similarity': 1.0 - distance
+                })
+
+            return filtered_docs
+
+        except Exception as e:
+            logger.error(f"Chroma search error: {e}")
+            return []
+
+    def add_document(self, content: str, source: str, metadata: Dict, user_role: str = None):
+        """Add a document to the Chroma collection."""
+        return self.add_documents([{
+            'content': content,
+            'source': source,
+            'metadata': metadata,
+            'user_role': user_role
+        }]) == 1
+
+    def add_documents(self, items: List[Dict], embeddings: List[List[float]] = None) -> int:
+        """Add many documents with batched embedding (unless precomputed) and a single collection write."""
+        try:
+            if not items:
+                return 0
+
+            if embeddings is None:
+                # If LLM service is not available, skip embedding generation
+                if not self.llm_service or not self.llm_service.client:
+                    logger.warning("ChromaVectorService: Cannot add document - LLM service not available for embeddings")
+                    return 0
+
+                embeddings = self.llm_service.get_embeddings_batch([item['content'] for item in items])
+
+            ids, vectors, contents, metadatas = [], [], [], []
+            for item, embedding in zip(items, embeddings):
+                if not embedding:
+                    logger.warning(f"ChromaVectorService: Failed to generate document embedding for {item['source']}")
+                    continue
+                ids.append(item.get('id') or uuid.uuid4().hex)
+                vectors.append(embedding)
+                contents.append(item['content'])
+                metadatas.append(self._to_metadata(item['source'], item['metadata'], item.get('user_role')))
+
+            if not ids:
+                return 0
+
+            self.collection.add(ids=ids, embeddings=vectors, documents=contents, metadatas=metadatas)
+
+            logger.info(f"Added {len(ids)} documents from {items[0]['source']} (total docs: {self.collection.count()})")
+            return len(ids)
+
+        except Exception as e:
+            logger.error(f"Chroma add documents error: {e}")
+            return 0
+
+    def delete_document(self, source: str, user_role: str = None) -> int:
+        """Delete every chunk with the given source the user may access. Returns the number removed."""
+        where = {'source': source}
+        role_filter = self._role_filter(user_role) if user_role is not None else None
+        if role_filter:
+            where = {'$and': [where, role_filter]}
+
+        matching = self.collection.get(where=where, include=[])
+        if matching['ids']:
+            self.collection.delete(ids=matching['ids'])
+
+        logger.info(f"Deleted {len(matching['ids'])} chunks for source: {source}")
+        if matching['ids']:
+            self._notify_listeners(set(matching['ids']))
+        return len(matching['ids'])
+
+    def delete_ids(self, ids) -> int:
+        """Delete the chunks with the given ids. Returns the number removed."""
+        matching = self.collection.get(ids=list(ids), include=[])
+        if matching['ids']:
+            self.collection.delete(ids=matching['ids'])
+
+        logger.info(f"Deleted {len(matching['ids'])} chunks by id")
+        if matching['ids']:
+            self._notify_listeners(set(matching['ids']))
+        return len(matching['ids'])
+
+    def update_metadata(self, updates: Dict[str, Dict]) -> int:
+        """Replace the metadata of chunks by id, keeping their content and embeddings. Returns the number updated."""
+        if not updates:
+            return 0
+        current = self.collection.get(ids=list(updates), include=['metadatas'])
+        if not current['ids']:
+            return 0
+
+        metadatas = [
+            self._to_metadata(flat.get('source', ''), updates[chunk_id], flat.get('user_role'))
+            for chunk_id, flat in zip(current['ids'], current['metadatas'])
+        ]
+        self.collection.update(ids=current['ids'], metadatas=metadatas)
+
+        self._notify_listeners(set(current['ids']))
+        return len(current['ids'])
+
+    def add_listener(self, callback):
+        """Register callback(ids) to be called with the ids of chunks that are deleted or changed."""
+        self._listeners.append(callback)
+
+    def get_documents(self) -> List[Dict]:
+        """Return every stored document (without embeddings)."""
+        result = self.collection.get(include=['documents', 'metadatas'])
+        return [
+            self._to_document(chunk_id, content, metadata)
+            for chunk_id, content, metadata in zip(result['ids'], result['documents'], result['metadatas'])
+        ]
+
+    def count(self) -> int:
+        """Return the number of stored documents."""
+        return self.collection.count()
+
+    def save(self):
+        """Chroma persists every write itself; kept for interface parity with VectorService."""
+        logger.info(f"Chroma collection '{self.collection_name}' is persisted at {self.chroma_path}")
+
+    def _notify_listeners(self, ids: set):
+        for callback in list(self._listeners):
+            try:
+                callback(ids)
+            except Exception as e:
+                logger.error(f"Vector store listener error: {e}")
+
+    def _can_access_document(self, document: Dict, user_role: str) -> bool:
+        """Check if user can access a document based on role-based filtering."""
+        # Admin can access everything
+        if user_role == 'admin':
+            return True
+        allowed_sources = ROLE_ACCESS_RULES.get(user_role, DEFAULT_ALLOWED_SOURCES)
+        return _access_key(document.get('source', '')) in allowed_sources
+
+    def _role_filter(self, user_role: str) -> Dict[str, Any]:
+        """Chroma where clause limiting results to the sources the role may read."""
+        # Admin can access everything
+        if user_role == 'admin':
+            return None
+        return {'access_key': {'$in': ROLE_ACCESS_RULES.get(user_role, DEFAULT_ALLOWED_SOURCES)}}
+
+    def _to_metadata(self, source: str, metadata: Dict, user_role: str) -> Dict[str, Any]:
+        """Flatten a document into Chroma's scalar-only metadata."""
+        flat = {
+            'source': source,
+            'access_key': _access_key(source),
+            # Full metadata round-trips as JSON since Chroma rejects lists and dicts
+            'metadata_json': json.dumps(metadata or {})
+        }
+        if user_role is not None:
+            flat['user_role'] = user_role
+        if metadata and metadata.get('filename'):
+            flat['filename'] = metadata['filename']
+        return flat
+
+    def _to_document(self, chunk_id: str, content: str, metadata: Dict) -> Dict[str, Any]:
+        return {
+            'id': chunk_id,
+            'content': content,
+            'source': metadata.get('source', ''),
+            'metadata': json.loads(metadata.get('metadata_json', '{}')),
+            'user_role': metadata.get('user_role')
+        }
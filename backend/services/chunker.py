@@ -0,0 +1,199 @@
+import os
+import re
+from itertools import chain
+from typing import Callable, Dict, Iterable, Iterator, List, Optional, Tuple
+
+from services.tokenizer import split_tokens, token_counter, CHARS_PER_TOKEN
+
+CHUNK_TARGET_TOKENS = int(os.getenv('CHUNK_TARGET_TOKENS', 256))
+CHUNK_OVERLAP_TOKENS = int(os.getenv('CHUNK_OVERLAP_TOKENS', 40))
+
+class SentenceChunker:
+    """Packs whole sentences into chunks of up to `target_tokens` tokens.
+
+    The text is never split into sentences up front. Each chunk takes a
+    window of as many characters as `target_tokens` took in the previous
+    chunk and ends at the last sentence boundary in it; the next chunk starts
+    at the first boundary within about `overlap_tokens` of that end, so
+    consecutive chunks share whole trailing sentences. That is two regex
+    calls and one token count per chunk, rather than per sentence. A chunk
+    that comes out over the target is cut back to an earlier boundary, and a
+    sentence longer than the target on its own is split on token boundaries.
+    Text can be fed in as a stream: only the chunk being packed is buffered,
+    and the chunks are the same however the text was split into pieces.
+    """
+
+    # A blank line, or sentence-ending punctuation followed by whitespace. Group 1 is any
+    # closing quotes kept with the sentence; the leading character class lets the regex
+    # engine skip straight to candidate positions.
+    boundary = re.compile(r'[.!?\n](?:(?<=\n)\s*\n\s*|(?<=[.!?])[.!?]*(["\'\)\]]*)\s+)')
+
+    def __init__(self, target_tokens: int = None, overlap_tokens: int = None, model: str = None):
+        self.target_tokens = max(1, target_tokens or CHUNK_TARGET_TOKENS)
+        self.overlap_tokens = min(CHUNK_OVERLAP_TOKENS if overlap_tokens is None else overlap_tokens, self.target_tokens // 2)
+        self.model = model or os.getenv('OPENAI_EMBEDDING_MODEL', 'text-embedding-3-small')
+        # Greedy lead-in: the engine runs to the end of the window and backtracks to the last
+        # boundary, so finding it costs the distance from the end. Group 2 is the closing quotes.
+        self._last_boundary = re.compile(r'(?s:.*)(%s)' % self.boundary.pattern)
+
+    def chunk(self, text: str) -> List[str]:
+        return list(self.iter_chunks([text]))
+
+    def iter_chunks(self, texts: Iterable[str]) -> Iterator[str]:
+        target, overlap = self.target_tokens, self.overlap_tokens
+        count = token_counter(self.model)
+        last_boundary = self._last_boundary.match
+        next_boundary = self.boundary.search
+        # Long runs of whitespace take few tokens; cap the window they would otherwise blow up
+        max_ratio = 4 * CHARS_PER_TOKEN
+
+        buffer = ''
+        # Start of the chunk being packed, and of the first sentence no chunk has included
+        # yet; every chunk reaches past `fresh`, so a chunk of only overlap is never emitted
+        start = fresh = 0
+        # Characters per token in the previous chunk, which sizes the next window
+        ratio = CHARS_PER_TOKEN
+
+        for text in chain(texts, [None]):
+            final = text is None
+            if not final:
+                buffer += text
+
+            size = len(buffer)
+            chunks = []
+
+            while True:
+                # Common case inline: the last boundary in the window ends a sentence and
+                # the chunk up to it is within the target
+                hi = start + int(target * ratio) + 1
+                match = last_boundary(buffer, fresh, hi) if hi <= size else None
+                cut = 0
+                if match is not None:
+                    resume = match.end()
+                    blank, cut = match.span(2)
+                    if blank < 0:
+                        # A blank line; _pack decides whether anything but whitespace precedes it
+                        cut = match.start(1)
+                        if cut == fresh or buffer[cut - 1].isspace():
+                            cut = 0
+                if cut:
+                    chunk = buffer[start:cut].strip()
+                    tokens = count(chunk)
+                if not cut or tokens > target:
+                    packed = self._pack(buffer, start, fresh, ratio, final, count)
+                    if packed is None:
+                        break
+                    start, cut, resume, tokens = packed
+                    chunk = buffer[start:cut].strip()
+
+                if chunk:
+                    chunks.append(chunk)
+                    ratio = (cut - start) / tokens
+                    if ratio > max_ratio:
+                        ratio = max_ratio
+                # The next chunk starts with the trailing sentences that fit in about
+                # `overlap` tokens; its own count keeps it within the target
+                match = None
+                if overlap:
+                    lo = cut - int(overlap * ratio)
+                    if lo <= start:
+                        # Only a proper suffix, or the next chunk would repeat this one whole
+                        lo = cut - len(buffer[start:cut].lstrip()) + 1
+                    match = next_boundary(buffer, lo, cut)
+                start = resume if match is None else match.end()
+                fresh = resume
+
+            yield from chunks
+
+            if final:
+                return
+
+            # Drop text no future chunk can include
+            if start:
+                buffer = buffer[start:]
+                fresh -= start
+                start = 0
+
+    def _pack(self, buffer: str, start: int, fresh: int, ratio: float, final: bool,
+              count: Callable[[str], int]) -> Optional[Tuple[int, int, int, int]]:
+        """Lay out the chunk at `start`: (start, end, start of the next sentence, tokens).
+
+        Returns None when the buffer does not reach far enough to decide yet or,
+        once `final`, when everything left has already been included in a chunk.
+        """
+        target = self.target_tokens
+        hi = start + int(target * ratio) + 1
+        if hi > len(buffer):
+            if not final or not buffer[fresh:].strip():
+                return None
+            # The end of the text ends the last sentence
+            cut = resume = len(buffer)
+        else:
+            cut, resume = self._last_boundary_before(buffer, fresh, hi)
+
+        over = None
+        tokens = count(buffer[start:cut].strip()) if cut else 0
+        while tokens > target:
+            # Over the target: shrink the window in proportion and look again
+            over = cut
+            cut, resume = self._last_boundary_before(buffer, fresh, start + (cut - start) * target // tokens)
+            tokens = count(buffer[start:cut].strip()) if cut else 0
+
+        if not cut:
+            if start < fresh:
+                # Overlap gives way to new text rather than pushing a chunk past the target
+                return self._pack(buffer, fresh, fresh, ratio, final, count)
+            # One sentence over the target on its own: split it on token boundaries
+            cut = start + self._split_length(buffer[start:min(over or hi, len(buffer))], count)
+            return start, cut, cut, count(buffer[start:cut].strip())
+        return start, cut, resume, tokens
+
+    def _last_boundary_before(self, buffer: str, fresh: int, hi: int) -> Tuple[int, int]:
+        """(end of the sentence, start of the next) for the last boundary in buffer[fresh:hi]
+        that ends a non-empty sentence, or (0, 0) when there is none."""
+        match = self._last_boundary.match(buffer, fresh, hi)
+        if match is None:
+            return 0, 0
+        if match.start(2) >= 0:
+            return match.end(2), match.end()
+        # A blank line ends an empty sentence when nothing but whitespace precedes it
+        end = match.start(1)
+        if end == fresh or buffer[end - 1].isspace() and not buffer[fresh:end].strip():
+            return 0, 0
+        return end, match.end()
+
+    def _split_length(self, text: str, count: Callable[[str], int]) -> int:
+        """Length of the first piece of `text` of at most target_tokens tokens; at least one character."""
+        target = self.target_tokens
+        piece = split_tokens(text, target, self.model)[0]
+        if piece and text.startswith(piece) and count(piece.strip()) <= target:
+            return len(piece)
+        # Token boundaries inside a multi-byte character: bisect on characters instead
+        lo, hi = 1, len(text)
+        while lo < hi:
+            middle = (lo + hi + 1) // 2
+            if count(text[:middle].strip()) <= target:
+                lo = middle
+            else:
+                hi = middle - 1
+        return lo
+
+class ParagraphChunker(SentenceChunker):
+    """SentenceChunker that also breaks at every line; for formats that put one paragraph per line (DOCX)."""
+
+    boundary = re.compile(r'[.!?\n](?:(?<=\n)\s*|(?<=[.!?])[.!?]*(["\'\)\]]*)\s+)')
+
+# File extension -> factory for the chunker used on that file type
+_CHUNKERS: Dict[str, Callable[[], SentenceChunker]] = {
+    'pdf': SentenceChunker,
+    'docx': ParagraphChunker,
+    'doc': ParagraphChunker,
+}
+
+def register_chunker(file_type: str, factory: Callable[[], SentenceChunker]):
+    """Use `factory()` to chunk files with extension `file_type`."""
+    _CHUNKERS[file_type.lower()] = factory
+
+def get_chunker(file_type: str) -> SentenceChunker:
+    """A chunker for files with extension `file_type`; SentenceChunker for unregistered types."""
+    return _CHUNKERS.get(file_type.lower(), SentenceChunker)()
@@ -0,0 +1,192 @@
+import os
+import re
+import logging
+import threading
+import numpy as np
+from collections import OrderedDict
+from typing import List, Dict, Optional
+
+from services import metrics
+from services.deadline import Deadline
+from services.tokenizer import count_tokens
+
+logger = logging.getLogger(__name__)
+
+_SENTENCE_END = re.compile(r'(?<=[.!?])\s+')
+
+_shared_compressor = None
+_shared_compressor_lock = threading.Lock()
+
+def get_context_compressor() -> 'ContextCompressor':
+    """Return the process-wide context compressor."""
+    global _shared_compressor
+    if _shared_compressor is None:
+        with _shared_compressor_lock:
+            if _shared_compressor is None:
+                from services.llm_service import get_llm_service
+                _shared_compressor = ContextCompressor(get_llm_service())
+    return _shared_compressor
+
+class ContextCompressor:
+    """Shrinks retrieved chunks before they are packed into the prompt.
+
+    Adjacent chunks of the same document are merged with their shared
+    overlap removed, then long passages are cut down to the sentences most
+    similar to the question. Sentences are only embedded when a chunk they
+    belong to is retrieved, and are kept in a bounded LRU of their own so
+    they never evict chunk or query embeddings from the shared embedding
+    cache. Sentences that are not cached get at most
+    CONTEXT_COMPRESSION_MAX_SECONDS of the request's deadline; without them
+    the passage is kept whole.
+    """
+
+    def __init__(self, llm_service):
+        self.llm_service = llm_service
+        self.enabled = os.getenv('CONTEXT_COMPRESSION_ENABLED', 'true').lower() == 'true'
+        # Passages shorter than this are already cheap and kept verbatim
+        self.min_tokens = int(os.getenv('CONTEXT_COMPRESSION_MIN_TOKENS', 150))
+        self.max_sentences = int(os.getenv('CONTEXT_COMPRESSION_MAX_SENTENCES', 4))
+        self.max_seconds = float(os.getenv('CONTEXT_COMPRESSION_MAX_SECONDS', 2))
+        self.cache_items = int(os.getenv('CONTEXT_COMPRESSION_CACHE_ITEMS', 20000))
+        # (embedding model, sentence) -> embedding, least recently used first
+        self._sentence_cache = OrderedDict()
+        self._cache_lock = threading.Lock()
+        self._tokens = metrics.register('context.compression_tokens', metrics.Counter())
+
+    def compress(self, query: str, context_docs: List[Dict], deadline: Deadline = None) -> List[Dict]:
+        """Compressed copy of context_docs (same order by similarity); never raises."""
+        if not self.enabled or not context_docs:
+            return context_docs
+        try:
+            docs = self._merge_adjacent(context_docs)
+            if deadline is None or not deadline.expired:
+                docs = self._extract_sentences(query, docs, deadline)
+
+            model = self.llm_service.model
+            self._tokens.increment('before', sum(count_tokens(doc.get('content', ''), model) for doc in context_docs))
+            self._tokens.increment('after', sum(count_tokens(doc.get('content', ''), model) for doc in docs))
+            return docs
+
+        except Exception as e:
+            logger.error(f"Context compression error, using uncompressed context: {e}")
+            return context_docs
+
+    @staticmethod
+    def _sentences(text: str) -> List[str]:
+        return [part.strip() for part in _SENTENCE_END.split(text) if part.strip()]
+
+    def _merge_adjacent(self, context_docs: List[Dict]) -> List[Dict]:
+        """Join runs of consecutive chunks from one document into a single passage."""
+        groups = {}
+        merged = []
+        for doc in context_docs:
+            chunk_index = doc.get('metadata', {}).get('chunk_index')
+            if isinstance(chunk_index, int):
+                groups.setdefault(doc.get('source', ''), []).append(doc)
+            else:
+                merged.append(doc)
+
+        for chunks in groups.values():
+            chunks.sort(key=lambda doc: doc['metadata']['chunk_index'])
+            run = [chunks[0]]
+            for doc in chunks[1:]:
+                if doc['metadata']['chunk_index'] == run[-1]['metadata']['chunk_index'] + 1:
+                    run.append(doc)
+                else:
+                    merged.append(self._join(run))
+                    run = [doc]
+            merged.append(self._join(run))
+
+        return sorted(merged, key=lambda doc: doc.get('similarity', 0.0), reverse=True)
+
+    def _join(self, run: List[Dict]) -> Dict:
+        if len(run) == 1:
+            return run[0]
+        content = run[0]['content']
+        for doc in run[1:]:
+            content += ' ' + self._strip_overlap(content, doc['content'])
+        return {
+            **run[0],
+            'content': content,
+            'similarity': max(doc.get('similarity', 0.0) for doc in run),
+            'metadata': {**run[0]['metadata'], 'chunk_indexes': [doc['metadata']['chunk_index'] for doc in run]}
+        }
+
+    @staticmethod
+    def _strip_overlap(previous: str, text: str, max_overlap: int = 400, min_overlap: int = 20) -> str:
+        """`text` without the leading span it repeats from the end of `previous`."""
+        for size in range(min(max_overlap, len(previous), len(text)), min_overlap - 1, -1):
+            if previous.endswith(text[:size]):
+                return text[size:].lstrip()
+        return text
+
+    def _extract_sentences(self, query: str, docs: List[Dict], deadline: Optional[Deadline]) -> List[Dict]:
+        """Cut long passages down to their sentences closest to the query, kept in reading order."""
+        model = self.llm_service.model
+        sentences = {}
+        limits = {}
+        for i, doc in enumerate(docs):
+            if count_tokens(doc.get('content', ''), model) < self.min_tokens:
+                continue
+            parts = self._sentences(doc['content'])
+            # A merged passage keeps max_sentences per chunk it was built from
+            limit = self.max_sentences * len(doc.get('metadata', {}).get('chunk_indexes', [None]))
+            if len(parts) > limit:
+                sentences[i] = parts
+                limits[i] = limit
+        if not sentences:
+            return docs
+
+        query_embedding = self.llm_service.get_embeddings(query, deadline=deadline)
+        if not query_embedding:
+            return docs
+        flat = [sentence for parts in sentences.values() for sentence in parts]
+        # Cached sentences cost nothing; the rest must not eat into generation's share of the deadline
+        budget = Deadline(self.max_seconds if deadline is None else min(self.max_seconds, deadline.remaining()))
+        embeddings = self._sentence_embeddings(flat, budget)
+        if any(not embedding for embedding in embeddings):
+            return docs
+
+        query_vector = np.asarray(query_embedding, dtype=np.float32)
+        matrix = np.asarray(embeddings, dtype=np.float32)
+        scores = matrix @ query_vector / (np.linalg.norm(matrix, axis=1) * np.linalg.norm(query_vector) + 1e-12)
+
+        compressed = list(docs)
+        offset = 0
+        for i, parts in sentences.items():
+            doc_scores = scores[offset:offset + len(parts)]
+            offset += len(parts)
+            keep = np.sort(np.argpartition(-doc_scores, limits[i] - 1)[:limits[i]])
+            content = ''
+            for position, index in enumerate(keep):
+                # Mark where sentences were dropped so the model doesn't read them as contiguous
+                if position and index != keep[position - 1] + 1:
+                    content += ' ... '
+                elif position:
+                    content += ' '
+                content += parts[index]
+            compressed[i] = {**docs[i], 'content': content}
+        return compressed
+
+    def _sentence_embeddings(self, sentences: List[str], deadline: Deadline) -> List[List[float]]:
+        """Embeddings of the sentences, from the sentence LRU where possible; [] where embedding failed."""
+        model = self.llm_service.embedding_model
+        embeddings = [None] * len(sentences)
+        with self._cache_lock:
+            for i, sentence in enumerate(sentences):
+                embedding = self._sentence_cache.get((model, sentence))
+                if embedding is not None:
+                    self._sentence_cache.move_to_end((model, sentence))
+                    embeddings[i] = embedding
+
+        missing = list(dict.fromkeys(sentence for sentence, embedding in zip(sentences, embeddings) if embedding is None))
+        if missing:
+            fetched = dict(zip(missing, self.llm_service.get_embeddings_batch(missing, deadline=deadline, use_cache=False)))
+            with self._cache_lock:
+                for sentence, embedding in fetched.items():
+                    if embedding:
+                        self._sentence_cache[(model, sentence)] = embedding
+                while len(self._sentence_cache) > self.cache_items:
+                    self._sentence_cache.popitem(last=False)
+            embeddings = [fetched[sentence] if embedding is None else embedding for sentence, embedding in zip(sentences, embeddings)]
+        return embeddings
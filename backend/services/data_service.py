@@ -4,7 +4,7 @@ from typing import List, Dict, Any
 from services.slack_service import SlackService
 from services.github_service import GitHubService
 from services.outlook_service import OutlookService
-from services.vector_service import VectorService
+from services.vector_service import get_vector_service
 
 logger = logging.getLogger(__name__)
 
@@ -30,7 +30,7 @@ class DataService:
             self.outlook_service = None
             
         try:
-            self.vector_service = VectorService()
+            self.vector_service = get_vector_service()
         except Exception as e:
             logger.warning(f"Failed to initialize VectorService: {e}")
             self.vector_service = None
@@ -0,0 +1,35 @@
+import os
+import time
+from typing import Optional, Tuple
+
+class DeadlineExceeded(TimeoutError):
+    """Raised when a stage has no time left in its request's budget."""
+
+class Deadline:
+    """Wall-clock budget for one request, shared by every stage that serves it."""
+
+    def __init__(self, seconds: float):
+        self.seconds = seconds
+        self.expires_at = time.monotonic() + seconds
+
+    def remaining(self) -> float:
+        return max(0.0, self.expires_at - time.monotonic())
+
+    @property
+    def expired(self) -> bool:
+        return self.remaining() <= 0
+
+    def bound(self, timeout: Optional[float] = None) -> float:
+        """`timeout` capped to the remaining budget; raises if nothing is left."""
+        remaining = self.remaining()
+        if remaining <= 0:
+            raise DeadlineExceeded(f"deadline of {self.seconds}s exceeded")
+        return remaining if timeout is None else min(timeout, remaining)
+
+def bound(deadline: Optional[Deadline], timeout: Optional[float] = None) -> Optional[float]:
+    """Deadline.bound that also accepts no deadline, returning `timeout` unchanged."""
+    return timeout if deadline is None else deadline.bound(timeout)
+
+def http_timeout() -> Tuple[float, float]:
+    """(connect, read) seconds for each Slack, GitHub and Outlook API call, so a hung upstream can't pin a thread."""
+    return float(os.getenv('HTTP_CONNECT_TIMEOUT_SECONDS', 5)), float(os.getenv('HTTP_TIMEOUT_SECONDS', 30))
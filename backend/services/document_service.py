@@ -1,16 +1,25 @@
 import os
+import uuid
+import hashlib
 import logging
-import PyPDF2
+from collections import deque
 from docx import Document
-from typing import List, Dict, Any
-from services.vector_service import VectorService
+from typing import List, Dict, Any, Callable, Iterable, Iterator, Tuple
+from services.vector_service import get_vector_service
+from services.pdf_extractor import iter_pdf_pages
+from services.pipeline import bounded_stage, batched
+from services.chunker import get_chunker
 
 logger = logging.getLogger(__name__)
 
 class DocumentService:
     def __init__(self):
-        self.vector_service = VectorService()
+        self.vector_service = get_vector_service()
         self.upload_dir = os.path.join(os.path.dirname(os.path.dirname(__file__)), 'uploads')
+        # Chunks are embedded and indexed this many at a time so progress can be reported
+        self.index_batch_size = int(os.getenv('DOCUMENT_INDEX_BATCH_SIZE', 64))
+        # Batches each ingestion stage may run ahead of the next
+        self.stage_queue_size = int(os.getenv('INGESTION_STAGE_QUEUE_SIZE', 4))
         
         # Create upload directory if it doesn't exist
         if not os.path.exists(self.upload_dir):
@@ -23,7 +32,7 @@ class DocumentService:
                 return False
             
             # Check if document with same filename exists
-            for doc in self.vector_service.documents:
+            for doc in self.vector_service.get_documents():
                 if doc.get('source', '').startswith(f'uploaded_document_{filename}'):
                     # Check access permissions
                     if user_role is None or self.vector_service._can_access_document(doc, user_role):
@@ -50,8 +59,19 @@ class DocumentService:
             logger.error(f"Replace document error: {e}")
             return {'success': False, 'error': f'Failed to replace document: {str(e)}'}
 
-    def process_document(self, file_path: str, filename: str, user_role: str = None, replace_existing: bool = False) -> Dict[str, Any]:
-        """Process a document file and add it to the vector database."""
+    def process_document(self, file_path: str, filename: str, user_role: str = None, replace_existing: bool = False,
+                         progress: Callable[..., None] = None) -> Dict[str, Any]:
+        """Process a document file and add it to the vector database.
+        
+        `progress`, if given, is called with keyword arguments (stage, pages_extracted,
+        pages_total, chunks_embedded, chunks_reused, chunks_total) as the document streams
+        through extraction, chunking and embedding; chunks_total is only known at the end.
+        
+        Replacing an existing document only embeds the chunks whose content changed:
+        the rest keep their stored embeddings, and chunks the new version no longer
+        has are deleted once it is fully indexed.
+        """
+        report = progress or (lambda **_: None)
         try:
             # Check for duplicate file
             is_duplicate = self.check_duplicate_file(filename, user_role)
@@ -64,69 +84,53 @@ class DocumentService:
                     'filename': filename
                 }
             
-            # If duplicate and replace is requested, delete existing first
-            if is_duplicate and replace_existing:
-                replace_result = self.replace_document(filename, user_role)
-                if not replace_result['success']:
-                    return replace_result
+            # If duplicate and replace is requested, diff against the stored chunks instead of deleting them
+            replaced = is_duplicate and replace_existing
+            previous = self._stored_chunks(filename, user_role) if replaced else {}
             
             # Determine file type and extract text
             file_extension = filename.lower().split('.')[-1]
             
             if file_extension == 'pdf':
-                text_content = self._extract_pdf_text(file_path)
+                texts = self._extract_pdf_text(file_path, report)
             elif file_extension in ['docx', 'doc']:
-                text_content = self._extract_docx_text(file_path)
+                texts = self._extract_docx_text(file_path)
             else:
                 return {
                     'success': False,
                     'error': f'Unsupported file type: {file_extension}. Supported types: PDF, DOCX, DOC'
                 }
             
-            if not text_content.strip():
+            report(stage='processing', chunks_embedded=0, chunks_reused=0)
+            total_chunks, embedded_chunks, reused_chunks = self._ingest(
+                texts, filename, file_extension, user_role, report, previous
+            )
+            
+            if not total_chunks:
+                # Nothing was indexed, so a document being replaced is left as it was
                 return {
                     'success': False,
                     'error': 'No text content found in the document'
                 }
             
-            # Split text into chunks for better processing
-            chunks = self._chunk_text(text_content)
-            
-            # Add each chunk to the vector database
-            added_chunks = 0
-            from datetime import datetime
-            upload_time = datetime.now().isoformat()
-            
-            for i, chunk in enumerate(chunks):
-                metadata = {
-                    'filename': filename,
-                    'file_type': file_extension,
-                    'chunk_index': i,
-                    'total_chunks': len(chunks),
-                    'source': 'uploaded_document',
-                    'tags': ['document', file_extension],
-                    'uploaded_at': upload_time
-                }
-                
-                success = self.vector_service.add_document(
-                    content=chunk,
-                    source=f'uploaded_document_{filename}',
-                    metadata=metadata,
-                    user_role=user_role
-                )
-                
-                if success:
-                    added_chunks += 1
-                else:
-                    logger.error(f"Failed to add chunk {i} for document {filename}")
+            # _ingest indexed every chunk, so whatever it didn't reuse is no longer in the document
+            removed_chunks = 0
+            stale_ids = [doc['id'] for docs in previous.values() for doc in docs]
+            if stale_ids:
+                removed_chunks = self.vector_service.delete_ids(stale_ids)
+            if replaced:
+                logger.info(f"Replaced document {filename}: {reused_chunks} chunks reused, {embedded_chunks} embedded, {removed_chunks} removed")
             
             return {
                 'success': True,
                 'filename': filename,
-                'chunks_added': added_chunks,
-                'total_chunks': len(chunks),
+                'chunks_added': embedded_chunks + reused_chunks,
+                'chunks_embedded': embedded_chunks,
+                'chunks_reused': reused_chunks,
+                'chunks_removed': removed_chunks,
+                'total_chunks': total_chunks,
                 'file_size': os.path.getsize(file_path),
-                'replaced': is_duplicate and replace_existing
+                'replaced': replaced
             }
             
         except Exception as e:
@@ -136,67 +140,128 @@ class DocumentService:
                 'error': f'Failed to process document: {str(e)}'
             }
     
-    def _extract_pdf_text(self, file_path: str) -> str:
-        """Extract text from a PDF file."""
+    def _ingest(self, texts: Iterable[str], filename: str, file_extension: str, user_role: str,
+                report: Callable[..., None], previous: Dict[str, deque] = None) -> Tuple[int, int, int]:
+        """Stream extracted text through chunking, embedding and indexing.
+        
+        Each stage runs on its own thread with a bounded queue in between, so
+        memory stays flat however large the file is and each batch of chunks
+        is searchable as soon as it is indexed.
+        
+        `previous` holds the stored chunks of a document being replaced, from
+        _stored_chunks. A new chunk with the same content takes one of them
+        over, embedding and all, and only its metadata is rewritten; taken
+        chunks are removed from `previous`, leaving the stale ones. If indexing
+        fails or leaves any chunk out (embedding failures make add_documents
+        skip a batch), chunks added so far are deleted, reused ones get their
+        old metadata back, and it raises. Returns (chunks, chunks embedded and
+        added, chunks reused).
+        """
+        from datetime import datetime
+        upload_time = datetime.now().isoformat()
+        llm_service = self.vector_service.llm_service
+        previous = previous if previous is not None else {}
+        
+        def items():
+            for i, chunk in enumerate(get_chunker(file_extension).iter_chunks(texts)):
+                item = {
+                    'id': uuid.uuid4().hex,
+                    'content': chunk,
+                    'source': f'uploaded_document_{filename}',
+                    'metadata': {
+                        'filename': filename,
+                        'file_type': file_extension,
+                        'chunk_index': i,
+                        'source': 'uploaded_document',
+                        'tags': ['document', file_extension],
+                        'uploaded_at': upload_time
+                    },
+                    'user_role': user_role
+                }
+                stored = previous.get(self._content_hash(chunk))
+                if stored:
+                    reused = stored.popleft()
+                    item['id'] = reused['id']
+                    item['previous_metadata'] = reused.get('metadata', {})
+                yield item
+        
+        def embedded(batches):
+            for batch in batches:
+                fresh = [item for item in batch if 'previous_metadata' not in item]
+                reused = [item for item in batch if 'previous_metadata' in item]
+                # Without a client add_documents logs the problem and skips the batch
+                if not fresh or not llm_service or not llm_service.client:
+                    yield fresh, reused, None
+                    continue
+                embeddings = llm_service.get_embeddings_batch([item['content'] for item in fresh])
+                yield fresh, reused, embeddings
+        
+        batches = bounded_stage(batched(items(), self.index_batch_size), self.stage_queue_size, 'chunk')
+        total_chunks = embedded_chunks = added_chunks = reused_chunks = 0
+        added_ids = []
+        old_metadata = {}
         try:
-            with open(file_path, 'rb') as file:
-                pdf_reader = PyPDF2.PdfReader(file)
-                text = ""
-                
-                for page in pdf_reader.pages:
-                    text += page.extract_text() + "\n"
-                
-                return text
+            for fresh, reused, embeddings in bounded_stage(embedded(batches), self.stage_queue_size, 'embed'):
+                added_ids.extend(item['id'] for item in fresh)
+                added_chunks += self.vector_service.add_documents(fresh, embeddings)
+                if reused:
+                    old_metadata.update((item['id'], item['previous_metadata']) for item in reused)
+                    reused_chunks += self.vector_service.update_metadata({item['id']: item['metadata'] for item in reused})
+                embedded_chunks += len(fresh)
+                total_chunks += len(fresh) + len(reused)
+                report(chunks_embedded=embedded_chunks, chunks_reused=reused_chunks)
+            if added_chunks + reused_chunks < total_chunks:
+                raise Exception(f"Indexed only {added_chunks + reused_chunks} of {total_chunks} chunks")
+        except Exception:
+            # Don't leave a half-indexed document searchable, or a replaced one half-rewritten
+            if added_ids:
+                self.vector_service.delete_ids(added_ids)
+            if old_metadata:
+                self.vector_service.update_metadata(old_metadata)
+            raise
+        
+        report(chunks_total=total_chunks)
+        return total_chunks, added_chunks, reused_chunks
+    
+    def _stored_chunks(self, filename: str, user_role: str = None) -> Dict[str, deque]:
+        """Stored chunks of an uploaded document keyed by content hash, in document order per hash."""
+        source = f'uploaded_document_{filename}'
+        chunks = [
+            doc for doc in self.vector_service.get_documents()
+            if doc.get('source', '') == source and (user_role is None or self.vector_service._can_access_document(doc, user_role))
+        ]
+        chunks.sort(key=lambda doc: doc.get('metadata', {}).get('chunk_index', 0))
+        
+        stored = {}
+        for doc in chunks:
+            stored.setdefault(self._content_hash(doc['content']), deque()).append(doc)
+        return stored
+    
+    @staticmethod
+    def _content_hash(content: str) -> str:
+        return hashlib.sha256(content.encode('utf-8')).hexdigest()
+    
+    def _extract_pdf_text(self, file_path: str, progress: Callable[..., None] = None) -> Iterator[str]:
+        """Extract text from a PDF file page by page, spreading large files across the extraction pool."""
+        try:
+            for page in iter_pdf_pages(file_path, progress):
+                yield page + "\n"
                 
         except Exception as e:
             logger.error(f"PDF extraction error: {e}")
             raise Exception(f"Failed to extract text from PDF: {str(e)}")
     
-    def _extract_docx_text(self, file_path: str) -> str:
-        """Extract text from a DOCX file."""
+    def _extract_docx_text(self, file_path: str) -> Iterator[str]:
+        """Extract text from a DOCX file paragraph by paragraph."""
         try:
             doc = Document(file_path)
-            text = ""
-            
             for paragraph in doc.paragraphs:
-                text += paragraph.text + "\n"
-            
-            return text
+                yield paragraph.text + "\n"
             
         except Exception as e:
             logger.error(f"DOCX extraction error: {e}")
             raise Exception(f"Failed to extract text from DOCX: {str(e)}")
     
-    def _chunk_text(self, text: str, chunk_size: int = 1000, overlap: int = 200) -> List[str]:
-        """Split text into overlapping chunks for better processing."""
-        if len(text) <= chunk_size:
-            return [text]
-        
-        chunks = []
-        start = 0
-        
-        while start < len(text):
-            end = start + chunk_size
-            
-            # Try to break at a sentence boundary
-            if end < len(text):
-                # Look for sentence endings
-                for i in range(end, max(start + chunk_size - 100, start), -1):
-                    if text[i] in '.!?':
-                        end = i + 1
-                        break
-            
-            chunk = text[start:end].strip()
-            if chunk:
-                chunks.append(chunk)
-            
-            # Move start position with overlap
-            start = end - overlap
-            if start >= len(text):
-                break
-        
-        return chunks
-    
     def get_uploaded_documents(self, user_role: str = None) -> List[Dict[str, Any]]:
         """Get list of uploaded documents accessible to the user."""
         try:
@@ -204,7 +269,7 @@ class DocumentService:
             
             # Get documents from vector service
             if self.vector_service:
-                all_docs = self.vector_service.documents
+                all_docs = self.vector_service.get_documents()
                 
                 for doc in all_docs:
                     # Check if it's an uploaded document
@@ -219,10 +284,12 @@ class DocumentService:
                                 documents[filename] = {
                                     'filename': filename,
                                     'file_type': metadata.get('file_type', 'Unknown'),
-                                    'chunks': metadata.get('total_chunks', 1),
+                                    'chunks': 0,
                                     'source': doc.get('source', ''),
                                     'uploaded_at': metadata.get('uploaded_at', 'Unknown')
                                 }
+                            # Chunks are streamed in, so their total isn't stored on each one
+                            documents[filename]['chunks'] += 1
             
             return list(documents.values())
             
@@ -236,37 +303,13 @@ class DocumentService:
             if not self.vector_service:
                 return {'success': False, 'error': 'Vector service not available'}
             
-            # Find and remove all chunks for this document
-            removed_chunks = 0
-            documents_to_remove = []
-            embeddings_to_remove = []
-            
             target_source = f'uploaded_document_{filename}'
             logger.info(f"Attempting to delete document with source: {target_source}")
             
-            for i, doc in enumerate(self.vector_service.documents):
-                doc_source = doc.get('source', '')
-                # Use exact match for the source to avoid partial matches
-                if doc_source == target_source:
-                    # Check access permissions
-                    if user_role is None or self.vector_service._can_access_document(doc, user_role):
-                        documents_to_remove.append(i)
-                        embeddings_to_remove.append(i)
-                        removed_chunks += 1
-            
-            logger.info(f"Total chunks to remove for {filename}: {removed_chunks}")
-            
-            # Remove documents and embeddings in reverse order to maintain indices
-            for i in reversed(documents_to_remove):
-                if i < len(self.vector_service.documents):
-                    del self.vector_service.documents[i]
-            
-            for i in reversed(embeddings_to_remove):
-                if i < len(self.vector_service.embeddings):
-                    del self.vector_service.embeddings[i]
+            # Remove all chunks for this document in one locked pass
+            removed_chunks = self.vector_service.delete_document(target_source, user_role)
             
-            # Save changes
-            self.vector_service._save_documents()
+            logger.info(f"Total chunks removed for {filename}: {removed_chunks}")
             
             return {
                 'success': True,
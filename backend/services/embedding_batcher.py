@@ -0,0 +1,74 @@
+import logging
+import queue
+import threading
+import time
+from concurrent.futures import Future, ThreadPoolExecutor
+from typing import Callable, List
+
+from services import metrics
+
+logger = logging.getLogger(__name__)
+
+_BATCH_SIZE_BUCKETS = (1, 2, 4, 8, 16, 32, 64, 128, 256)
+_QUEUE_DEPTH_BUCKETS = (0, 1, 2, 4, 8, 16, 32, 64, 128, 256)
+
+class EmbeddingBatcher:
+    """Collects single-text embedding requests from many threads into batched calls.
+
+    A background thread waits for the first request, keeps collecting for up
+    to `window_ms` or until `max_items` are queued, then hands the batch to
+    `embed_batch` (texts -> embeddings, in order) on a small worker pool and
+    resolves each caller's future with its own embedding.
+    """
+
+    def __init__(self, name: str, embed_batch: Callable[[List[str]], List[List[float]]],
+                 window_ms: float, max_items: int, concurrency: int):
+        self.name = name
+        self.embed_batch = embed_batch
+        self.window = window_ms / 1000
+        self.max_items = max(1, max_items)
+
+        self._queue = queue.Queue()
+        self._workers = ThreadPoolExecutor(max_workers=max(1, concurrency), thread_name_prefix=f'{name}-batch')
+        self.batch_sizes = metrics.register(f'{name}.batch_size', metrics.Histogram(_BATCH_SIZE_BUCKETS))
+        self.queue_depths = metrics.register(f'{name}.queue_depth', metrics.Histogram(_QUEUE_DEPTH_BUCKETS))
+
+        self._thread = threading.Thread(target=self._run, name=f'{name}-batcher', daemon=True)
+        self._thread.start()
+
+    def submit(self, text: str) -> Future:
+        """Queue a text; the returned future resolves to its embedding."""
+        future = Future()
+        # Requests already waiting when this one arrives
+        self.queue_depths.observe(self._queue.qsize())
+        self._queue.put((text, future))
+        return future
+
+    def _run(self):
+        while True:
+            batch = [self._queue.get()]
+            deadline = time.monotonic() + self.window
+            while len(batch) < self.max_items:
+                remaining = deadline - time.monotonic()
+                if remaining <= 0:
+                    break
+                try:
+                    batch.append(self._queue.get(timeout=remaining))
+                except queue.Empty:
+                    break
+
+            self.batch_sizes.observe(len(batch))
+            self._workers.submit(self._dispatch, batch)
+
+    def _dispatch(self, batch):
+        # Identical texts in one window are embedded once
+        texts = list(dict.fromkeys(text for text, _ in batch))
+        try:
+            embeddings = dict(zip(texts, self.embed_batch(texts)))
+            for text, future in batch:
+                future.set_result(embeddings[text])
+        except Exception as e:
+            logger.error(f"{self.name}: batched embedding call for {len(texts)} texts failed: {e}")
+            for _, future in batch:
+                if not future.done():
+                    future.set_exception(e)
@@ -0,0 +1,167 @@
+import os
+import logging
+import sqlite3
+import hashlib
+import threading
+import time
+import numpy as np
+from collections import OrderedDict
+from typing import List, Dict, Optional
+
+logger = logging.getLogger(__name__)
+
+_shared_cache = None
+_shared_cache_lock = threading.Lock()
+
+def get_embedding_cache() -> Optional['EmbeddingCache']:
+    """Return the process-wide embedding cache, or None when disabled or unavailable."""
+    global _shared_cache
+    if _shared_cache is None:
+        with _shared_cache_lock:
+            if _shared_cache is None:
+                if os.getenv('EMBEDDING_CACHE_ENABLED', 'true').lower() != 'true':
+                    _shared_cache = False
+                else:
+                    try:
+                        _shared_cache = EmbeddingCache()
+                    except Exception as e:
+                        logger.error(f"Failed to open embedding cache, continuing without it: {e}")
+                        _shared_cache = False
+    return _shared_cache or None
+
+class EmbeddingCache:
+    """Two-tier cache of embeddings keyed by (embedding model, sha256 of the text).
+
+    A small in-memory LRU sits in front of a size-bounded SQLite table, so
+    repeated texts skip the embeddings API both within a process and across
+    restarts.
+    """
+
+    def __init__(self):
+        default_dir = os.getenv('VECTOR_DB_PATH', os.path.join(os.path.dirname(os.path.dirname(__file__)), 'embeddings'))
+        self.path = os.getenv('EMBEDDING_CACHE_PATH', os.path.join(default_dir, 'embedding_cache.sqlite3'))
+        self.memory_items = int(os.getenv('EMBEDDING_CACHE_MEMORY_ITEMS', 10000))
+        self.max_items = int(os.getenv('EMBEDDING_CACHE_MAX_ITEMS', 200000))
+
+        self._memory = OrderedDict()
+        self._lock = threading.Lock()
+        self._stats = {'memory_hits': 0, 'disk_hits': 0, 'misses': 0, 'evictions': 0}
+
+        os.makedirs(os.path.dirname(self.path) or '.', exist_ok=True)
+        self._db = sqlite3.connect(self.path, check_same_thread=False)
+        self._db.execute('PRAGMA journal_mode=WAL')
+        self._db.execute('PRAGMA synchronous=NORMAL')
+        self._db.execute(
+            'CREATE TABLE IF NOT EXISTS embeddings ('
+            'model TEXT NOT NULL, text_hash TEXT NOT NULL, vector BLOB NOT NULL, last_used REAL NOT NULL, '
+            'PRIMARY KEY (model, text_hash))'
+        )
+        self._db.execute('CREATE INDEX IF NOT EXISTS embeddings_last_used ON embeddings (last_used)')
+        self._db.commit()
+        self._disk_items = self._db.execute('SELECT COUNT(*) FROM embeddings').fetchone()[0]
+        logger.info(f"Embedding cache opened at {self.path} ({self._disk_items} entries)")
+
+    @staticmethod
+    def _key(model: str, text: str):
+        return model, hashlib.sha256(text.encode('utf-8')).hexdigest()
+
+    def get_many(self, model: str, texts: List[str]) -> List[Optional[List[float]]]:
+        """Cached embedding for each text, or None where there is none."""
+        keys = [self._key(model, text) for text in texts]
+        results = [None] * len(texts)
+        missing = {}
+
+        with self._lock:
+            for i, key in enumerate(keys):
+                vector = self._memory.get(key)
+                if vector is not None:
+                    self._memory.move_to_end(key)
+                    results[i] = vector
+                    self._stats['memory_hits'] += 1
+                else:
+                    missing.setdefault(key[1], []).append(i)
+
+            if missing:
+                now = time.time()
+                hashes = list(missing)
+                # Stay well under SQLite's bound-parameter limit
+                for start in range(0, len(hashes), 500):
+                    batch = hashes[start:start + 500]
+                    rows = self._db.execute(
+                        f"SELECT text_hash, vector FROM embeddings WHERE model = ? AND text_hash IN ({','.join('?' * len(batch))})",
+                        [model, *batch]
+                    ).fetchall()
+                    for text_hash, blob in rows:
+                        vector = np.frombuffer(blob, dtype=np.float32).tolist()
+                        for i in missing.pop(text_hash):
+                            results[i] = vector
+                            self._stats['disk_hits'] += 1
+                        self._remember((model, text_hash), vector)
+                    if rows:
+                        self._db.executemany(
+                            'UPDATE embeddings SET last_used = ? WHERE model = ? AND text_hash = ?',
+                            [(now, model, text_hash) for text_hash, _ in rows]
+                        )
+                self._db.commit()
+
+                self._stats['misses'] += sum(len(indexes) for indexes in missing.values())
+
+        return results
+
+    def get(self, model: str, text: str) -> Optional[List[float]]:
+        return self.get_many(model, [text])[0]
+
+    def put_many(self, model: str, texts: List[str], embeddings: List[List[float]]):
+        """Store freshly computed embeddings; empty (failed) ones are skipped."""
+        now = time.time()
+        rows = []
+        with self._lock:
+            for text, embedding in zip(texts, embeddings):
+                if not embedding:
+                    continue
+                key = self._key(model, text)
+                self._remember(key, embedding)
+                rows.append((model, key[1], np.asarray(embedding, dtype=np.float32).tobytes(), now))
+
+            if not rows:
+                return
+            try:
+                before = self._db.total_changes
+                self._db.executemany('INSERT OR IGNORE INTO embeddings (model, text_hash, vector, last_used) VALUES (?, ?, ?, ?)', rows)
+                self._disk_items += self._db.total_changes - before
+                self._evict()
+                self._db.commit()
+            except sqlite3.Error as e:
+                logger.error(f"Embedding cache write error: {e}")
+
+    def put(self, model: str, text: str, embedding: List[float]):
+        self.put_many(model, [text], [embedding])
+
+    def stats(self) -> Dict[str, int]:
+        with self._lock:
+            lookups = self._stats['memory_hits'] + self._stats['disk_hits'] + self._stats['misses']
+            return {
+                **self._stats,
+                'hit_rate': round((lookups - self._stats['misses']) / lookups, 4) if lookups else 0.0,
+                'memory_items': len(self._memory),
+                'disk_items': self._disk_items
+            }
+
+    def _remember(self, key, vector: List[float]):
+        """Insert into the memory tier, dropping the least recently used entries."""
+        self._memory[key] = vector
+        self._memory.move_to_end(key)
+        while len(self._memory) > self.memory_items:
+            self._memory.popitem(last=False)
+
+    def _evict(self):
+        """Trim the disk tier to max_items, oldest-used first, in 10% steps to amortize the delete."""
+        if self._disk_items <= self.max_items:
+            return
+        excess = self._disk_items - self.max_items + self.max_items // 10
+        deleted = self._db.execute(
+            'DELETE FROM embeddings WHERE rowid IN (SELECT rowid FROM embeddings ORDER BY last_used LIMIT ?)',
+            (excess,)
+        ).rowcount
+        self._disk_items -= deleted
+        self._stats['evictions'] += deleted
@@ -3,6 +3,7 @@ import logging
 import requests
 from typing import List, Dict, Any
 from datetime import datetime, timedelta
+from services.deadline import http_timeout
 
 logger = logging.getLogger(__name__)
 
@@ -11,6 +12,7 @@ class GitHubService:
         self.access_token = os.getenv('GITHUB_ACCESS_TOKEN')
         self.org_name = os.getenv('GITHUB_ORG_NAME')
         self.base_url = "https://api.github.com"
+        self.timeout = http_timeout()
         self.last_sync_time = None
         
         # Check if credentials are properly configured
@@ -86,7 +88,7 @@ class GitHubService:
             }
             
             url = f"{self.base_url}/orgs/{self.org_name}/repos"
-            response = requests.get(url, headers=headers)
+            response = requests.get(url, headers=headers, timeout=self.timeout)
             response.raise_for_status()
             
             repos = []
@@ -132,7 +134,7 @@ class GitHubService:
                 'per_page': 50
             }
             
-            response = requests.get(url, headers=headers, params=params)
+            response = requests.get(url, headers=headers, params=params, timeout=self.timeout)
             response.raise_for_status()
             
             commits = []
@@ -177,7 +179,7 @@ class GitHubService:
                 'per_page': 50
             }
             
-            response = requests.get(url, headers=headers, params=params)
+            response = requests.get(url, headers=headers, params=params, timeout=self.timeout)
             response.raise_for_status()
             
             prs = []
@@ -226,7 +228,7 @@ class GitHubService:
                 'per_page': 50
             }
             
-            response = requests.get(url, headers=headers, params=params)
+            response = requests.get(url, headers=headers, params=params, timeout=self.timeout)
             response.raise_for_status()
             
             issues = []
@@ -0,0 +1,170 @@
+import os
+import uuid
+import logging
+import threading
+import time
+from collections import OrderedDict
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime
+from typing import Dict, Any, Optional
+
+from services import metrics
+
+logger = logging.getLogger(__name__)
+
+_FINISHED = ('succeeded', 'failed')
+
+_shared_queue = None
+_shared_queue_lock = threading.Lock()
+
+def get_ingestion_queue() -> 'IngestionQueue':
+    """Return the process-wide document ingestion queue."""
+    global _shared_queue
+    if _shared_queue is None:
+        with _shared_queue_lock:
+            if _shared_queue is None:
+                _shared_queue = IngestionQueue()
+    return _shared_queue
+
+class IngestionQueueFull(Exception):
+    """Raised when INGESTION_MAX_QUEUED jobs are already waiting or running."""
+
+class IngestionInProgress(Exception):
+    """Raised when a queued or running job is already ingesting the same file for the role."""
+
+class IngestionQueue:
+    """Runs document ingestion (extract, chunk, embed, index) off the request thread.
+
+    Uploads are saved to disk and submitted as jobs to a small worker pool,
+    so a burst of large files takes at most INGESTION_WORKERS threads (and
+    their embedding calls) away from chat. Each job records its progress;
+    callers poll `get` or block in `wait_for_update` until it changes.
+    """
+
+    def __init__(self):
+        self.workers = int(os.getenv('INGESTION_WORKERS', 2))
+        self.max_queued = int(os.getenv('INGESTION_MAX_QUEUED', 20))
+        # Finished jobs kept around for late pollers, oldest dropped first
+        self.history = int(os.getenv('INGESTION_JOB_HISTORY', 200))
+
+        self._executor = ThreadPoolExecutor(max_workers=max(1, self.workers), thread_name_prefix='ingestion')
+        self._jobs = OrderedDict()
+        self._active = 0
+        self._cond = threading.Condition()
+        self._job_latency = metrics.latency('documents.ingestion_job')
+
+    def submit(self, file_path: str, filename: str, user_email: str, user_role: str = None,
+               replace_existing: bool = False) -> Dict[str, Any]:
+        """Queue `file_path` for processing; the job deletes the file when it finishes.
+        
+        With `replace_existing` the job replaces the stored document of that name
+        (see DocumentService.process_document). Only one job per file and role may
+        be active at a time, since a replace diffs against the chunks already stored.
+        """
+        with self._cond:
+            if self._active >= self.max_queued:
+                raise IngestionQueueFull(f"{self._active} ingestion jobs already queued")
+            if self._in_progress(filename, user_role):
+                raise IngestionInProgress(f"{filename} is already being processed")
+            job = {
+                'id': uuid.uuid4().hex,
+                'filename': filename,
+                'status': 'queued',
+                'progress': {'stage': 'queued'},
+                'result': None,
+                'error': None,
+                'created_at': datetime.now().isoformat(),
+                'started_at': None,
+                'finished_at': None,
+                'user_email': user_email,
+                'user_role': user_role,
+                'replace_existing': replace_existing,
+                'version': 0
+            }
+            self._jobs[job['id']] = job
+            self._active += 1
+            snapshot = self._snapshot(job)
+
+        self._executor.submit(self._run, job['id'], file_path)
+        return snapshot
+
+    def get(self, job_id: str) -> Optional[Dict[str, Any]]:
+        with self._cond:
+            job = self._jobs.get(job_id)
+            return self._snapshot(job) if job else None
+
+    def in_progress(self, filename: str, user_role: str = None) -> bool:
+        """Whether a queued or running job is already ingesting `filename` for this role."""
+        with self._cond:
+            return self._in_progress(filename, user_role)
+
+    def wait_for_update(self, job_id: str, version: int, timeout: float) -> Optional[Dict[str, Any]]:
+        """The job once its version moves past `version`, or as it is after `timeout` seconds."""
+        with self._cond:
+            self._cond.wait_for(
+                lambda: job_id not in self._jobs or self._jobs[job_id]['version'] != version,
+                timeout
+            )
+            job = self._jobs.get(job_id)
+            return self._snapshot(job) if job else None
+
+    def stats(self) -> Dict[str, Any]:
+        with self._cond:
+            statuses = {}
+            for job in self._jobs.values():
+                statuses[job['status']] = statuses.get(job['status'], 0) + 1
+            return {'workers': self.workers, 'max_queued': self.max_queued, 'active': self._active, 'jobs': statuses}
+
+    def _run(self, job_id: str, file_path: str):
+        start = time.perf_counter()
+        self._update(job_id, status='running', started_at=datetime.now().isoformat(), progress={'stage': 'starting'})
+        try:
+            from services.document_service import DocumentService
+            job = self.get(job_id)
+            result = DocumentService().process_document(
+                file_path, job['filename'], job['user_role'], replace_existing=job['replace_existing'],
+                progress=lambda **progress: self._update(job_id, progress=progress)
+            )
+            if result['success']:
+                self._update(job_id, status='succeeded', result=result)
+            else:
+                self._update(job_id, status='failed', error=result['error'], result=result)
+
+        except Exception as e:
+            logger.error(f"Ingestion job {job_id} error: {e}")
+            self._update(job_id, status='failed', error=f'Failed to process document: {str(e)}')
+        finally:
+            if os.path.exists(file_path):
+                os.remove(file_path)
+            self._job_latency.record((time.perf_counter() - start) * 1000)
+
+    def _update(self, job_id: str, progress: Dict[str, Any] = None, **fields):
+        with self._cond:
+            job = self._jobs.get(job_id)
+            if job is None:
+                return
+            if progress:
+                job['progress'] = {**job['progress'], **progress}
+            job.update(fields)
+            if fields.get('status') in _FINISHED:
+                job['finished_at'] = datetime.now().isoformat()
+                job['progress'] = {**job['progress'], 'stage': fields['status']}
+                self._active -= 1
+                self._prune()
+            job['version'] += 1
+            self._cond.notify_all()
+
+    def _in_progress(self, filename: str, user_role: str = None) -> bool:
+        return any(
+            job['filename'] == filename and job['user_role'] == user_role and job['status'] not in _FINISHED
+            for job in self._jobs.values()
+        )
+    
+    def _prune(self):
+        finished = [job_id for job_id, job in self._jobs.items() if job['status'] in _FINISHED]
+        for job_id in finished[:max(0, len(finished) - self.history)]:
+            del self._jobs[job_id]
+
+    @staticmethod
+    def _snapshot(job: Dict[str, Any]) -> Dict[str, Any]:
+        return {**job, 'progress': dict(job['progress'])}
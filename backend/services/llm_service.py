@@ -1,20 +1,151 @@
 import os
 import logging
-from typing import List, Dict, Any
+import time
+import json
+import hashlib
+import threading
+import asyncio
+import re
+from concurrent.futures import Future, ThreadPoolExecutor, TimeoutError as FutureTimeoutError, wait, FIRST_COMPLETED
+from typing import List, Dict, Any, Iterator
+from services.embedding_cache import get_embedding_cache
+from services.tokenizer import count_tokens, truncate_tokens
+from services.singleflight import SingleFlight, AsyncSingleFlight
+from services.async_runtime import run_on_runtime
+from services.deadline import Deadline, DeadlineExceeded, bound
+from services.embedding_batcher import EmbeddingBatcher
+from services import metrics
 
 logger = logging.getLogger(__name__)
 
+# Fallback replies; callers compare against these to avoid caching failures
+NOT_CONFIGURED_RESPONSE = "I'm sorry, but I'm not properly configured to respond right now. Please configure your OpenAI API key in the .env file."
+ERROR_RESPONSE = "I'm sorry, but I encountered an error while processing your request."
+TIMEOUT_RESPONSE = "I'm sorry, but that took too long to answer. Please try again."
+
+# Identical embedding/completion requests in flight at the same time share one
+# upstream call (e.g. a burst of users asking the same question)
+_embedding_flights = metrics.register('singleflight.embeddings', SingleFlight('embeddings'))
+# Async completions all run on the async runtime loop, so one loop-local instance covers them
+_async_completion_flights = metrics.register('singleflight.async_completions', AsyncSingleFlight('async_completions'))
+
+# Single-text embedding latency, which also sets when a slow request gets hedged
+_embedding_latency = metrics.latency('llm.embedding')
+_hedging = metrics.register('llm.embedding_hedges', metrics.Counter())
+_hedge_pool = ThreadPoolExecutor(max_workers=8, thread_name_prefix='embedding-hedge')
+
+# Model routing decisions, as '<model>:<reason>' and 'fallback:<reason>' counts
+_routing = metrics.register('llm.routing', metrics.Counter())
+# Questions asking for explanation or synthesis rather than a fact lookup
+_OPEN_ENDED = re.compile(r'\b(why|how (?:do|does|did|can|should|would)|explain|compare|summari[sz]e|analy[sz]e|recommend|pros and cons|difference)\b', re.IGNORECASE)
+
+# One query-embedding micro-batcher per embedding model, shared by all instances
+_embedding_batchers = {}
+_embedding_batchers_lock = threading.Lock()
+
+_shared_clients = {}
+_shared_clients_lock = threading.Lock()
+_shared_async_clients = {}
+_shared_instance = None
+_shared_instance_lock = threading.Lock()
+
+def get_llm_service() -> 'LLMService':
+    """Return the process-wide LLMService."""
+    global _shared_instance
+    if _shared_instance is None:
+        with _shared_instance_lock:
+            if _shared_instance is None:
+                _shared_instance = LLMService()
+    return _shared_instance
+
+def _http_settings():
+    """Connection pool limits and timeouts shared by the sync and async OpenAI clients."""
+    import httpx
+    
+    limits = httpx.Limits(
+        max_connections=int(os.getenv('OPENAI_MAX_CONNECTIONS', 100)),
+        max_keepalive_connections=int(os.getenv('OPENAI_MAX_KEEPALIVE_CONNECTIONS', 20)),
+        keepalive_expiry=float(os.getenv('OPENAI_KEEPALIVE_EXPIRY_SECONDS', 30))
+    )
+    timeout = httpx.Timeout(
+        float(os.getenv('OPENAI_READ_TIMEOUT_SECONDS', 60)),
+        connect=float(os.getenv('OPENAI_CONNECT_TIMEOUT_SECONDS', 5))
+    )
+    return limits, timeout
+
+def _get_openai_client(api_key: str):
+    """Process-wide OpenAI client for an API key, on a pooled keep-alive HTTP client.
+    
+    Sharing it means chat and embedding calls reuse warm TLS connections
+    instead of opening new ones per request.
+    """
+    client = _shared_clients.get(api_key)
+    if client is None:
+        with _shared_clients_lock:
+            client = _shared_clients.get(api_key)
+            if client is None:
+                import httpx
+                from openai import OpenAI
+                
+                limits, timeout = _http_settings()
+                client = _shared_clients[api_key] = OpenAI(
+                    api_key=api_key,
+                    http_client=httpx.Client(limits=limits, timeout=timeout),
+                    timeout=timeout,
+                    max_retries=int(os.getenv('OPENAI_MAX_RETRIES', 2))
+                )
+    return client
+
+def _get_async_openai_client(api_key: str):
+    """AsyncOpenAI counterpart of _get_openai_client; only used on the async runtime loop."""
+    client = _shared_async_clients.get(api_key)
+    if client is None:
+        import httpx
+        from openai import AsyncOpenAI
+        
+        limits, timeout = _http_settings()
+        client = _shared_async_clients[api_key] = AsyncOpenAI(
+            api_key=api_key,
+            http_client=httpx.AsyncClient(limits=limits, timeout=timeout),
+            timeout=timeout,
+            max_retries=int(os.getenv('OPENAI_MAX_RETRIES', 2))
+        )
+    return client
+
 class LLMService:
     def __init__(self):
         self.api_key = os.getenv('OPENAI_API_KEY')
         self.model = os.getenv('OPENAI_MODEL', 'gpt-4')
+        # Optional cheaper model for simple lookups; unset sends everything to OPENAI_MODEL
+        self.fast_model = os.getenv('OPENAI_FAST_MODEL', '')
+        self.fast_model_max_tokens = int(os.getenv('OPENAI_FAST_MODEL_MAX_TOKENS', 500))
+        self.cascade_max_question_tokens = int(os.getenv('CASCADE_MAX_QUESTION_TOKENS', 24))
+        self.cascade_min_similarity = float(os.getenv('CASCADE_MIN_SIMILARITY', 0.5))
+        self.cascade_deadline = float(os.getenv('CASCADE_DEADLINE_SECONDS', 20))
         self.embedding_model = os.getenv('OPENAI_EMBEDDING_MODEL', 'text-embedding-3-small')
+        # Per-request caps for batched embedding calls (the API allows 2048 inputs / 300k tokens)
+        self.embedding_batch_size = int(os.getenv('OPENAI_EMBEDDING_BATCH_SIZE', 512))
+        self.embedding_batch_tokens = int(os.getenv('OPENAI_EMBEDDING_BATCH_TOKENS', 100000))
+        self.embedding_cache = get_embedding_cache()
+        # Prompt tokens available for retrieved context, and the overlap above
+        # which a chunk counts as a duplicate of one already packed
+        self.context_token_budget = int(os.getenv('CONTEXT_TOKEN_BUDGET', 3000))
+        self.context_overlap_threshold = float(os.getenv('CONTEXT_OVERLAP_THRESHOLD', 0.8))
+        # How long a duplicate request waits on an in-flight call before issuing its own
+        self.embedding_flight_timeout = float(os.getenv('SINGLEFLIGHT_EMBEDDING_TIMEOUT_SECONDS', 10))
+        self.completion_flight_timeout = float(os.getenv('SINGLEFLIGHT_COMPLETION_TIMEOUT_SECONDS', 60))
+        # Duplicate a query embedding that runs past the observed p95 and take the first result
+        self.embedding_hedge_enabled = os.getenv('EMBEDDING_HEDGE_ENABLED', 'true').lower() == 'true'
+        self.embedding_hedge_min_samples = int(os.getenv('EMBEDDING_HEDGE_MIN_SAMPLES', 50))
+        # Single-text embeddings arriving within this window are sent as one request (0 disables)
+        self.embedding_microbatch_window_ms = float(os.getenv('EMBEDDING_MICROBATCH_WINDOW_MS', 5))
+        self.embedding_microbatch_max_items = int(os.getenv('EMBEDDING_MICROBATCH_MAX_ITEMS', 64))
+        self.embedding_microbatch_concurrency = int(os.getenv('EMBEDDING_MICROBATCH_CONCURRENCY', 4))
         
         # Check if API key is properly configured
         if self.api_key and self.api_key != 'your_openai_api_key_here':
             try:
-                from openai import OpenAI
-                self.client = OpenAI(api_key=self.api_key)
+                self.client = _get_openai_client(self.api_key)
                 logger.info("OpenAI client initialized successfully")
             except ImportError:
                 logger.error("OpenAI package not installed. Run: pip install openai")
@@ -26,61 +157,284 @@ class LLMService:
             logger.warning("OpenAI API key not configured. Set OPENAI_API_KEY in your .env file")
             self.client = None
     
-    def generate_response(self, message: str, context_docs: List[Dict], user_role: str) -> str:
-        """Generate a response using the LLM with RAG context."""
+    async def agenerate_response(self, message: str, context_docs: List[Dict], user_role: str, deadline: Deadline = None) -> str:
+        """Generate a response using the LLM with RAG context.
+        
+        Simple lookups go to OPENAI_FAST_MODEL (see _route); the large model
+        gets CASCADE_DEADLINE_SECONDS before the fast model answers instead.
+        Every call is also bounded by the request's deadline, if given. The
+        OpenAI call is awaited on the shared async runtime loop.
+        """
         try:
             if not self.client:
-                return "I'm sorry, but I'm not properly configured to respond right now. Please configure your OpenAI API key in the .env file."
+                return NOT_CONFIGURED_RESPONSE
             
-            # Build context from relevant documents
-            context = self._build_context(context_docs)
+            messages = self._build_messages(message, context_docs, user_role)
+            model = self._route(message, context_docs)
+            if model == self.model and self.fast_model:
+                try:
+                    return await self._acomplete(self.model, messages, deadline, cap=self.cascade_deadline)
+                except Exception as e:
+                    self._record_fallback(e)
+                    return await self._acomplete(self.fast_model, messages, deadline)
+            return await self._acomplete(model, messages, deadline)
             
-            # Create system prompt based on user role
-            system_prompt = self._create_system_prompt(user_role)
+        except Exception as e:
+            if deadline is not None and deadline.expired:
+                logger.warning(f"Async LLM response generation ran out of time: {e!r}")
+                return TIMEOUT_RESPONSE
+            logger.error(f"Async LLM response generation error: {e}")
+            return ERROR_RESPONSE
+    
+    async def _acomplete(self, model: str, messages: List[Dict[str, str]], deadline: Deadline = None, cap: float = None) -> str:
+        """One (coalesced) completion call, bounded by `cap` seconds and the deadline.
+        
+        The shared call is bounded by `cap` (or SINGLEFLIGHT_COMPLETION_TIMEOUT_SECONDS)
+        alone, never by one caller's deadline, and gets no retries, so a call the
+        cascade has given up on stops soon after; the deadline only bounds this
+        caller's wait for it.
+        """
+        timeout = min(cap, self.completion_flight_timeout) if cap else self.completion_flight_timeout
+        
+        async def complete():
+            client = _get_async_openai_client(self.api_key).with_options(max_retries=0)
+            start = time.perf_counter()
+            response = await client.chat.completions.create(
+                model=model,
+                messages=messages,
+                max_tokens=self._max_tokens(model),
+                temperature=0.7,
+                timeout=timeout
+            )
+            metrics.latency(f'llm.{model}').record((time.perf_counter() - start) * 1000)
+            return response.choices[0].message.content.strip()
+        
+        key = self._completion_key(model, messages)
+        flight = _async_completion_flights.do(key, complete, timeout=self.completion_flight_timeout)
+        return await asyncio.wait_for(run_on_runtime(flight), bound(deadline, cap))
+    
+    def _route(self, message: str, context_docs: List[Dict]) -> str:
+        """Pick the model for a question and record why.
+        
+        Short questions whose best retrieved chunk is a confident match are
+        lookups the fast model handles well; anything long, open-ended or
+        poorly grounded in the context goes to the large model.
+        """
+        if not self.fast_model:
+            return self.model
+        
+        top_similarity = max((doc.get('similarity', 0.0) for doc in context_docs), default=0.0)
+        if count_tokens(message, self.model) > self.cascade_max_question_tokens:
+            reason = 'long_question'
+        elif _OPEN_ENDED.search(message):
+            reason = 'open_ended'
+        elif top_similarity < self.cascade_min_similarity:
+            reason = 'low_confidence'
+        else:
+            reason = 'simple_lookup'
+        
+        model = self.fast_model if reason == 'simple_lookup' else self.model
+        _routing.increment(f'{model}:{reason}')
+        return model
+    
+    def _record_fallback(self, error: Exception):
+        # asyncio.wait_for raises TimeoutError, the OpenAI client APITimeoutError
+        reason = 'deadline' if type(error).__name__ in ('TimeoutError', 'APITimeoutError', 'DeadlineExceeded') else 'error'
+        _routing.increment(f'fallback:{reason}')
+        logger.warning(f"{self.model} failed ({reason}: {error!r}); answering with {self.fast_model}")
+    
+    def _max_tokens(self, model: str) -> int:
+        return self.fast_model_max_tokens if model == self.fast_model and model != self.model else 1000
+    
+    def stream_response(self, message: str, context_docs: List[Dict], user_role: str, deadline: Deadline = None) -> Iterator[Dict[str, Any]]:
+        """Generate a response as a stream of events.
+        
+        Yields {'type': 'delta', 'content': ...} for each token chunk, then one
+        {'type': 'done', 'usage': ..., 'timings': ...} or {'type': 'error', 'error': ...}.
+        With a deadline, opening the stream and each read from it are bounded by
+        the time left, and a stream still running when it expires is cut off
+        with a TIMEOUT_RESPONSE error.
+        """
+        start = time.perf_counter()
+        
+        if not self.client:
+            yield {'type': 'delta', 'content': NOT_CONFIGURED_RESPONSE}
+            yield {'type': 'done', 'usage': None, 'timings': {'total_ms': 0.0}}
+            return
+        
+        try:
+            messages = self._build_messages(message, context_docs, user_role)
+            model = self._route(message, context_docs)
+            try:
+                # Only the wait for the stream to open is bounded by the cascade deadline
+                stream = self._open_stream(model, messages, bound(deadline, self.cascade_deadline if model == self.model and self.fast_model else None))
+            except Exception as e:
+                if model != self.model or not self.fast_model or isinstance(e, DeadlineExceeded):
+                    raise
+                self._record_fallback(e)
+                model = self.fast_model
+                stream = self._open_stream(model, messages, bound(deadline))
             
-            # Build the full prompt
-            full_prompt = f"{system_prompt}\n\nContext:\n{context}\n\nUser Question: {message}\n\nAnswer:"
+            first_token_ms = None
+            completion_chunks = 0
+            for chunk in stream:
+                if deadline is not None and deadline.expired:
+                    stream.close()
+                    raise DeadlineExceeded(f"stream still open after the {deadline.seconds}s deadline")
+                if not chunk.choices:
+                    continue
+                content = chunk.choices[0].delta.content
+                if not content:
+                    continue
+                if first_token_ms is None:
+                    first_token_ms = (time.perf_counter() - start) * 1000
+                completion_chunks += 1
+                yield {'type': 'delta', 'content': content}
             
-            response = self.client.chat.completions.create(
-                model=self.model,
-                messages=[
-                    {"role": "system", "content": system_prompt},
-                    {"role": "user", "content": f"Context:\n{context}\n\nQuestion: {message}"}
-                ],
-                max_tokens=1000,
-                temperature=0.7
-            )
+            metrics.latency(f'llm.{model}').record((time.perf_counter() - start) * 1000)
             
-            return response.choices[0].message.content.strip()
+            # Streamed completions carry no usage block; each content chunk is one
+            # token and the prompt is counted locally
+            prompt_tokens = self._count_message_tokens(messages)
+            yield {
+                'type': 'done',
+                'usage': {
+                    'prompt_tokens': prompt_tokens,
+                    'completion_tokens': completion_chunks,
+                    'total_tokens': prompt_tokens + completion_chunks,
+                    'estimated': True
+                },
+                'model': model,
+                'timings': {
+                    'first_token_ms': round(first_token_ms, 2) if first_token_ms is not None else None,
+                    'total_ms': round((time.perf_counter() - start) * 1000, 2)
+                }
+            }
             
         except Exception as e:
-            logger.error(f"LLM response generation error: {e}")
-            return "I'm sorry, but I encountered an error while processing your request."
+            if deadline is not None and deadline.expired:
+                logger.warning(f"LLM streaming ran out of time: {e!r}")
+                yield {'type': 'error', 'error': TIMEOUT_RESPONSE}
+                return
+            logger.error(f"LLM streaming error: {e}")
+            yield {'type': 'error', 'error': ERROR_RESPONSE}
+    
+    def _open_stream(self, model: str, messages: List[Dict[str, str]], timeout: float = None):
+        """Open a completion stream; `timeout` bounds opening it and every read, without retries."""
+        if not timeout:
+            # An explicit timeout=None would turn the client's default timeout off
+            return self.client.chat.completions.create(
+                model=model,
+                messages=messages,
+                max_tokens=self._max_tokens(model),
+                temperature=0.7,
+                stream=True
+            )
+        return self.client.with_options(max_retries=0).chat.completions.create(
+            model=model,
+            messages=messages,
+            max_tokens=self._max_tokens(model),
+            temperature=0.7,
+            stream=True,
+            timeout=timeout
+        )
+    
+    def estimate_tokens(self, message: str, context_docs: List[Dict], user_role: str, response: str = '') -> int:
+        """Prompt plus completion tokens a response to this question costs."""
+        messages = self._build_messages(message, context_docs, user_role)
+        return self._count_message_tokens(messages) + count_tokens(response, self.model)
+    
+    def _count_message_tokens(self, messages: List[Dict[str, str]]) -> int:
+        return sum(count_tokens(m['content'], self.model) for m in messages)
+    
+    def _completion_key(self, model: str, messages: List[Dict[str, str]]):
+        return (model, hashlib.sha256(json.dumps(messages, sort_keys=True).encode('utf-8')).hexdigest())
+    
+    def _build_messages(self, message: str, context_docs: List[Dict], user_role: str) -> List[Dict[str, str]]:
+        """Chat messages for a RAG question: role-specific system prompt plus context and question."""
+        # Build context from relevant documents
+        context = self._build_context(context_docs)
+        
+        # Create system prompt based on user role
+        system_prompt = self._create_system_prompt(user_role)
+        
+        return [
+            {"role": "system", "content": system_prompt},
+            {"role": "user", "content": f"Context:\n{context}\n\nQuestion: {message}"}
+        ]
     
     def _build_context(self, context_docs: List[Dict]) -> str:
-        """Build context string from relevant documents."""
+        """Build context string from relevant documents.
+        
+        Documents are packed greedily by similarity into CONTEXT_TOKEN_BUDGET
+        tokens of the chat model. Chunks that mostly repeat one already packed
+        are skipped, and the last one that fits is truncated.
+        """
         if not context_docs:
             return "No relevant context found."
         
+        ranked = sorted(context_docs, key=lambda doc: doc.get('similarity', 0.0), reverse=True)
+        
         context_parts = []
-        for i, doc in enumerate(context_docs[:5], 1):  # Limit to top 5 docs
+        packed_shingles = []
+        remaining = self.context_token_budget
+        for doc in ranked:
             source = doc.get('source', 'Unknown')
-            content = doc.get('content', '')
+            content = doc.get('content', '').strip()
             metadata = doc.get('metadata', {})
+            if not content:
+                continue
+            
+            shingles = self._shingles(content)
+            if any(self._overlap(shingles, seen) >= self.context_overlap_threshold for seen in packed_shingles):
+                continue
             
-            context_part = f"{i}. Source: {source}"
+            context_part = f"{len(context_parts) + 1}. Source: {source}"
             if metadata.get('channel'):
                 context_part += f" (Channel: {metadata['channel']})"
             if metadata.get('author'):
                 context_part += f" (Author: {metadata['author']})"
             if metadata.get('timestamp'):
                 context_part += f" (Time: {metadata['timestamp']})"
+            context_part += "\nContent: "
+            
+            header_tokens = count_tokens(context_part, self.model)
+            content_tokens = count_tokens(content, self.model)
+            if header_tokens + content_tokens > remaining:
+                # Only worth truncating if a meaningful piece of the chunk still fits;
+                # otherwise a shorter, lower-ranked document may still fit whole
+                if remaining - header_tokens < 50:
+                    continue
+                content = truncate_tokens(content, remaining - header_tokens - 1, self.model) + "..."
+                content_tokens = count_tokens(content, self.model)
             
-            context_part += f"\nContent: {content}\n"
-            context_parts.append(context_part)
+            context_parts.append(context_part + content + "\n")
+            packed_shingles.append(shingles)
+            remaining -= header_tokens + content_tokens
+            if remaining <= 0:
+                break
+        
+        if not context_parts:
+            return "No relevant context found."
         
+        logger.debug(f"Packed {len(context_parts)}/{len(context_docs)} documents into {self.context_token_budget - remaining} context tokens")
         return "\n".join(context_parts)
     
+    @staticmethod
+    def _shingles(text: str, size: int = 5) -> set:
+        """Word n-grams used to spot repeated or overlapping chunks."""
+        words = text.lower().split()
+        if len(words) <= size:
+            return {' '.join(words)}
+        return {' '.join(words[i:i + size]) for i in range(len(words) - size + 1)}
+    
+    @staticmethod
+    def _overlap(shingles: set, other: set) -> float:
+        """Share of the smaller shingle set also found in the other (1.0 = contained)."""
+        if not shingles or not other:
+            return 0.0
+        return len(shingles & other) / min(len(shingles), len(other))
+    
     def _create_system_prompt(self, user_role: str) -> str:
         """Create a system prompt tailored to the user's role."""
         base_prompt = """You are an internal AI assistant that helps users find and understand information from their organization's data sources (Slack, GitHub, and Outlook).
@@ -103,20 +457,171 @@ You should:
         
         return f"{base_prompt}\n\n{role_prompt}"
     
-    def get_embeddings(self, text: str) -> List[float]:
-        """Get embeddings for a text string."""
+    def get_embeddings(self, text: str, deadline: Deadline = None) -> List[float]:
+        """Get embeddings for a text string, within the deadline if one is given."""
         try:
+            if self.embedding_cache:
+                cached = self.embedding_cache.get(self.embedding_model, text)
+                if cached is not None:
+                    return cached
+            
             if not self.client:
                 logger.warning("Cannot generate embeddings: OpenAI client not initialized")
                 return []
             
-            response = self.client.embeddings.create(
-                model=self.embedding_model,
-                input=text
-            )
+            def embed():
+                start = time.perf_counter()
+                batcher = self._embedding_batcher()
+                primary = batcher.submit(text) if batcher else _hedge_pool.submit(self._embed_one, text)
+                # Shared by every caller of this text, so bounded by the per-key cap, not by the leader's deadline
+                embedding = self._await_embedding(primary, text, Deadline(self.embedding_flight_timeout))
+                _embedding_latency.record((time.perf_counter() - start) * 1000)
+                if self.embedding_cache:
+                    self.embedding_cache.put(self.embedding_model, text, embedding)
+                return embedding
             
-            return response.data[0].embedding
+            key = (self.embedding_model, hashlib.sha256(text.encode('utf-8')).hexdigest())
+            return _embedding_flights.do(key, embed, timeout=self.embedding_flight_timeout, deadline=deadline)
             
+        except (DeadlineExceeded, FutureTimeoutError) as e:
+            logger.warning(f"Embedding generation ran out of time: {e!r}")
+            return []
         except Exception as e:
             logger.error(f"Embedding generation error: {e}")
             return []
+    
+    def get_embeddings_batch(self, texts: List[str], deadline: Deadline = None, use_cache: bool = True) -> List[List[float]]:
+        """Get embeddings for many texts, packing them into as few requests as the caps allow.
+        
+        Returns one embedding per input, in order; inputs whose request failed get [].
+        With a deadline, requests are sent without retries and bounded by the time
+        left, and inputs not reached before it expires get [] too. `use_cache=False`
+        bypasses the shared embedding cache, for callers that keep their own.
+        """
+        embeddings = [[] for _ in texts]
+        cache = self.embedding_cache if use_cache else None
+        
+        # Only texts the cache has never seen go to the API
+        pending = list(range(len(texts)))
+        if cache:
+            cached = cache.get_many(self.embedding_model, texts)
+            pending = []
+            for i, embedding in enumerate(cached):
+                if embedding is not None:
+                    embeddings[i] = embedding
+                else:
+                    pending.append(i)
+        
+        if not pending:
+            return embeddings
+        if not self.client:
+            logger.warning("Cannot generate embeddings: OpenAI client not initialized")
+            return embeddings
+        
+        pending_texts = [texts[i] for i in pending]
+        client = self.client.with_options(max_retries=0) if deadline is not None else self.client
+        for start, end in self._embedding_batches(pending_texts):
+            try:
+                options = {'timeout': deadline.bound()} if deadline is not None else {}
+                response = client.embeddings.create(
+                    model=self.embedding_model,
+                    input=pending_texts[start:end],
+                    **options
+                )
+                for item in response.data:
+                    embeddings[pending[start + item.index]] = item.embedding
+                
+                if cache:
+                    cache.put_many(
+                        self.embedding_model,
+                        pending_texts[start:end],
+                        [embeddings[i] for i in pending[start:end]]
+                    )
+                    
+            except DeadlineExceeded as e:
+                logger.warning(f"Batch embedding ran out of time at input {start}: {e}")
+                break
+            except Exception as e:
+                if deadline is not None and deadline.expired:
+                    logger.warning(f"Batch embedding ran out of time at input {start}: {e!r}")
+                    break
+                logger.error(f"Batch embedding generation error for inputs {start}-{end - 1}: {e}")
+        
+        return embeddings
+    
+    def _embed_one(self, text: str) -> List[float]:
+        return self._embed_texts([text])[0]
+    
+    def _await_embedding(self, primary: Future, text: str, deadline: Deadline = None) -> List[float]:
+        """Wait for an embedding, hedging with a duplicate direct request once it runs past p95.
+        
+        Whichever request succeeds first wins; the other is left to finish on its own.
+        """
+        hedge_after = self._hedge_delay()
+        if hedge_after is None:
+            return primary.result(timeout=bound(deadline))
+        
+        try:
+            return primary.result(timeout=bound(deadline, hedge_after))
+        except FutureTimeoutError:
+            pass
+        
+        _hedging.increment('sent')
+        hedge = _hedge_pool.submit(self._embed_one, text)
+        pending = {primary, hedge}
+        while pending:
+            done, pending = wait(pending, timeout=bound(deadline), return_when=FIRST_COMPLETED)
+            if not done:
+                raise DeadlineExceeded("embedding not ready before the deadline")
+            for future in done:
+                if future.exception() is None:
+                    if future is hedge:
+                        _hedging.increment('won')
+                    return future.result()
+        raise primary.exception()
+    
+    def _hedge_delay(self):
+        """Seconds to wait before hedging (the observed p95), or None while hedging is off or unwarmed."""
+        if not self.embedding_hedge_enabled or len(_embedding_latency) < self.embedding_hedge_min_samples:
+            return None
+        return _embedding_latency.percentile(0.95) / 1000
+    
+    def _embed_texts(self, texts: List[str]) -> List[List[float]]:
+        """One embeddings request for the given texts, results in input order."""
+        response = self.client.embeddings.create(
+            model=self.embedding_model,
+            input=texts
+        )
+        return [item.embedding for item in sorted(response.data, key=lambda item: item.index)]
+    
+    def _embedding_batcher(self):
+        """The shared micro-batcher for this embedding model, or None when disabled."""
+        if self.embedding_microbatch_window_ms <= 0:
+            return None
+        batcher = _embedding_batchers.get(self.embedding_model)
+        if batcher is None:
+            with _embedding_batchers_lock:
+                batcher = _embedding_batchers.get(self.embedding_model)
+                if batcher is None:
+                    batcher = _embedding_batchers[self.embedding_model] = EmbeddingBatcher(
+                        'embedding_batcher',
+                        self._embed_texts,
+                        self.embedding_microbatch_window_ms,
+                        self.embedding_microbatch_max_items,
+                        self.embedding_microbatch_concurrency
+                    )
+        return batcher
+    
+    def _embedding_batches(self, texts: List[str]):
+        """Yield (start, end) slices that respect the per-request item and token caps."""
+        start = 0
+        tokens = 0
+        for i, text in enumerate(texts):
+            # Rough count (~4 characters per token) so packing needs no tokenizer
+            text_tokens = len(text) // 4 + 1
+            if i > start and (i - start >= self.embedding_batch_size or tokens + text_tokens > self.embedding_batch_tokens):
+                yield start, i
+                start, tokens = i, 0
+            tokens += text_tokens
+        if start < len(texts):
+            yield start, len(texts)
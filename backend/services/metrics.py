@@ -0,0 +1,105 @@
+import threading
+from collections import deque
+from typing import Dict, Any
+
+_registry = {}
+_registry_lock = threading.Lock()
+
+class LatencyWindow:
+    """Percentiles over the most recent latency samples, in milliseconds."""
+
+    def __init__(self, size: int = 1000):
+        self._samples = deque(maxlen=size)
+        self._count = 0
+        self._lock = threading.Lock()
+
+    def record(self, ms: float):
+        with self._lock:
+            self._samples.append(ms)
+            self._count += 1
+
+    def __len__(self) -> int:
+        with self._lock:
+            return len(self._samples)
+
+    def percentile(self, q: float) -> float:
+        with self._lock:
+            samples = sorted(self._samples)
+        if not samples:
+            return 0.0
+        return samples[min(len(samples) - 1, int(q * len(samples)))]
+
+    def summary(self) -> Dict[str, Any]:
+        with self._lock:
+            samples = sorted(self._samples)
+            count = self._count
+        if not samples:
+            return {'count': count}
+        pick = lambda q: round(samples[min(len(samples) - 1, int(q * len(samples)))], 2)
+        return {'count': count, 'p50_ms': pick(0.5), 'p95_ms': pick(0.95), 'p99_ms': pick(0.99), 'max_ms': round(samples[-1], 2)}
+
+class Histogram:
+    """Counts of observed values in fixed upper-bound buckets."""
+
+    def __init__(self, buckets):
+        self.buckets = sorted(buckets)
+        self._counts = [0] * (len(self.buckets) + 1)
+        self._count = 0
+        self._total = 0.0
+        self._max = 0.0
+        self._lock = threading.Lock()
+
+    def observe(self, value: float):
+        with self._lock:
+            slot = next((i for i, bound in enumerate(self.buckets) if value <= bound), len(self.buckets))
+            self._counts[slot] += 1
+            self._count += 1
+            self._total += value
+            self._max = max(self._max, value)
+
+    def summary(self) -> Dict[str, Any]:
+        with self._lock:
+            if not self._count:
+                return {'count': 0}
+            labels = [f"le_{bound:g}" for bound in self.buckets] + ['inf']
+            return {
+                'count': self._count,
+                'mean': round(self._total / self._count, 2),
+                'max': self._max,
+                'buckets': dict(zip(labels, self._counts))
+            }
+
+class Counter:
+    """Monotonic counts per label."""
+
+    def __init__(self):
+        self._counts = {}
+        self._lock = threading.Lock()
+
+    def increment(self, label: str, amount: int = 1):
+        with self._lock:
+            self._counts[label] = self._counts.get(label, 0) + amount
+
+    def summary(self) -> Dict[str, int]:
+        with self._lock:
+            return dict(sorted(self._counts.items()))
+
+def latency(name: str) -> LatencyWindow:
+    """Get (or create) the named process-wide latency window."""
+    with _registry_lock:
+        window = _registry.get(name)
+        if window is None:
+            window = _registry[name] = LatencyWindow()
+        return window
+
+def register(name: str, metric):
+    """Expose any object with a summary() method under `name` in the snapshot."""
+    with _registry_lock:
+        _registry[name] = metric
+    return metric
+
+def snapshot() -> Dict[str, Any]:
+    """Summaries of every registered metric, for the /metrics endpoint."""
+    with _registry_lock:
+        items = list(_registry.items())
+    return {name: metric.summary() for name, metric in sorted(items)}
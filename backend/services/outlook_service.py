@@ -3,6 +3,7 @@ import logging
 import requests
 from typing import List, Dict, Any
 from datetime import datetime, timedelta
+from services.deadline import http_timeout
 
 logger = logging.getLogger(__name__)
 
@@ -12,6 +13,7 @@ class OutlookService:
         self.client_secret = os.getenv('MICROSOFT_CLIENT_SECRET')
         self.tenant_id = os.getenv('MICROSOFT_TENANT_ID')
         self.base_url = "https://graph.microsoft.com/v1.0"
+        self.timeout = http_timeout()
         self.access_token = None
         self.last_sync_time = None
         
@@ -73,7 +75,7 @@ class OutlookService:
                 'grant_type': 'client_credentials'
             }
             
-            response = requests.post(token_url, data=data)
+            response = requests.post(token_url, data=data, timeout=self.timeout)
             response.raise_for_status()
             
             token_data = response.json()
@@ -112,7 +114,7 @@ class OutlookService:
                 '$select': 'id,subject,bodyPreview,receivedDateTime,from,toRecipients,isRead'
             }
             
-            response = requests.get(url, headers=headers, params=params)
+            response = requests.get(url, headers=headers, params=params, timeout=self.timeout)
             response.raise_for_status()
             
             emails = []
@@ -166,7 +168,7 @@ class OutlookService:
                 '$select': 'id,subject,bodyPreview,receivedDateTime,from,toRecipients'
             }
             
-            response = requests.get(url, headers=headers, params=params)
+            response = requests.get(url, headers=headers, params=params, timeout=self.timeout)
             response.raise_for_status()
             
             emails = []
@@ -211,7 +213,7 @@ class OutlookService:
             }
             
             url = f"{self.base_url}/me/mailFolders"
-            response = requests.get(url, headers=headers)
+            response = requests.get(url, headers=headers, timeout=self.timeout)
             response.raise_for_status()
             
             folders = []
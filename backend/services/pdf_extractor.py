@@ -0,0 +1,137 @@
+import os
+import logging
+import threading
+import multiprocessing
+from collections import deque
+from concurrent.futures import Future, ProcessPoolExecutor
+from concurrent.futures.process import BrokenProcessPool
+from itertools import islice
+from typing import List, Callable, Iterator, Optional
+
+import PyPDF2
+
+logger = logging.getLogger(__name__)
+
+# PDFs with fewer pages are extracted in-process; the pool's overhead isn't worth it
+PDF_PARALLEL_MIN_PAGES = int(os.getenv('PDF_PARALLEL_MIN_PAGES', 50))
+PDF_PAGES_PER_TASK = int(os.getenv('PDF_PAGES_PER_TASK', 25))
+PDF_EXTRACTION_WORKERS = int(os.getenv('PDF_EXTRACTION_WORKERS', 0)) or os.cpu_count() or 1
+
+_pool = None
+_pool_lock = threading.Lock()
+
+def _get_pool() -> ProcessPoolExecutor:
+    """Return the process-wide extraction pool, started on first use."""
+    global _pool
+    if _pool is None:
+        with _pool_lock:
+            if _pool is None:
+                # spawn, not fork: the server process is multi-threaded
+                _pool = ProcessPoolExecutor(
+                    max_workers=PDF_EXTRACTION_WORKERS,
+                    mp_context=multiprocessing.get_context('spawn')
+                )
+    return _pool
+
+def _reset_pool(pool: ProcessPoolExecutor):
+    global _pool
+    with _pool_lock:
+        if _pool is pool:
+            _pool = None
+    pool.shutdown(wait=False, cancel_futures=True)
+
+def extract_page_range(file_path: str, start: int, end: int) -> List[str]:
+    """Text of pages [start, end) of a PDF, one string per page.
+
+    Runs in pool worker processes, so it opens the file itself.
+    """
+    with open(file_path, 'rb') as file:
+        return _extract_pages(PyPDF2.PdfReader(file), start, end, file_path)
+
+def iter_pdf_pages(file_path: str, progress: Callable[..., None] = None) -> Iterator[str]:
+    """Text of each page of a PDF, yielded in page order.
+
+    Large PDFs are split into PDF_PAGES_PER_TASK page ranges extracted in
+    parallel on the process pool, with at most two ranges per worker in
+    flight so memory stays bounded however long the file is; smaller ones
+    (or a broken pool) are extracted in this process. `progress` is called
+    with pages_extracted and pages_total as pages are yielded.
+    """
+    report = progress or (lambda **_: None)
+    with open(file_path, 'rb') as file:
+        pdf_reader = PyPDF2.PdfReader(file)
+        pages_total = len(pdf_reader.pages)
+        report(pages_extracted=0, pages_total=pages_total)
+
+        starts = iter(range(0, pages_total, PDF_PAGES_PER_TASK))
+        pending = deque()
+        pool = None
+        if pages_total >= PDF_PARALLEL_MIN_PAGES and PDF_EXTRACTION_WORKERS > 1:
+            pool = _get_pool()
+            for start in islice(starts, PDF_EXTRACTION_WORKERS * 2):
+                pending.append((start, _submit(pool, file_path, start, pages_total)))
+
+        pages_extracted = 0
+        try:
+            while True:
+                if pending:
+                    start, future = pending.popleft()
+                    texts = _range_result(future, pdf_reader, start, pages_total, file_path)
+                    if texts is None:
+                        # The pool died; finish this and every later range in-process
+                        logger.error(f"PDF extraction pool failed, extracting {os.path.basename(file_path)} serially")
+                        _reset_pool(pool)
+                        pool = None
+                        starts = iter([start] + [queued for queued, _ in pending] + list(starts))
+                        pending.clear()
+                        continue
+                    next_start = next(starts, None)
+                    if next_start is not None:
+                        pending.append((next_start, _submit(pool, file_path, next_start, pages_total)))
+                else:
+                    start = next(starts, None)
+                    if start is None:
+                        return
+                    texts = _extract_pages(pdf_reader, start, _range_end(start, pages_total), file_path)
+
+                pages_extracted += len(texts)
+                yield from texts
+                report(pages_extracted=pages_extracted)
+        finally:
+            # Ranges a consumer that stopped early will never read
+            for _, future in pending:
+                future.cancel()
+
+def _range_end(start: int, pages_total: int) -> int:
+    return min(start + PDF_PAGES_PER_TASK, pages_total)
+
+def _submit(pool: ProcessPoolExecutor, file_path: str, start: int, pages_total: int) -> Future:
+    try:
+        return pool.submit(extract_page_range, file_path, start, _range_end(start, pages_total))
+    except RuntimeError as e:
+        # Broken or shut down by another job; surfaces like a worker crash
+        future = Future()
+        future.set_exception(BrokenProcessPool(str(e)))
+        return future
+
+def _range_result(future, pdf_reader: PyPDF2.PdfReader, start: int, pages_total: int, file_path: str) -> Optional[List[str]]:
+    """Pages extracted by a pool task, or None if the pool itself broke."""
+    try:
+        return future.result()
+    except BrokenProcessPool:
+        return None
+    except Exception as e:
+        # A range that cannot even be opened in the worker is retried here, page by page
+        logger.warning(f"Failed to extract pages from {start + 1} of {os.path.basename(file_path)} in the pool: {e}")
+        return _extract_pages(pdf_reader, start, _range_end(start, pages_total), file_path)
+
+def _extract_pages(pdf_reader: PyPDF2.PdfReader, start: int, end: int, file_path: str) -> List[str]:
+    # A page that fails to extract comes back as '' rather than failing the document
+    texts = []
+    for number in range(start, end):
+        try:
+            texts.append(pdf_reader.pages[number].extract_text() or '')
+        except Exception as e:
+            logger.warning(f"Skipping page {number + 1} of {os.path.basename(file_path)}: {e}")
+            texts.append('')
+    return texts
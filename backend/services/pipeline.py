@@ -0,0 +1,69 @@
+import queue
+import logging
+import threading
+from typing import Iterable, Iterator, TypeVar
+
+logger = logging.getLogger(__name__)
+
+T = TypeVar('T')
+
+class _End:
+    def __init__(self, error: BaseException = None):
+        self.error = error
+
+def bounded_stage(items: Iterable[T], maxsize: int, name: str) -> Iterator[T]:
+    """Iterate `items` on a background thread, at most `maxsize` items ahead of the consumer.
+
+    Chaining stages lets each one (extracting, embedding, ...) work while the
+    next is busy, while the bounded queue keeps a fast producer from piling
+    its output up in memory. Exceptions from the producer are re-raised to
+    the consumer; a consumer that stops early stops the producer too.
+    """
+    handoff = queue.Queue(maxsize=max(1, maxsize))
+    stopped = threading.Event()
+
+    def put(item) -> bool:
+        while not stopped.is_set():
+            try:
+                handoff.put(item, timeout=0.1)
+                return True
+            except queue.Full:
+                continue
+        return False
+
+    def produce():
+        try:
+            for item in items:
+                if not put(item):
+                    return
+            put(_End())
+        except BaseException as e:
+            put(_End(e))
+        finally:
+            close = getattr(items, 'close', None)
+            if close:
+                close()
+
+    thread = threading.Thread(target=produce, name=f'{name}-stage', daemon=True)
+    thread.start()
+    try:
+        while True:
+            item = handoff.get()
+            if isinstance(item, _End):
+                if item.error is not None:
+                    raise item.error
+                return
+            yield item
+    finally:
+        stopped.set()
+
+def batched(items: Iterable[T], size: int) -> Iterator[list]:
+    """Consecutive lists of up to `size` items."""
+    batch = []
+    for item in items:
+        batch.append(item)
+        if len(batch) >= size:
+            yield batch
+            batch = []
+    if batch:
+        yield batch
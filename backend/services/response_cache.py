@@ -0,0 +1,126 @@
+import os
+import re
+import logging
+import hashlib
+import threading
+import time
+from collections import OrderedDict
+from typing import List, Dict, Any, Optional
+
+logger = logging.getLogger(__name__)
+
+_shared_cache = None
+_shared_cache_lock = threading.Lock()
+
+def get_response_cache() -> Optional['ResponseCache']:
+    """Return the process-wide answer cache, or None when disabled.
+
+    The cache is subscribed to the vector store, so answers built on a chunk
+    that is later deleted or changed are dropped.
+    """
+    global _shared_cache
+    if _shared_cache is None:
+        with _shared_cache_lock:
+            if _shared_cache is None:
+                if os.getenv('RESPONSE_CACHE_ENABLED', 'true').lower() != 'true':
+                    _shared_cache = False
+                else:
+                    from services.vector_service import get_vector_service
+                    cache = ResponseCache()
+                    get_vector_service().add_listener(cache.invalidate)
+                    _shared_cache = cache
+    return _shared_cache or None
+
+class ResponseCache:
+    """TTL + LRU cache of chat answers.
+
+    Keys combine the normalized question, the user role and a fingerprint of
+    the retrieved chunk ids, so an answer is only reused when it would have
+    been generated from exactly the same context.
+    """
+
+    def __init__(self):
+        self.ttl = float(os.getenv('RESPONSE_CACHE_TTL_SECONDS', 3600))
+        self.max_items = int(os.getenv('RESPONSE_CACHE_MAX_ITEMS', 1000))
+
+        self._entries = OrderedDict()
+        # chunk id -> keys of the answers that used it, for invalidation
+        self._keys_by_chunk = {}
+        self._lock = threading.Lock()
+        self._stats = {'hits': 0, 'misses': 0, 'expired': 0, 'invalidated': 0, 'evictions': 0}
+
+    @staticmethod
+    def normalize(message: str) -> str:
+        """Case-, whitespace- and trailing-punctuation-insensitive form of a question."""
+        return re.sub(r'\s+', ' ', message).strip().lower().rstrip('?!. ')
+
+    def key(self, message: str, user_role: str, context_docs: List[Dict]) -> str:
+        chunk_ids = sorted(doc.get('id', '') for doc in context_docs)
+        fingerprint = hashlib.sha256('|'.join(chunk_ids).encode('utf-8')).hexdigest()
+        return hashlib.sha256(f"{user_role}\x00{self.normalize(message)}\x00{fingerprint}".encode('utf-8')).hexdigest()
+
+    def get(self, key: str) -> Optional[Dict[str, Any]]:
+        """Cached entry ({'response', 'sources'}) for a key, or None if absent or expired."""
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None:
+                self._stats['misses'] += 1
+                return None
+            if entry['expires_at'] <= time.time():
+                self._drop(key)
+                self._stats['expired'] += 1
+                self._stats['misses'] += 1
+                return None
+            self._entries.move_to_end(key)
+            self._stats['hits'] += 1
+            return {'response': entry['response'], 'sources': entry['sources']}
+
+    def put(self, key: str, response: str, sources: List[Dict], context_docs: List[Dict]):
+        chunk_ids = [doc['id'] for doc in context_docs if doc.get('id')]
+        with self._lock:
+            if key in self._entries:
+                self._drop(key)
+            self._entries[key] = {
+                'response': response,
+                'sources': sources,
+                'chunk_ids': chunk_ids,
+                'expires_at': time.time() + self.ttl
+            }
+            for chunk_id in chunk_ids:
+                self._keys_by_chunk.setdefault(chunk_id, set()).add(key)
+
+            while len(self._entries) > self.max_items:
+                self._drop(next(iter(self._entries)))
+                self._stats['evictions'] += 1
+
+    def invalidate(self, chunk_ids):
+        """Drop every answer built from any of the given chunks."""
+        with self._lock:
+            keys = set()
+            for chunk_id in chunk_ids:
+                keys.update(self._keys_by_chunk.get(chunk_id, ()))
+            for key in keys:
+                self._drop(key)
+            self._stats['invalidated'] += len(keys)
+        if keys:
+            logger.info(f"Invalidated {len(keys)} cached answers after {len(chunk_ids)} chunks changed")
+
+    def stats(self) -> Dict[str, Any]:
+        with self._lock:
+            lookups = self._stats['hits'] + self._stats['misses']
+            return {
+                **self._stats,
+                'hit_rate': round(self._stats['hits'] / lookups, 4) if lookups else 0.0,
+                'items': len(self._entries)
+            }
+
+    def _drop(self, key: str):
+        entry = self._entries.pop(key, None)
+        if entry is None:
+            return
+        for chunk_id in entry['chunk_ids']:
+            keys = self._keys_by_chunk.get(chunk_id)
+            if keys is not None:
+                keys.discard(key)
+                if not keys:
+                    del self._keys_by_chunk[chunk_id]
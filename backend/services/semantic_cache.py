@@ -0,0 +1,153 @@
+import os
+import logging
+import threading
+import time
+import numpy as np
+from typing import List, Dict, Any, Optional
+
+logger = logging.getLogger(__name__)
+
+_shared_cache = None
+_shared_cache_lock = threading.Lock()
+
+def get_semantic_cache() -> Optional['SemanticCache']:
+    """Return the process-wide semantic question cache, or None when disabled."""
+    global _shared_cache
+    if _shared_cache is None:
+        with _shared_cache_lock:
+            if _shared_cache is None:
+                if os.getenv('SEMANTIC_CACHE_ENABLED', 'true').lower() != 'true':
+                    _shared_cache = False
+                else:
+                    from services.vector_service import get_vector_service
+                    cache = SemanticCache()
+                    get_vector_service().add_listener(cache.invalidate)
+                    _shared_cache = cache
+    return _shared_cache or None
+
+class _RoleIndex:
+    """Fixed-capacity matrix of question embeddings for one role, with LRU slot reuse."""
+
+    def __init__(self, capacity: int, dim: int):
+        self.matrix = np.zeros((capacity, dim), dtype=np.float32)
+        self.entries = [None] * capacity
+        # 0 marks a free slot; otherwise the time the slot was last hit or written
+        self.last_used = np.zeros(capacity, dtype=np.float64)
+
+    def free_slot(self) -> int:
+        """A free slot if any, else the least recently used one."""
+        return int(np.argmin(self.last_used))
+
+class SemanticCache:
+    """Answers to earlier questions, matched by embedding similarity.
+
+    Each role has its own small in-memory index, so a paraphrase only reuses
+    an answer generated for the same role. Entries expire after a TTL and are
+    dropped when a chunk they were generated from changes.
+    """
+
+    def __init__(self):
+        self.threshold = float(os.getenv('SEMANTIC_CACHE_THRESHOLD', 0.92))
+        self.capacity = int(os.getenv('SEMANTIC_CACHE_MAX_ITEMS', 500))
+        self.ttl = float(os.getenv('SEMANTIC_CACHE_TTL_SECONDS', 3600))
+
+        self._roles = {}
+        self._lock = threading.Lock()
+        self._stats = {'hits': 0, 'misses': 0, 'evictions': 0, 'invalidated': 0, 'tokens_saved': 0}
+
+    def lookup(self, user_role: str, embedding: List[float]) -> Optional[Dict[str, Any]]:
+        """Cached entry for the most similar earlier question, if it clears the threshold."""
+        query = self._normalize(embedding)
+        with self._lock:
+            index = self._roles.get(user_role)
+            if query is None or index is None or index.matrix.shape[1] != query.shape[0]:
+                self._stats['misses'] += 1
+                return None
+
+            now = time.time()
+            scores = index.matrix @ query
+            # Free and expired slots never match
+            scores[index.last_used == 0] = -np.inf
+            for slot in np.flatnonzero(index.last_used):
+                if index.entries[slot]['expires_at'] <= now:
+                    self._clear(index, slot)
+                    scores[slot] = -np.inf
+
+            best = int(np.argmax(scores))
+            if scores[best] < self.threshold:
+                self._stats['misses'] += 1
+                return None
+
+            entry = index.entries[best]
+            index.last_used[best] = now
+            self._stats['hits'] += 1
+            self._stats['tokens_saved'] += entry['tokens']
+            return {
+                'question': entry['question'],
+                'response': entry['response'],
+                'sources': entry['sources'],
+                'similarity': float(scores[best])
+            }
+
+    def store(self, user_role: str, question: str, embedding: List[float], response: str,
+              sources: List[Dict], context_docs: List[Dict], tokens: int):
+        """Remember an answer; `tokens` is what generating it cost, credited on later hits."""
+        vector = self._normalize(embedding)
+        if vector is None:
+            return
+
+        with self._lock:
+            index = self._roles.get(user_role)
+            if index is None or index.matrix.shape[1] != vector.shape[0]:
+                index = self._roles[user_role] = _RoleIndex(self.capacity, vector.shape[0])
+
+            slot = index.free_slot()
+            if index.last_used[slot]:
+                self._stats['evictions'] += 1
+            index.matrix[slot] = vector
+            index.entries[slot] = {
+                'question': question,
+                'response': response,
+                'sources': sources,
+                'chunk_ids': {doc['id'] for doc in context_docs if doc.get('id')},
+                'tokens': tokens,
+                'expires_at': time.time() + self.ttl
+            }
+            index.last_used[slot] = time.time()
+
+    def invalidate(self, chunk_ids):
+        """Drop every answer built from any of the given chunks."""
+        chunk_ids = set(chunk_ids)
+        dropped = 0
+        with self._lock:
+            for index in self._roles.values():
+                for slot in np.flatnonzero(index.last_used):
+                    if index.entries[slot]['chunk_ids'] & chunk_ids:
+                        self._clear(index, slot)
+                        dropped += 1
+            self._stats['invalidated'] += dropped
+        if dropped:
+            logger.info(f"Invalidated {dropped} semantically cached answers after {len(chunk_ids)} chunks changed")
+
+    def stats(self) -> Dict[str, Any]:
+        with self._lock:
+            lookups = self._stats['hits'] + self._stats['misses']
+            return {
+                **self._stats,
+                'hit_rate': round(self._stats['hits'] / lookups, 4) if lookups else 0.0,
+                'items': {role: int(np.count_nonzero(index.last_used)) for role, index in self._roles.items()}
+            }
+
+    @staticmethod
+    def _clear(index: _RoleIndex, slot: int):
+        index.entries[slot] = None
+        index.last_used[slot] = 0
+        index.matrix[slot] = 0
+
+    @staticmethod
+    def _normalize(embedding) -> Optional[np.ndarray]:
+        if not embedding:
+            return None
+        vector = np.asarray(embedding, dtype=np.float32)
+        norm = np.linalg.norm(vector)
+        return vector / norm if norm else None
@@ -0,0 +1,129 @@
+import asyncio
+import functools
+import logging
+import threading
+from typing import Any, Callable, Dict, Hashable
+
+from services.deadline import Deadline, DeadlineExceeded
+
+logger = logging.getLogger(__name__)
+
+class _Flight:
+    def __init__(self):
+        self.done = threading.Event()
+        self.result = None
+        self.error = None
+
+class SingleFlight:
+    """Coalesces concurrent calls that share a key into one upstream call.
+
+    The first caller for a key (the leader) starts the function on a thread
+    of its own; callers that arrive while it is in flight wait for and share
+    its result, or its exception. A waiter gives up on a flight after
+    `timeout` seconds and starts (or joins) a fresh one, so a hung call
+    cannot block a key forever.
+
+    Every caller, the leader included, waits only as long as its own
+    `deadline` allows and then raises DeadlineExceeded, while the call
+    carries on for the others. The function must therefore bound itself
+    with a timeout of its own rather than any one caller's deadline. A
+    waiter whose flight failed with a timeout retries once if it still has
+    time left, instead of inheriting a failure it did not cause.
+    """
+
+    def __init__(self, name: str):
+        self.name = name
+        self._flights = {}
+        self._lock = threading.Lock()
+        self._stats = {'calls': 0, 'coalesced': 0, 'timeouts': 0}
+
+    def do(self, key: Hashable, fn: Callable[[], Any], timeout: float = None, deadline: Deadline = None) -> Any:
+        retried = False
+        while True:
+            if deadline is not None and deadline.expired:
+                raise DeadlineExceeded(f"{self.name}: deadline of {deadline.seconds}s exceeded")
+
+            with self._lock:
+                flight = self._flights.get(key)
+                leader = flight is None
+                if leader:
+                    flight = self._flights[key] = _Flight()
+                    self._stats['calls'] += 1
+                    threading.Thread(target=self._run, args=(key, flight, fn), name=f'{self.name}-flight', daemon=True).start()
+                else:
+                    self._stats['coalesced'] += 1
+
+            # The leader's call bounds itself; only waiters watch for a stalled flight
+            wait = None if leader else timeout
+            if deadline is not None:
+                wait = deadline.remaining() if wait is None else min(wait, deadline.remaining())
+            if not flight.done.wait(wait):
+                if deadline is not None and deadline.expired:
+                    raise DeadlineExceeded(f"{self.name}: deadline of {deadline.seconds}s exceeded")
+                with self._lock:
+                    self._stats['timeouts'] += 1
+                    # Detach the stalled flight so the retry leads a new one
+                    if self._flights.get(key) is flight:
+                        del self._flights[key]
+                logger.warning(f"{self.name}: in-flight call exceeded {timeout}s, retrying")
+                continue
+
+            if flight.error is not None:
+                if not leader and not retried and isinstance(flight.error, TimeoutError):
+                    retried = True
+                    continue
+                raise flight.error
+            return flight.result
+
+    def _run(self, key: Hashable, flight: _Flight, fn: Callable[[], Any]):
+        try:
+            flight.result = fn()
+        except BaseException as e:
+            flight.error = e
+        finally:
+            with self._lock:
+                if self._flights.get(key) is flight:
+                    del self._flights[key]
+            flight.done.set()
+
+    def summary(self) -> Dict[str, int]:
+        with self._lock:
+            return {**self._stats, 'in_flight': len(self._flights)}
+
+class AsyncSingleFlight:
+    """SingleFlight for coroutines; every call must come from the same event loop."""
+
+    def __init__(self, name: str):
+        self.name = name
+        self._flights = {}
+        self._stats = {'calls': 0, 'coalesced': 0, 'timeouts': 0}
+
+    async def do(self, key: Hashable, fn: Callable[[], Any], timeout: float = None) -> Any:
+        while True:
+            task = self._flights.get(key)
+            if task is None:
+                task = self._flights[key] = asyncio.ensure_future(fn())
+                task.add_done_callback(functools.partial(self._finish, key))
+                self._stats['calls'] += 1
+                # Shielded so a cancelled caller does not cancel the call for its followers
+                return await asyncio.shield(task)
+
+            self._stats['coalesced'] += 1
+            try:
+                return await asyncio.wait_for(asyncio.shield(task), timeout)
+            except asyncio.TimeoutError:
+                self._stats['timeouts'] += 1
+                # Detach the stalled flight so the retry leads a new one
+                if self._flights.get(key) is task:
+                    del self._flights[key]
+                logger.warning(f"{self.name}: in-flight call exceeded {timeout}s, retrying")
+
+    def _finish(self, key: Hashable, task):
+        if self._flights.get(key) is task:
+            del self._flights[key]
+        if not task.cancelled():
+            # Every caller may have given up on the call; its error is theirs to see, not the loop's to log
+            task.exception()
+
+    def summary(self) -> Dict[str, int]:
+        return {**self._stats, 'in_flight': len(self._flights)}
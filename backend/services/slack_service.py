@@ -3,6 +3,7 @@ import logging
 import requests
 from typing import List, Dict, Any
 from datetime import datetime, timedelta
+from services.deadline import http_timeout
 
 logger = logging.getLogger(__name__)
 
@@ -12,6 +13,7 @@ class SlackService:
         self.app_token = os.getenv('SLACK_APP_TOKEN')
         self.signing_secret = os.getenv('SLACK_SIGNING_SECRET')
         self.base_url = "https://slack.com/api"
+        self.timeout = http_timeout()
         self.last_sync_time = None
         
     def is_connected(self) -> bool:
@@ -30,7 +32,7 @@ class SlackService:
         # Uncomment the following lines if you want to validate tokens on every check
         # try:
         #     headers = {'Authorization': f'Bearer {self.bot_token}'}
-        #     response = requests.get(f"{self.base_url}/auth.test", headers=headers)
+        #     response = requests.get(f"{self.base_url}/auth.test", headers=headers, timeout=self.timeout)
         #     return response.json().get('ok', False)
         # except:
         #     return False
@@ -79,7 +81,7 @@ class SlackService:
                 'Content-Type': 'application/json'
             }
             
-            response = requests.get(f"{self.base_url}/conversations.list", headers=headers)
+            response = requests.get(f"{self.base_url}/conversations.list", headers=headers, timeout=self.timeout)
             response.raise_for_status()
             
             data = response.json()
@@ -117,7 +119,7 @@ class SlackService:
                 'limit': limit
             }
             
-            response = requests.get(f"{self.base_url}/conversations.history", headers=headers, params=params)
+            response = requests.get(f"{self.base_url}/conversations.history", headers=headers, params=params, timeout=self.timeout)
             response.raise_for_status()
             
             data = response.json()
@@ -192,7 +194,7 @@ class SlackService:
             }
             
             params = {'user': user_id}
-            response = requests.get(f"{self.base_url}/users.info", headers=headers, params=params)
+            response = requests.get(f"{self.base_url}/users.info", headers=headers, params=params, timeout=self.timeout)
             response.raise_for_status()
             
             data = response.json()
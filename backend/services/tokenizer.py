@@ -0,0 +1,70 @@
+import logging
+from functools import lru_cache
+from typing import Callable, List
+
+logger = logging.getLogger(__name__)
+
+try:
+    import tiktoken
+except ImportError:
+    tiktoken = None
+
+# Used when tiktoken or its encoding files are unavailable
+CHARS_PER_TOKEN = 4
+
+@lru_cache(maxsize=None)
+def _encoding(model: str):
+    """tiktoken encoding for a model, or None to fall back to the character estimate."""
+    if tiktoken is None:
+        return None
+    try:
+        return tiktoken.encoding_for_model(model)
+    except KeyError:
+        # Newer model names tiktoken does not know yet share the GPT-4 encoding
+        try:
+            return tiktoken.get_encoding('cl100k_base')
+        except Exception as e:
+            logger.warning(f"tiktoken encoding unavailable, estimating token counts: {e}")
+            return None
+    except Exception as e:
+        # Encoding files are downloaded on first use and may be unreachable offline
+        logger.warning(f"tiktoken encoding for {model} unavailable, estimating token counts: {e}")
+        return None
+
+def count_tokens(text: str, model: str) -> int:
+    """Number of tokens `text` takes up for `model`."""
+    if not text:
+        return 0
+    encoding = _encoding(model)
+    if encoding is None:
+        return (len(text) + CHARS_PER_TOKEN - 1) // CHARS_PER_TOKEN
+    return len(encoding.encode_ordinary(text))
+
+def truncate_tokens(text: str, max_tokens: int, model: str) -> str:
+    """Cut `text` down to at most `max_tokens` tokens for `model`."""
+    if max_tokens <= 0:
+        return ''
+    encoding = _encoding(model)
+    if encoding is None:
+        return text[:max_tokens * CHARS_PER_TOKEN]
+    tokens = encoding.encode(text, disallowed_special=())
+    if len(tokens) <= max_tokens:
+        return text
+    return encoding.decode(tokens[:max_tokens])
+
+def split_tokens(text: str, max_tokens: int, model: str) -> List[str]:
+    """Cut `text` into consecutive pieces of at most `max_tokens` tokens for `model`."""
+    max_tokens = max(1, max_tokens)
+    encoding = _encoding(model)
+    if encoding is None:
+        size = max_tokens * CHARS_PER_TOKEN
+        return [text[start:start + size] for start in range(0, len(text), size)]
+    tokens = encoding.encode(text, disallowed_special=())
+    return [encoding.decode(tokens[start:start + max_tokens]) for start in range(0, len(tokens), max_tokens)]
+
+def token_counter(model: str) -> Callable[[str], int]:
+    """count_tokens for `model` as a one-argument function, for counting many texts in a loop."""
+    encoding = _encoding(model)
+    if encoding is None:
+        return lambda text: (len(text) + CHARS_PER_TOKEN - 1) // CHARS_PER_TOKEN
+    return lambda text: len(encoding.encode_ordinary(text))
@@ -0,0 +1,180 @@
+import os
+import logging
+import json
+import hashlib
+import numpy as np
+from typing import List, Tuple
+
+logger = logging.getLogger(__name__)
+
+try:
+    import faiss
+except ImportError:
+    faiss = None
+
+FAISS_INDEX_TYPES = ('flat', 'ivf', 'hnsw')
+
+def document_label(doc_id: str) -> int:
+    """Stable int64 FAISS label derived from a document's hex id."""
+    return int(doc_id[:15], 16)
+
+def labels_checksum(labels: np.ndarray) -> str:
+    """Order-independent fingerprint of a label set, used to validate a persisted index."""
+    return hashlib.sha1(np.sort(np.asarray(labels, dtype=np.int64)).tobytes()).hexdigest()
+
+class FaissIndex:
+    """Approximate (or exact, for 'flat') inner-product index over normalized embeddings.
+
+    Vectors are addressed by int64 labels rather than row positions, so the
+    VectorService can delete rows without renumbering the index.
+    """
+
+    def __init__(self, index_type: str, dim: int, index_dir: str):
+        if faiss is None:
+            raise ImportError("faiss is not installed. Run: pip install faiss-cpu")
+        if index_type not in FAISS_INDEX_TYPES:
+            raise ValueError(f"Unknown FAISS index type '{index_type}'. Supported: {', '.join(FAISS_INDEX_TYPES)}")
+
+        self.index_type = index_type
+        self.dim = dim
+        self.index_path = os.path.join(index_dir, f'faiss_{index_type}.index')
+        self.meta_path = os.path.join(index_dir, f'faiss_{index_type}.json')
+
+        self.ivf_nlist = int(os.getenv('FAISS_IVF_NLIST', 1024))
+        self.ivf_nprobe = int(os.getenv('FAISS_IVF_NPROBE', 16))
+        self.hnsw_m = int(os.getenv('FAISS_HNSW_M', 32))
+        self.hnsw_ef_construction = int(os.getenv('FAISS_HNSW_EF_CONSTRUCTION', 200))
+        self.hnsw_ef_search = int(os.getenv('FAISS_HNSW_EF_SEARCH', 128))
+
+        # IVF needs enough points to train its coarse quantizer; below that a
+        # flat index is used and needs_rebuild flips once the corpus is big enough
+        self.ivf_min_train = self.ivf_nlist * 39
+
+        self.index = None
+        self.trained_as = None
+        # HNSW graphs cannot remove vectors, so deletions are masked at search time
+        self.tombstones = set()
+
+    @property
+    def ntotal(self) -> int:
+        return self.index.ntotal if self.index is not None else 0
+
+    @property
+    def needs_rebuild(self) -> bool:
+        """True when a rebuild from the full matrix would give a better index."""
+        if self.index_type == 'ivf' and self.trained_as == 'flat':
+            return self.ntotal >= self.ivf_min_train
+        if self.index_type == 'hnsw':
+            return len(self.tombstones) > max(1000, self.ntotal // 10)
+        return False
+
+    def build(self, matrix: np.ndarray, labels: np.ndarray):
+        """(Re)build the index from scratch, training it when the type requires."""
+        matrix = np.ascontiguousarray(matrix, dtype=np.float32)
+        labels = np.ascontiguousarray(labels, dtype=np.int64)
+
+        if self.index_type == 'ivf' and len(matrix) >= self.ivf_min_train:
+            quantizer = faiss.IndexFlatIP(self.dim)
+            index = faiss.IndexIVFFlat(quantizer, self.dim, self.ivf_nlist, faiss.METRIC_INNER_PRODUCT)
+            index.train(matrix)
+            index.nprobe = self.ivf_nprobe
+            self.trained_as = 'ivf'
+        elif self.index_type == 'hnsw':
+            inner = faiss.IndexHNSWFlat(self.dim, self.hnsw_m, faiss.METRIC_INNER_PRODUCT)
+            inner.hnsw.efConstruction = self.hnsw_ef_construction
+            inner.hnsw.efSearch = self.hnsw_ef_search
+            index = faiss.IndexIDMap2(inner)
+            self.trained_as = 'hnsw'
+        else:
+            index = faiss.IndexIDMap2(faiss.IndexFlatIP(self.dim))
+            self.trained_as = 'flat'
+
+        if len(matrix):
+            index.add_with_ids(matrix, labels)
+
+        self.index = index
+        self.tombstones = set()
+        logger.info(f"Built FAISS {self.trained_as} index with {self.ntotal} vectors")
+
+    def add(self, vectors: np.ndarray, labels: np.ndarray):
+        self.index.add_with_ids(np.ascontiguousarray(vectors, dtype=np.float32), np.ascontiguousarray(labels, dtype=np.int64))
+
+    def remove(self, labels: List[int]):
+        if self.trained_as == 'hnsw':
+            self.tombstones.update(labels)
+        else:
+            self.index.remove_ids(np.asarray(labels, dtype=np.int64))
+
+    @staticmethod
+    def selector(labels: np.ndarray):
+        """ID selector that limits a search to the given labels."""
+        labels = np.ascontiguousarray(labels, dtype=np.int64)
+        return faiss.IDSelectorBatch(len(labels), faiss.swig_ptr(labels))
+
+    def search(self, query: np.ndarray, k: int, selector=None) -> Tuple[np.ndarray, np.ndarray]:
+        """Top-k (scores, labels) for a single normalized query, best first.
+
+        With a selector only matching labels are scored, so filtering happens
+        inside the index instead of on its results.
+        """
+        requested = k
+        k = min(k + len(self.tombstones), self.ntotal)
+        if k <= 0:
+            return np.empty(0, dtype=np.float32), np.empty(0, dtype=np.int64)
+
+        query = np.ascontiguousarray(query[np.newaxis, :], dtype=np.float32)
+        if selector is None:
+            scores, labels = self.index.search(query, k)
+        else:
+            if self.trained_as == 'ivf':
+                params = faiss.SearchParametersIVF(sel=selector, nprobe=self.ivf_nprobe)
+            elif self.trained_as == 'hnsw':
+                params = faiss.SearchParametersHNSW(sel=selector, efSearch=self.hnsw_ef_search)
+            else:
+                params = faiss.SearchParameters(sel=selector)
+            scores, labels = self.index.search(query, k, params=params)
+        scores, labels = scores[0], labels[0]
+
+        # FAISS pads with -1 when fewer than k results are reachable
+        keep = labels >= 0
+        if self.tombstones:
+            keep &= ~np.isin(labels, np.fromiter(self.tombstones, dtype=np.int64))
+        return scores[keep][:requested], labels[keep][:requested]
+
+    def save(self, labels: np.ndarray):
+        """Persist the index with a checksum of the labels it was saved against."""
+        faiss.write_index(self.index, self.index_path)
+        with open(self.meta_path, 'w') as f:
+            json.dump({
+                'index_type': self.index_type,
+                'trained_as': self.trained_as,
+                'dim': self.dim,
+                'count': int(len(labels)),
+                'labels_checksum': labels_checksum(labels)
+            }, f)
+
+    def load(self, labels: np.ndarray) -> bool:
+        """Load a persisted index if it matches the given labels. Returns False if a rebuild is needed."""
+        try:
+            if not (os.path.exists(self.index_path) and os.path.exists(self.meta_path)):
+                return False
+
+            with open(self.meta_path, 'r') as f:
+                meta = json.load(f)
+            if meta.get('dim') != self.dim or meta.get('labels_checksum') != labels_checksum(labels):
+                logger.info(f"Persisted FAISS index at {self.index_path} is stale; rebuilding")
+                return False
+
+            self.index = faiss.read_index(self.index_path)
+            self.trained_as = meta.get('trained_as', self.index_type)
+            if self.trained_as == 'ivf':
+                self.index.nprobe = self.ivf_nprobe
+            elif self.trained_as == 'hnsw':
+                faiss.downcast_index(self.index.index).hnsw.efSearch = self.hnsw_ef_search
+            self.tombstones = set()
+            logger.info(f"Loaded FAISS {self.trained_as} index with {self.ntotal} vectors from {self.index_path}")
+            return True
+
+        except Exception as e:
+            logger.error(f"Load FAISS index error: {e}")
+            return False
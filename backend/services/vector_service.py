@@ -1,17 +1,117 @@
 import os
 import logging
 import json
+import base64
+import uuid
 import numpy as np
 import threading
+from contextlib import contextmanager
+from functools import lru_cache
 from typing import List, Dict, Any
-from services.llm_service import LLMService
+from services.llm_service import get_llm_service
+from services.deadline import Deadline
+from services.vector_index import FaissIndex, document_label
 
 logger = logging.getLogger(__name__)
 
+try:
+    import fcntl
+except ImportError:
+    fcntl = None
+
+# Sources each role may read; admin reads everything, unknown roles get the default
+ROLE_ACCESS_RULES = {
+    'developer': ['github', 'slack-dev', 'slack-general', 'uploaded_document'],
+    'marketing': ['slack-marketing', 'outlook', 'slack-general', 'uploaded_document'],
+    'sales': ['slack-sales', 'outlook', 'slack-general', 'uploaded_document'],
+    'user': ['slack-general', 'uploaded_document']  # Default access
+}
+DEFAULT_ALLOWED_SOURCES = ['slack-general']
+
+# One bit per role (plus one for the default rules) in each row's access bitmask
+_ROLE_BITS = {role: 1 << i for i, role in enumerate(ROLE_ACCESS_RULES)}
+_DEFAULT_ROLE_BIT = 1 << len(ROLE_ACCESS_RULES)
+
+def _access_key(source: str) -> str:
+    """Collapse per-file uploaded document sources into the key the rules use."""
+    # For uploaded documents, check if the source starts with 'uploaded_document'
+    if source.startswith('uploaded_document'):
+        return 'uploaded_document'
+    return source
+
+@lru_cache(maxsize=None)
+def _source_role_bits(access_key: str) -> int:
+    """Bitmask of the non-admin roles allowed to read a source."""
+    bits = 0
+    for role, allowed_sources in ROLE_ACCESS_RULES.items():
+        if access_key in allowed_sources:
+            bits |= _ROLE_BITS[role]
+    if access_key in DEFAULT_ALLOWED_SOURCES:
+        bits |= _DEFAULT_ROLE_BIT
+    return bits
+
+_shared_instance = None
+_shared_instance_lock = threading.Lock()
+
+def get_vector_service() -> 'VectorService':
+    """Return the process-wide vector store, loading it on first use.
+
+    VECTOR_BACKEND=chroma selects ChromaVectorService; anything else uses
+    VectorService with its exact or FAISS search.
+    """
+    global _shared_instance
+    if _shared_instance is None:
+        with _shared_instance_lock:
+            if _shared_instance is None:
+                if os.getenv('VECTOR_BACKEND', 'exact').lower() == 'chroma':
+                    from services.chroma_vector_service import ChromaVectorService
+                    _shared_instance = ChromaVectorService()
+                else:
+                    _shared_instance = VectorService()
+    return _shared_instance
+
+class _ReadWriteLock:
+    """Many concurrent readers or one writer; waiting writers block new readers."""
+
+    def __init__(self):
+        self._cond = threading.Condition(threading.Lock())
+        self._readers = 0
+        self._writer = False
+        self._writers_waiting = 0
+
+    @contextmanager
+    def read(self):
+        with self._cond:
+            while self._writer or self._writers_waiting:
+                self._cond.wait()
+            self._readers += 1
+        try:
+            yield
+        finally:
+            with self._cond:
+                self._readers -= 1
+                if not self._readers:
+                    self._cond.notify_all()
+
+    @contextmanager
+    def write(self):
+        with self._cond:
+            self._writers_waiting += 1
+            while self._writer or self._readers:
+                self._cond.wait()
+            self._writers_waiting -= 1
+            self._writer = True
+        try:
+            yield
+        finally:
+            with self._cond:
+                self._writer = False
+                self._cond.notify_all()
+
 class VectorService:
     def __init__(self):
         try:
-            self.llm_service = LLMService()
+            self.llm_service = get_llm_service()
             # Check if LLM service is properly initialized
             if not self.llm_service.client:
                 logger.warning("VectorService: LLM service not properly initialized - embeddings will not work")
@@ -20,18 +120,82 @@ class VectorService:
             self.llm_service = None
             
         self.vector_db_path = os.getenv('VECTOR_DB_PATH', os.path.join(os.path.dirname(os.path.dirname(__file__)), 'embeddings'))
+        # 'npy' keeps embeddings in a memory-mapped float32 array, 'json' in the legacy text format
+        self.store_format = os.getenv('VECTOR_STORE_FORMAT', 'npy').lower()
+        if self.store_format not in ('npy', 'json'):
+            logger.warning(f"Unknown VECTOR_STORE_FORMAT '{self.store_format}', falling back to npy")
+            self.store_format = 'npy'
+        
+        # 'exact' scores every row; 'faiss' keeps a FAISS_INDEX_TYPE (flat, ivf, hnsw)
+        # index alongside the matrix, which stays the source of truth for persistence
+        self.backend = os.getenv('VECTOR_BACKEND', 'exact').lower()
+        self.faiss_index_type = os.getenv('FAISS_INDEX_TYPE', 'flat').lower()
+        self._index = None
+        self._label_rows = {}
+        # Roles that can read at most this many rows are scored exactly even with
+        # an index; approximate filtered search can miss some of so few rows
+        self.exact_fallback_rows = int(os.getenv('FAISS_EXACT_FALLBACK_ROWS', 2048))
+        
+        # Per-row role bitmask (see ROLE_ACCESS_RULES) and the accessible row ids
+        # per role derived from it, rebuilt lazily after each mutation
+        self._row_roles = np.empty(0, dtype=np.uint32)
+        self._role_rows = {}
+        self._role_selectors = {}
         
-        # For MVP, we'll use a simple in-memory storage
-        # In production, this would be replaced with FAISS or Chroma
         self.documents = []
-        self.embeddings = []
+        # Unit-normalized float32 rows; only the first self._size rows are live,
+        # the rest is spare capacity so appends don't copy the whole matrix
+        self._matrix = np.empty((0, 0), dtype=np.float32)
+        self._size = 0
         
         # Add lock for thread-safe operations
-        self._save_lock = threading.Lock()
+        self._save_lock = threading.RLock()
+        # Guards documents/embeddings: searches share it, mutations take it exclusively
+        self._rw_lock = _ReadWriteLock()
+        
+        # Mutations are appended to a write-ahead log and folded into the
+        # snapshot files every VECTOR_WAL_COMPACT_EVERY records
+        self.wal_compact_every = int(os.getenv('VECTOR_WAL_COMPACT_EVERY', 1000))
+        self.wal_fsync = os.getenv('VECTOR_WAL_FSYNC', 'true').lower() == 'true'
+        self._wal = None
+        self._wal_records = 0
+        # Generation and file identity of the log and how much of it this process
+        # has applied; worker processes sharing the store catch up on each other's records
+        self._wal_generation = None
+        self._wal_identity = None
+        self._wal_position = 0
+        # Cross-process lock file handle and this process's nesting depth in it
+        self._lock_handle = None
+        self._lock_depth = 0
+        
+        # Callbacks told the ids of chunks that were deleted or changed
+        self._listeners = []
         
         self._load_documents()
     
-    def search(self, query: str, user_role: str, limit: int = 5) -> List[Dict]:
+    @property
+    def docs_file(self) -> str:
+        return os.path.join(self.vector_db_path, 'documents.json')
+    
+    @property
+    def wal_file(self) -> str:
+        return os.path.join(self.vector_db_path, 'wal.jsonl')
+    
+    @property
+    def lock_file(self) -> str:
+        return os.path.join(self.vector_db_path, 'store.lock')
+    
+    @property
+    def embeddings_file(self) -> str:
+        """Path of the embeddings file for the active storage format."""
+        return os.path.join(self.vector_db_path, f'embeddings.{self.store_format}')
+    
+    @property
+    def embeddings(self) -> np.ndarray:
+        """Live (n_documents, dim) view of the normalized embedding matrix."""
+        return self._matrix[:self._size]
+    
+    def search(self, query: str, user_role: str, limit: int = 5, deadline: Deadline = None) -> List[Dict]:
         """Search for relevant documents based on query and user role."""
         try:
             # If LLM service is not available, return empty results
@@ -40,34 +204,39 @@ class VectorService:
                 return []
             
             # Get query embedding
-            query_embedding = self.llm_service.get_embeddings(query)
+            query_embedding = self.llm_service.get_embeddings(query, deadline=deadline)
             if not query_embedding:
                 logger.warning("VectorService: Failed to generate query embedding")
                 return []
             
-            # Calculate similarities
-            similarities = []
-            for i, doc_embedding in enumerate(self.embeddings):
-                if doc_embedding:
-                    similarity = self._cosine_similarity(query_embedding, doc_embedding)
-                    similarities.append((similarity, i))
-            
-            # Sort by similarity and filter by role
-            similarities.sort(reverse=True)
-            
-            # Filter documents by user role
-            filtered_docs = []
-            for similarity, doc_idx in similarities:
-                doc = self.documents[doc_idx]
-                if self._can_access_document(doc, user_role):
+            if limit <= 0:
+                return []
+            
+            self._refresh()
+            query_vector = self._normalize(query_embedding)
+            if query_vector is None:
+                logger.warning("VectorService: Query embedding has zero norm")
+                return []
+            
+            with self._rw_lock.read():
+                if not self._size:
+                    return []
+                if query_vector.shape[0] != self._matrix.shape[1]:
+                    logger.warning(f"VectorService: Query embedding dimension {query_vector.shape[0]} does not match index dimension {self._matrix.shape[1]}")
+                    return []
+                
+                # Only rows the role may read are scored, so every hit is usable
+                filtered_docs = []
+                rows, scores = self._rank(query_vector, limit, user_role)
+                for doc_idx, score in zip(rows, scores):
+                    doc = self.documents[doc_idx]
                     filtered_docs.append({
+                        'id': doc['id'],
                         'content': doc['content'],
                         'source': doc['source'],
                         'metadata': doc['metadata'],
-                        'similarity': similarity
+                        'similarity': float(score)
                     })
-                    if len(filtered_docs) >= limit:
-                        break
             
             return filtered_docs
             
@@ -77,123 +246,681 @@ class VectorService:
     
     def add_document(self, content: str, source: str, metadata: Dict, user_role: str = None):
         """Add a document to the vector database."""
+        return self.add_documents([{
+            'content': content,
+            'source': source,
+            'metadata': metadata,
+            'user_role': user_role
+        }]) == 1
+    
+    def add_documents(self, items: List[Dict], embeddings: List[List[float]] = None) -> int:
+        """Add many documents with batched embedding and a single log write.
+        
+        Each item has 'content', 'source', 'metadata' and optionally 'user_role'
+        and 'id' (a fresh id is generated otherwise). `embeddings`, if given, are the items' precomputed embeddings in order.
+        Returns the number of documents added; items whose embedding failed are skipped.
+        """
         try:
-            # If LLM service is not available, skip embedding generation
-            if not self.llm_service or not self.llm_service.client:
-                logger.warning("VectorService: Cannot add document - LLM service not available for embeddings")
-                return False
-            
-            # Get embedding for the document
-            embedding = self.llm_service.get_embeddings(content)
-            if not embedding:
-                logger.warning("VectorService: Failed to generate document embedding")
-                return False
+            if not items:
+                return 0
             
-            # Create document entry
-            document = {
-                'content': content,
-                'source': source,
-                'metadata': metadata,
-                'user_role': user_role
-            }
+            if embeddings is None:
+                # If LLM service is not available, skip embedding generation
+                if not self.llm_service or not self.llm_service.client:
+                    logger.warning("VectorService: Cannot add document - LLM service not available for embeddings")
+                    return 0
+                
+                # Get embeddings for all documents in as few requests as possible
+                embeddings = self.llm_service.get_embeddings_batch([item['content'] for item in items])
             
-            self.documents.append(document)
-            self.embeddings.append(embedding)
+            documents = []
+            vectors = []
+            for item, embedding in zip(items, embeddings):
+                vector = self._normalize(embedding) if embedding else None
+                if vector is None:
+                    logger.warning(f"VectorService: Failed to generate document embedding for {item['source']}")
+                    continue
+                
+                # Create document entry
+                documents.append({
+                    'id': item.get('id') or uuid.uuid4().hex,
+                    'content': item['content'],
+                    'source': item['source'],
+                    'metadata': item['metadata'],
+                    'user_role': item.get('user_role')
+                })
+                vectors.append(vector)
             
-            logger.info(f"Added document: {source} (total docs: {len(self.documents)})")
+            if not documents:
+                return 0
+            matrix = np.vstack(vectors)
             
-            # Save to disk for persistence
-            self._save_documents()
+            with self._rw_lock.write(), self._store_lock():
+                changed_ids = self._sync_wal()
+                if self._size and matrix.shape[1] != self._matrix.shape[1]:
+                    logger.error(f"VectorService: Embedding dimension {matrix.shape[1]} does not match index dimension {self._matrix.shape[1]}")
+                    return 0
+                
+                self._append(documents, matrix)
+                
+                logger.info(f"Added {len(documents)} documents from {documents[0]['source']} (total docs: {len(self.documents)})")
+                
+                # One log record for the whole batch, so it is applied all-or-nothing
+                self._append_wal({
+                    'op': 'add',
+                    'documents': documents,
+                    'embeddings': [base64.b64encode(vector.tobytes()).decode('ascii') for vector in vectors]
+                })
             
-            return True
+            if changed_ids:
+                self._notify_listeners(changed_ids)
+            return len(documents)
             
         except Exception as e:
-            logger.error(f"Add document error: {e}")
-            return False
+            logger.error(f"Add documents error: {e}")
+            return 0
     
-    def _cosine_similarity(self, vec1: List[float], vec2: List[float]) -> float:
-        """Calculate cosine similarity between two vectors."""
-        try:
-            vec1 = np.array(vec1)
-            vec2 = np.array(vec2)
+    def delete_document(self, source: str, user_role: str = None) -> int:
+        """Delete every chunk with the given source the user may access. Returns the number removed."""
+        with self._rw_lock.write(), self._store_lock():
+            changed_ids = self._sync_wal()
+            removed_ids = [
+                doc['id'] for doc in self.documents
+                # Use exact match for the source to avoid partial matches
+                if doc.get('source', '') == source and (user_role is None or self._can_access_document(doc, user_role))
+            ]
+            removed = len(removed_ids)
             
-            dot_product = np.dot(vec1, vec2)
-            norm1 = np.linalg.norm(vec1)
-            norm2 = np.linalg.norm(vec2)
+            if removed:
+                self._remove_ids(set(removed_ids))
+                self._append_wal({'op': 'delete', 'ids': removed_ids})
             
-            if norm1 == 0 or norm2 == 0:
-                return 0
+            logger.info(f"Deleted {removed} chunks for source: {source}")
+        
+        changed_ids.update(removed_ids)
+        if changed_ids:
+            self._notify_listeners(changed_ids)
+        return removed
+    
+    def delete_ids(self, ids) -> int:
+        """Delete the chunks with the given ids. Returns the number removed."""
+        ids = set(ids)
+        with self._rw_lock.write(), self._store_lock():
+            changed_ids = self._sync_wal()
+            removed_ids = [doc['id'] for doc in self.documents if doc['id'] in ids]
+            removed = len(removed_ids)
             
-            return dot_product / (norm1 * norm2)
+            if removed:
+                self._remove_ids(set(removed_ids))
+                self._append_wal({'op': 'delete', 'ids': removed_ids})
             
-        except Exception as e:
-            logger.error(f"Cosine similarity error: {e}")
+            logger.info(f"Deleted {removed} chunks by id")
+        
+        changed_ids.update(removed_ids)
+        if changed_ids:
+            self._notify_listeners(changed_ids)
+        return removed
+    
+    def update_metadata(self, updates: Dict[str, Dict]) -> int:
+        """Replace the metadata of chunks by id, keeping their content and embeddings. Returns the number updated."""
+        if not updates:
             return 0
+        with self._rw_lock.write(), self._store_lock():
+            changed_ids = self._sync_wal()
+            updated_ids = self._set_metadata(updates)
+            if updated_ids:
+                self._append_wal({'op': 'update', 'metadata': {doc_id: updates[doc_id] for doc_id in updated_ids}})
+        
+        changed_ids.update(updated_ids)
+        if changed_ids:
+            self._notify_listeners(changed_ids)
+        return len(updated_ids)
     
-    def _can_access_document(self, document: Dict, user_role: str) -> bool:
-        """Check if user can access a document based on role-based filtering."""
+    def add_listener(self, callback):
+        """Register callback(ids) to be called with the ids of chunks that are deleted or changed."""
+        self._listeners.append(callback)
+    
+    def get_documents(self) -> List[Dict]:
+        """Return a snapshot of the stored documents that is safe to iterate."""
+        self._refresh()
+        with self._rw_lock.read():
+            return list(self.documents)
+    
+    def count(self) -> int:
+        """Return the number of stored documents."""
+        self._refresh()
+        with self._rw_lock.read():
+            return len(self.documents)
+    
+    def save(self):
+        """Persist the current store to disk and truncate the write-ahead log."""
+        # Exclusive, because compaction may rebuild and swap the FAISS index searches read
+        with self._rw_lock.write(), self._store_lock():
+            changed_ids = self._sync_wal()
+            self._compact()
+        
+        if changed_ids:
+            self._notify_listeners(changed_ids)
+    
+    def _refresh(self):
+        """Pick up mutations other worker processes logged since this one last looked."""
+        if self._wal_stat() == (self._wal_identity, self._wal_position):
+            return
+        with self._rw_lock.write(), self._store_lock():
+            changed_ids = self._sync_wal()
+        if changed_ids:
+            self._notify_listeners(changed_ids)
+    
+    def _notify_listeners(self, ids: set):
+        for callback in list(self._listeners):
+            try:
+                callback(ids)
+            except Exception as e:
+                logger.error(f"Vector store listener error: {e}")
+    
+    @staticmethod
+    def _normalize(embedding) -> np.ndarray:
+        """Return the embedding as a unit-length float32 vector, or None if it has zero norm."""
+        vector = np.asarray(embedding, dtype=np.float32)
+        norm = np.linalg.norm(vector)
+        if not norm:
+            return None
+        return vector / norm
+    
+    def _rank(self, query_vector: np.ndarray, k: int, user_role: str):
+        """Row indices and similarities of the k best matches the role may read, best first."""
+        allowed = self._accessible_rows(user_role)
+        if allowed is not None and not len(allowed):
+            return [], []
+        
+        if self._index is not None and (allowed is None or len(allowed) > self.exact_fallback_rows):
+            wanted = min(k, self._size if allowed is None else len(allowed))
+            selector = None if allowed is None else self._role_selector(user_role, allowed)
+            scores, labels = self._index.search(query_vector, wanted, selector)
+            if len(labels) >= wanted:
+                return [self._label_rows[label] for label in labels.tolist()], scores
+            # HNSW can fail to reach enough rows past a filter or deletions; the
+            # matrix is always in memory, so score it exactly instead
+            logger.debug(f"FAISS returned {len(labels)} of {wanted} results, falling back to exact search")
+        
+        return self._rank_exact(query_vector, k, allowed)
+    
+    def _rank_exact(self, query_vector: np.ndarray, k: int, allowed):
+        """_rank by scoring the embedding matrix directly."""
+        # Rows are pre-normalized, so one matrix-vector product gives every cosine similarity
+        if allowed is None:
+            scores = self.embeddings @ query_vector
+            rows = self._top_k(scores, k)
+            return rows, scores[rows]
+        
+        if len(allowed) * 5 < self._size:
+            # Small share of the corpus: gather just those rows and score them. The
+            # gather copies rows, so past about a fifth of them the full product is faster
+            scores = self.embeddings[allowed] @ query_vector
+            top = self._top_k(scores, k)
+            return allowed[top], scores[top]
+        
+        # Most rows are readable: one full product, then knock out the rest
+        scores = self.embeddings @ query_vector
+        masked = np.full_like(scores, -np.inf)
+        masked[allowed] = scores[allowed]
+        rows = self._top_k(masked, min(k, len(allowed)))
+        return rows, scores[rows]
+    
+    def _accessible_rows(self, user_role: str):
+        """Sorted row ids the role may read, or None when it may read every row."""
         # Admin can access everything
         if user_role == 'admin':
-            return True
+            return None
+        
+        bit = _ROLE_BITS.get(user_role, _DEFAULT_ROLE_BIT)
+        rows = self._role_rows.get(bit)
+        if rows is None:
+            rows = np.flatnonzero(self._row_roles & bit)
+            self._role_rows[bit] = rows
+        return rows
+    
+    def _role_selector(self, user_role: str, allowed: np.ndarray):
+        """FAISS id selector restricting an index search to the role's rows."""
+        bit = _ROLE_BITS.get(user_role, _DEFAULT_ROLE_BIT)
+        selector = self._role_selectors.get(bit)
+        if selector is None:
+            labels = np.array([document_label(self.documents[row]['id']) for row in allowed.tolist()], dtype=np.int64)
+            selector = FaissIndex.selector(labels)
+            self._role_selectors[bit] = selector
+        return selector
+    
+    def _reset_access(self):
+        """Recompute the per-row role bitmasks and drop the per-role caches."""
+        self._row_roles = np.array([_source_role_bits(_access_key(doc.get('source', ''))) for doc in self.documents], dtype=np.uint32)
+        self._role_rows = {}
+        self._role_selectors = {}
+    
+    @staticmethod
+    def _top_k(scores: np.ndarray, k: int) -> np.ndarray:
+        """Indices of the k highest scores, best first, without sorting the full array."""
+        if k >= len(scores):
+            return np.argsort(-scores)
+        top = np.argpartition(-scores, k)[:k]
+        return top[np.argsort(-scores[top])]
+    
+    def _append_rows(self, vectors: np.ndarray):
+        """Append normalized rows to the matrix, growing capacity geometrically."""
+        needed = self._size + len(vectors)
+        if self._matrix.shape[1] != vectors.shape[1] or needed > self._matrix.shape[0]:
+            capacity = max(needed, 2 * self._matrix.shape[0], 64)
+            grown = np.empty((capacity, vectors.shape[1]), dtype=np.float32)
+            if self._size:
+                grown[:self._size] = self.embeddings
+            self._matrix = grown
+        self._matrix[self._size:needed] = vectors
+        self._size = needed
+    
+    def _append(self, documents: List[Dict], vectors: np.ndarray):
+        """Append documents with their normalized rows, keeping the ANN index in step."""
+        first_row = self._size
+        self._append_rows(vectors)
+        self.documents.extend(documents)
         
-        # Get document tags
-        doc_tags = document.get('metadata', {}).get('tags', [])
-        doc_source = document.get('source', '')
+        new_roles = [_source_role_bits(_access_key(doc.get('source', ''))) for doc in documents]
+        self._row_roles = np.concatenate([self._row_roles, np.array(new_roles, dtype=np.uint32)])
+        self._role_rows = {}
+        self._role_selectors = {}
         
-        # Role-based access rules
-        role_access_rules = {
-            'developer': ['github', 'slack-dev', 'slack-general', 'uploaded_document'],
-            'marketing': ['slack-marketing', 'outlook', 'slack-general', 'uploaded_document'],
-            'sales': ['slack-sales', 'outlook', 'slack-general', 'uploaded_document'],
-            'user': ['slack-general', 'uploaded_document']  # Default access
-        }
+        if self._index is None:
+            # Builds the index on the first embedding, once the dimension is known
+            self._open_index()
+        else:
+            labels = [document_label(doc['id']) for doc in documents]
+            self._index.add(vectors, np.array(labels, dtype=np.int64))
+            for offset, label in enumerate(labels):
+                self._label_rows[label] = first_row + offset
+    
+    def _remove_ids(self, ids: set):
+        """Drop the documents (and their rows) whose id is in ids."""
+        keep = np.array([doc['id'] not in ids for doc in self.documents], dtype=bool)
+        self.documents = [doc for doc, kept in zip(self.documents, keep) if kept]
+        self._matrix = np.ascontiguousarray(self.embeddings[keep])
+        self._size = len(self.documents)
+        
+        self._row_roles = self._row_roles[keep]
+        self._role_rows = {}
+        self._role_selectors = {}
+        
+        if self._index is not None:
+            self._index.remove([document_label(doc_id) for doc_id in ids])
+            self._label_rows = {document_label(doc['id']): row for row, doc in enumerate(self.documents)}
+    
+    def _set_metadata(self, updates: Dict[str, Dict]) -> List[str]:
+        """Swap in new metadata for the documents whose id is in updates; returns their ids."""
+        updated_ids = []
+        for row, doc in enumerate(self.documents):
+            if doc['id'] in updates:
+                # A new dict, so snapshots from get_documents keep the old one
+                self.documents[row] = {**doc, 'metadata': updates[doc['id']]}
+                updated_ids.append(doc['id'])
+        return updated_ids
+    
+    def _labels(self) -> np.ndarray:
+        return np.array([document_label(doc['id']) for doc in self.documents], dtype=np.int64)
+    
+    def _open_index(self):
+        """Load the persisted FAISS index, or build one from the current matrix."""
+        if self.backend != 'faiss':
+            return
+        if not self._size:
+            # The dimension is unknown until the first embedding arrives
+            return
         
-        allowed_sources = role_access_rules.get(user_role, ['slack-general'])
+        try:
+            index = FaissIndex(self.faiss_index_type, self._matrix.shape[1], self.vector_db_path)
+            labels = self._labels()
+            if not index.load(labels):
+                index.build(self.embeddings, labels)
+            self._index = index
+            self._label_rows = {label: row for row, label in enumerate(labels.tolist())}
+        except Exception as e:
+            logger.error(f"FAISS index unavailable, using exact search: {e}")
+            self.backend = 'exact'
+            self._index = None
+    
+    def _can_access_document(self, document: Dict, user_role: str) -> bool:
+        """Check if user can access a document based on role-based filtering."""
+        # Admin can access everything
+        if user_role == 'admin':
+            return True
         
         # Check if document source is allowed for user role
-        # For uploaded documents, check if the source starts with 'uploaded_document'
-        if doc_source.startswith('uploaded_document'):
-            return 'uploaded_document' in allowed_sources
-        return doc_source in allowed_sources
+        role_bit = _ROLE_BITS.get(user_role, _DEFAULT_ROLE_BIT)
+        return bool(_source_role_bits(_access_key(document.get('source', ''))) & role_bit)
     
     def _load_documents(self):
         """Load documents from disk."""
+        with self._store_lock():
+            try:
+                documents = []
+                if os.path.exists(self.docs_file):
+                    with open(self.docs_file, 'r') as f:
+                        documents = json.load(f)
+                
+                npy_file = os.path.join(self.vector_db_path, 'embeddings.npy')
+                json_file = os.path.join(self.vector_db_path, 'embeddings.json')
+                
+                migrate = False
+                if self.store_format == 'npy' and os.path.exists(npy_file):
+                    self._load_npy_embeddings(documents, npy_file)
+                else:
+                    self._load_json_embeddings(documents, json_file)
+                    migrate = self.store_format == 'npy' and os.path.exists(json_file)
+                
+                # Stores written before the log existed have no document ids. They are
+                # assigned once and saved straight away, so that log records and FAISS
+                # labels referring to them still match after a restart
+                missing_ids = False
+                for doc in self.documents:
+                    if 'id' not in doc:
+                        doc['id'] = uuid.uuid4().hex
+                        missing_ids = True
+                
+                if migrate:
+                    self._migrate_json_to_npy(json_file, npy_file)
+                elif missing_ids:
+                    logger.info("Assigning ids to stored documents")
+                    self._save_documents()
+                
+                self._reset_access()
+                self._open_index()
+                self._replay_wal()
+                
+            except Exception as e:
+                logger.error(f"Load documents error: {e}")
+                self.documents = []
+                self._matrix = np.empty((0, 0), dtype=np.float32)
+                self._size = 0
+                self._reset_access()
+                # Don't retry the failed load on every search
+                self._wal_identity, self._wal_position = self._wal_stat()
+    
+    def _load_npy_embeddings(self, documents: List[Dict], npy_file: str):
+        """Memory-map the binary embedding matrix; rows are already normalized."""
+        # Read-only mapping: worker processes share the page cache, and the first
+        # append copies the matrix into process memory via _append_rows
+        matrix = np.load(npy_file, mmap_mode='r')
+        if matrix.ndim != 2 or matrix.dtype != np.float32:
+            raise ValueError(f"{npy_file} is not a 2-D float32 array")
+        
+        rows = min(len(documents), matrix.shape[0])
+        if rows != len(documents) or rows != matrix.shape[0]:
+            logger.warning(f"Vector store out of sync: {len(documents)} documents, {matrix.shape[0]} embeddings; keeping first {rows}")
+        
+        self.documents = documents[:rows]
+        self._matrix = matrix[:rows]
+        self._size = rows
+    
+    def _load_json_embeddings(self, documents: List[Dict], json_file: str):
+        """Load and normalize embeddings from the legacy JSON format."""
+        embeddings = []
+        if os.path.exists(json_file):
+            with open(json_file, 'r') as f:
+                embeddings = json.load(f)
+        
+        # Documents without a usable embedding were never searchable; drop them
+        # so rows and documents stay aligned
+        rows = []
+        for doc, embedding in zip(documents, embeddings):
+            vector = self._normalize(embedding) if embedding else None
+            if vector is None or (rows and vector.shape != rows[0].shape):
+                logger.warning(f"Skipping stored document without a valid embedding: {doc.get('source', '')}")
+                continue
+            self.documents.append(doc)
+            rows.append(vector)
+        
+        if rows:
+            self._matrix = np.vstack(rows)
+            self._size = len(rows)
+    
+    def _migrate_json_to_npy(self, json_file: str, npy_file: str):
+        """One-shot conversion of a JSON store to the binary format."""
+        logger.info(f"Migrating {json_file} to {npy_file}")
+        self._save_documents()
+        if not os.path.exists(npy_file):
+            logger.error("Migration to binary embeddings failed; keeping JSON store")
+            return
+        
+        # Keep the original around rather than deleting user data
+        os.replace(json_file, json_file + '.migrated')
+        self._load_npy_embeddings(self.documents, npy_file)
+        logger.info(f"Migrated {self._size} embeddings to binary format")
+    
+    def _replay_wal(self) -> set:
+        """Apply logged mutations that are newer than what this process has applied.
+        
+        Returns the ids of chunks deleted or changed. The caller holds the store lock.
+        """
+        if not os.path.exists(self.wal_file):
+            self._new_wal()
+        self._wal_generation = self._read_generation()
+        self._wal_identity, _ = self._wal_stat()
+        
+        known_ids = {doc['id'] for doc in self.documents}
+        added_docs = []
+        added_rows = []
+        deleted_ids = set()
+        updated_metadata = {}
+        records = 0
+        valid_bytes = 0
+        
+        with open(self.wal_file, 'rb') as f:
+            f.seek(self._wal_position)
+            for line in f:
+                try:
+                    record = json.loads(line)
+                except ValueError:
+                    # A torn final write from a crash; everything before it is intact
+                    logger.warning(f"Discarding incomplete write-ahead log tail at byte {self._wal_position + valid_bytes}")
+                    break
+                valid_bytes += len(line)
+                
+                if record['op'] == 'add':
+                    for doc, embedding in zip(record['documents'], record['embeddings']):
+                        # Adds already folded into the snapshot are skipped, so replay is idempotent
+                        if doc['id'] in known_ids:
+                            continue
+                        known_ids.add(doc['id'])
+                        added_docs.append(doc)
+                        added_rows.append(np.frombuffer(base64.b64decode(embedding), dtype=np.float32))
+                elif record['op'] == 'delete':
+                    deleted_ids.update(record['ids'])
+                elif record['op'] == 'update':
+                    # Ids are never reused, so the latest metadata for each wins regardless of order
+                    updated_metadata.update(record['metadata'])
+                elif record['op'] == 'generation':
+                    continue
+                records += 1
+        
+        self._wal_position += valid_bytes
+        self._wal_records += records
+        if self._wal_position < os.path.getsize(self.wal_file):
+            with open(self.wal_file, 'r+b') as f:
+                f.truncate(self._wal_position)
+        
+        if added_rows:
+            self._append(added_docs, np.vstack(added_rows))
+        if updated_metadata:
+            self._set_metadata(updated_metadata)
+        if deleted_ids:
+            self._remove_ids(deleted_ids)
+        
+        if records:
+            logger.info(f"Replayed {records} write-ahead log records ({len(added_docs)} adds, {len(updated_metadata)} updates, {len(deleted_ids)} deletes)")
+        return deleted_ids | set(updated_metadata)
+    
+    def _sync_wal(self) -> set:
+        """Catch up on records other processes logged; the caller holds the write and store locks.
+        
+        Returns the ids of chunks deleted or changed.
+        """
+        identity, size = self._wal_stat()
+        if identity != self._wal_identity or size < self._wal_position or self._read_generation() != self._wal_generation:
+            # Another process compacted the log into a new snapshot
+            return self._reload()
+        if size > self._wal_position:
+            return self._replay_wal()
+        return set()
+    
+    def _reload(self) -> set:
+        """Reload the snapshot and log from disk. Returns the ids of every chunk before or after."""
+        previous_ids = {doc['id'] for doc in self.documents}
+        if self._wal is not None:
+            self._wal.close()
+            self._wal = None
+        self.documents = []
+        self._matrix = np.empty((0, 0), dtype=np.float32)
+        self._size = 0
+        self._index = None
+        self._label_rows = {}
+        self._wal_records = 0
+        self._wal_position = 0
+        
+        logger.info("Vector store was compacted by another process, reloading")
+        self._load_documents()
+        return previous_ids | {doc['id'] for doc in self.documents}
+    
+    def _new_wal(self):
+        """Start an empty log whose first record names its generation."""
+        os.makedirs(self.vector_db_path, exist_ok=True)
+        record = json.dumps({'op': 'generation', 'id': uuid.uuid4().hex}).encode('utf-8') + b'\n'
+        self._write_atomic(self.wal_file, lambda f: f.write(record))
+    
+    def _read_generation(self):
+        """Generation id of the current log; None for logs written before generations."""
+        try:
+            with open(self.wal_file, 'rb') as f:
+                record = json.loads(f.readline())
+        except (OSError, ValueError):
+            return None
+        return record.get('id') if record.get('op') == 'generation' else None
+    
+    def _wal_stat(self):
+        """(device, inode) of the log file, or None if there is none, and its size."""
+        try:
+            stat = os.stat(self.wal_file)
+        except FileNotFoundError:
+            return None, 0
+        return (stat.st_dev, stat.st_ino), stat.st_size
+    
+    @contextmanager
+    def _store_lock(self):
+        """Hold an exclusive lock on the store files across worker processes.
+        
+        Appending to, replaying and compacting the log all happen under it, so
+        one process's compaction can't discard records another has logged. Re-entrant
+        within a process; a no-op where fcntl is unavailable.
+        """
+        with self._save_lock:
+            outermost = not self._lock_depth
+            if outermost and fcntl is not None:
+                if self._lock_handle is None:
+                    os.makedirs(self.vector_db_path, exist_ok=True)
+                    self._lock_handle = open(self.lock_file, 'ab')
+                fcntl.flock(self._lock_handle.fileno(), fcntl.LOCK_EX)
+            self._lock_depth += 1
+            try:
+                yield
+            finally:
+                self._lock_depth -= 1
+                if outermost and fcntl is not None:
+                    fcntl.flock(self._lock_handle.fileno(), fcntl.LOCK_UN)
+    
+    def _append_wal(self, record: Dict):
+        """Append one mutation to the log; the caller holds the write and store locks."""
         try:
-            docs_file = os.path.join(self.vector_db_path, 'documents.json')
-            embeddings_file = os.path.join(self.vector_db_path, 'embeddings.json')
+            if self._wal is None:
+                os.makedirs(self.vector_db_path, exist_ok=True)
+                self._wal = open(self.wal_file, 'ab')
             
-            if os.path.exists(docs_file):
-                with open(docs_file, 'r') as f:
-                    self.documents = json.load(f)
+            line = json.dumps(record).encode('utf-8') + b'\n'
+            self._wal.write(line)
+            self._wal.flush()
+            if self.wal_fsync:
+                os.fsync(self._wal.fileno())
+            self._wal_position += len(line)
+            self._wal_records += 1
             
-            if os.path.exists(embeddings_file):
-                with open(embeddings_file, 'r') as f:
-                    self.embeddings = json.load(f)
-                    
         except Exception as e:
-            logger.error(f"Load documents error: {e}")
-            self.documents = []
-            self.embeddings = []
+            logger.error(f"Write-ahead log error: {e}; falling back to a full save")
+            self._compact()
+            return
+        
+        if self._wal_records >= self.wal_compact_every:
+            self._compact()
+    
+    def _compact(self):
+        """Write a full snapshot, then start a new empty log; the caller holds the write and store locks."""
+        with self._store_lock():
+            if not self._save_documents():
+                return
+            
+            # Replay skips adds already in the snapshot, so a crash between the
+            # snapshot and this swap cannot duplicate documents. The new log's
+            # generation tells other processes to reload
+            if self._wal is not None:
+                self._wal.close()
+                self._wal = None
+            self._new_wal()
+            self._wal_generation = self._read_generation()
+            self._wal_identity, self._wal_position = self._wal_stat()
+            self._wal_records = 0
+            
+            self._save_index()
+    
+    def _save_index(self):
+        """Persist the FAISS index, rebuilding first if deletions or growth call for it."""
+        if self.backend != 'faiss':
+            return
+        try:
+            if self._index is None:
+                self._open_index()
+                if self._index is None:
+                    return
+            
+            labels = self._labels()
+            # HNSW tombstones are not persisted, and IVF retrains once there is enough data
+            if self._index.tombstones or self._index.needs_rebuild:
+                self._index.build(self.embeddings, labels)
+            self._index.save(labels)
+        except Exception as e:
+            logger.error(f"Save FAISS index error: {e}")
     
-    def _save_documents(self):
+    def _save_documents(self) -> bool:
         """Save documents to disk."""
         with self._save_lock:
             try:
                 logger.info(f"Saving documents to: {self.vector_db_path}")
                 os.makedirs(self.vector_db_path, exist_ok=True)
                 
-                docs_file = os.path.join(self.vector_db_path, 'documents.json')
-                embeddings_file = os.path.join(self.vector_db_path, 'embeddings.json')
-                
-                logger.info(f"Saving {len(self.documents)} documents to {docs_file}")
-                with open(docs_file, 'w') as f:
-                    json.dump(self.documents, f, indent=2)
+                logger.info(f"Saving {len(self.documents)} documents to {self.docs_file}")
+                self._write_atomic(self.docs_file, lambda f: f.write(json.dumps(self.documents, indent=2).encode('utf-8')))
                 
-                logger.info(f"Saving {len(self.embeddings)} embeddings to {embeddings_file}")
-                with open(embeddings_file, 'w') as f:
-                    json.dump(self.embeddings, f, indent=2)
+                logger.info(f"Saving {self._size} embeddings to {self.embeddings_file}")
+                if self.store_format == 'npy':
+                    self._write_atomic(self.embeddings_file, lambda f: np.save(f, np.ascontiguousarray(self.embeddings)))
+                else:
+                    self._write_atomic(self.embeddings_file, lambda f: f.write(json.dumps(self.embeddings.tolist(), indent=2).encode('utf-8')))
                 
                 logger.info("Documents saved successfully")
+                return True
                     
             except Exception as e:
                 logger.error(f"Save documents error: {e}")
+                return False
+    
+    @staticmethod
+    def _write_atomic(path: str, write):
+        """Write via a temp file and rename, so readers (and existing mmaps) never see a partial file."""
+        tmp_path = f"{path}.tmp"
+        with open(tmp_path, 'wb') as f:
+            write(f)
+            f.flush()
+            os.fsync(f.fileno())
+        os.replace(tmp_path, path)
@@ -0,0 +1,14 @@
+import os
+import sys
+
+import pytest
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+
+@pytest.fixture
+def store_path(tmp_path, monkeypatch):
+    monkeypatch.setenv('VECTOR_DB_PATH', str(tmp_path))
+    monkeypatch.setenv('VECTOR_BACKEND', 'exact')
+    monkeypatch.setenv('VECTOR_WAL_FSYNC', 'false')
+    return tmp_path
@@ -0,0 +1,49 @@
+import numpy as np
+
+from services.response_cache import ResponseCache
+from services.semantic_cache import SemanticCache
+from services.vector_service import VectorService
+
+
+def _store_with_documents(count):
+    store = VectorService()
+    items = [
+        {'content': f'Chunk {i}', 'source': f'uploaded_document_doc{i}.pdf', 'metadata': {'filename': f'doc{i}.pdf', 'chunk_index': 0}}
+        for i in range(count)
+    ]
+    store.add_documents(items, np.random.default_rng(0).standard_normal((count, 8)).tolist())
+    return store, store.get_documents()
+
+
+def test_response_cache_drops_answers_built_from_changed_chunks(store_path):
+    store, docs = _store_with_documents(3)
+    cache = ResponseCache()
+    store.add_listener(cache.invalidate)
+
+    keys = [cache.key('What changed?', 'admin', [doc]) for doc in docs]
+    for key, doc in zip(keys, docs):
+        cache.put(key, f"Answer from {doc['content']}", [], [doc])
+
+    store.update_metadata({docs[0]['id']: {'filename': 'doc0.pdf', 'chunk_index': 1}})
+    store.delete_document(docs[1]['source'])
+
+    assert cache.get(keys[0]) is None
+    assert cache.get(keys[1]) is None
+    assert cache.get(keys[2])['response'] == 'Answer from Chunk 2'
+    assert cache.stats()['invalidated'] == 2
+
+
+def test_semantic_cache_drops_answers_built_from_deleted_chunks(store_path):
+    store, docs = _store_with_documents(2)
+    cache = SemanticCache()
+    store.add_listener(cache.invalidate)
+
+    questions = np.eye(2).tolist()
+    for question, doc in zip(questions, docs):
+        cache.store('developer', 'question', question, f"Answer from {doc['content']}", [], [doc], tokens=10)
+    assert cache.lookup('developer', questions[0])['response'] == 'Answer from Chunk 0'
+
+    store.delete_ids([docs[0]['id']])
+
+    assert cache.lookup('developer', questions[0]) is None
+    assert cache.lookup('developer', questions[1])['response'] == 'Answer from Chunk 1'
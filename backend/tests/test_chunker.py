@@ -0,0 +1,105 @@
+import random
+
+import pytest
+
+from services.chunker import SentenceChunker, ParagraphChunker
+from services.tokenizer import count_tokens
+
+WORDS = ('alpha', 'beta', 'gamma', 'delta', 'release', 'latency', 'e.g.', '3.14', '"quoted"')
+
+
+def _sentences(count, seed=0, words=(3, 30)):
+    rng = random.Random(seed)
+    sentences = []
+    for _ in range(count):
+        sentence = ' '.join(f"{rng.choice(WORDS)}{rng.randint(0, 10 ** 6)}" for _ in range(rng.randint(*words)))
+        sentences.append(sentence.capitalize() + rng.choice(('.', '?', '!', '."', '...')))
+    return sentences
+
+
+def _prose(sentences):
+    """Join sentences into paragraphs of five."""
+    return ''.join(sentence + ('\n\n' if i % 5 == 4 else ' ') for i, sentence in enumerate(sentences))
+
+
+def _longest(sentences, chunker):
+    return max(count_tokens(sentence, chunker.model) for sentence in sentences)
+
+
+def _squash(text):
+    return ''.join(text.split())
+
+
+@pytest.mark.parametrize('target', [16, 64, 256])
+def test_chunks_stay_within_the_target_and_cover_the_text(target):
+    chunker = SentenceChunker(target, 0)
+    text = _prose(_sentences(400))
+
+    chunks = chunker.chunk(text)
+
+    assert all(count_tokens(chunk, chunker.model) <= target for chunk in chunks)
+    assert _squash(''.join(chunks)) == _squash(text)
+
+
+def test_chunks_end_at_sentence_boundaries():
+    sentences = _sentences(300)
+    chunker = SentenceChunker(2 * _longest(sentences, SentenceChunker()), 0)
+
+    chunks = chunker.chunk(_prose(sentences))
+
+    assert len(chunks) > 10
+    assert all(chunk.endswith(('.', '?', '!', '"')) for chunk in chunks)
+
+
+def test_streamed_pieces_give_the_same_chunks():
+    chunker = SentenceChunker(64, 16)
+    text = _prose(_sentences(300))
+    rng = random.Random(1)
+
+    whole = chunker.chunk(text)
+
+    for _ in range(5):
+        cuts = sorted(rng.sample(range(len(text)), 40))
+        pieces = [text[start:end] for start, end in zip([0] + cuts, cuts + [len(text)])]
+        assert list(chunker.iter_chunks(pieces)) == whole
+
+
+def test_consecutive_chunks_share_whole_trailing_sentences():
+    sentences = _sentences(600, words=(2, 6))
+    longest = _longest(sentences, SentenceChunker())
+    chunker = SentenceChunker(8 * longest, 2 * longest)
+    text = _prose(sentences)
+
+    chunks = chunker.chunk(text)
+
+    shared = 0
+    for previous, chunk in zip(chunks, chunks[1:]):
+        assert chunk not in previous
+        suffixes = [previous[i:].lstrip() for i in range(1, len(previous)) if previous[i - 1].isspace()]
+        overlap = next((suffix for suffix in suffixes if chunk.startswith(suffix)), '')
+        if overlap:
+            shared += 1
+            assert previous[:-len(overlap)].rstrip()[-1] in '.?!"'
+    assert shared == len(chunks) - 1
+
+
+def test_sentence_over_the_target_is_split_on_its_own():
+    chunker = SentenceChunker(32, 0)
+    text = 'Short opening sentence. ' + ' '.join(f"word{i}" for i in range(2000)) + '. Short closing sentence.'
+
+    chunks = chunker.chunk(text)
+
+    assert chunks[0] == 'Short opening sentence.'
+    assert chunks[-1].endswith('Short closing sentence.')
+    assert all(count_tokens(chunk, chunker.model) <= 32 for chunk in chunks)
+    assert _squash(''.join(chunks)) == _squash(text)
+
+
+def test_paragraph_chunker_breaks_at_single_newlines():
+    chunker = ParagraphChunker(64, 0)
+    lines = [' '.join(f"cell{row}x{column}" for column in range(6)) for row in range(200)]
+
+    chunks = chunker.chunk('\n'.join(lines))
+
+    assert all(count_tokens(chunk, chunker.model) <= 64 for chunk in chunks)
+    assert [line for chunk in chunks for line in chunk.split('\n')] == lines
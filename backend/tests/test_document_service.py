@@ -0,0 +1,102 @@
+import hashlib
+
+import numpy as np
+import pytest
+from docx import Document
+
+import services.document_service as document_service
+from services.vector_service import VectorService
+
+
+class FakeLLMService:
+    """Deterministic embeddings derived from each text's hash."""
+
+    client = object()
+
+    def __init__(self):
+        self.embedded = 0
+
+    def get_embeddings_batch(self, texts, deadline=None):
+        self.embedded += len(texts)
+        return [self.embed(text) for text in texts]
+
+    @staticmethod
+    def embed(text):
+        seed = int(hashlib.sha256(text.encode('utf-8')).hexdigest()[:8], 16)
+        return np.random.default_rng(seed).standard_normal(8).tolist()
+
+
+def _write_docx(path, paragraphs):
+    document = Document()
+    for paragraph in paragraphs:
+        document.add_paragraph(paragraph)
+    document.save(path)
+    return str(path)
+
+
+def _paragraphs(count, changed=()):
+    return [
+        ('Revised' if i in changed else 'Original') + f' paragraph {i}. ' + ' '.join(f'word{i}x{j}' for j in range(200))
+        for i in range(count)
+    ]
+
+
+def _snapshot(store):
+    return {doc['id']: (doc['content'], doc['metadata']) for doc in store.get_documents()}
+
+
+@pytest.fixture
+def service(store_path, tmp_path, monkeypatch):
+    monkeypatch.setenv('DOCUMENT_INDEX_BATCH_SIZE', '2')
+    store = VectorService()
+    store.llm_service = FakeLLMService()
+    monkeypatch.setattr(document_service, 'get_vector_service', lambda: store)
+    service = document_service.DocumentService()
+    service.upload_dir = str(tmp_path)
+    return service
+
+
+def test_replace_reuses_unchanged_chunks(service, tmp_path):
+    first = service.process_document(_write_docx(tmp_path / 'v1.docx', _paragraphs(6)), 'notes.docx', 'developer')
+    embedded = service.vector_service.llm_service.embedded
+
+    result = service.process_document(_write_docx(tmp_path / 'v2.docx', _paragraphs(6, changed={2})), 'notes.docx', 'developer', replace_existing=True)
+
+    assert result['success'] and result['replaced']
+    assert result['chunks_reused'] > 0 and result['chunks_embedded'] > 0
+    assert service.vector_service.llm_service.embedded - embedded == result['chunks_embedded']
+    assert result['chunks_removed'] == result['chunks_embedded']
+    assert service.vector_service.count() == result['total_chunks'] == first['total_chunks']
+
+
+def test_failed_replace_restores_the_previous_version(service, tmp_path, monkeypatch):
+    service.process_document(_write_docx(tmp_path / 'v1.docx', _paragraphs(6)), 'notes.docx', 'developer')
+    before = _snapshot(service.vector_service)
+
+    add_documents = service.vector_service.add_documents
+    calls = []
+
+    def failing_add(items, embeddings=None):
+        calls.append(1)
+        if len(calls) == 2:
+            raise RuntimeError('disk full')
+        return add_documents(items, embeddings)
+
+    monkeypatch.setattr(service.vector_service, 'add_documents', failing_add)
+    result = service.process_document(_write_docx(tmp_path / 'v2.docx', _paragraphs(6, changed={0, 4, 5})), 'notes.docx', 'developer', replace_existing=True)
+
+    assert not result['success']
+    assert len(calls) == 2
+    assert _snapshot(service.vector_service) == before
+
+
+def test_replace_during_an_embedding_outage_keeps_the_previous_version(service, tmp_path, monkeypatch):
+    service.process_document(_write_docx(tmp_path / 'v1.docx', _paragraphs(6)), 'notes.docx', 'developer')
+    before = _snapshot(service.vector_service)
+
+    # get_embeddings_batch returns no embeddings when the provider is down, and add_documents skips the batch
+    monkeypatch.setattr(service.vector_service.llm_service, 'get_embeddings_batch', lambda texts, deadline=None: [])
+    result = service.process_document(_write_docx(tmp_path / 'v2.docx', _paragraphs(6, changed={0, 4, 5})), 'notes.docx', 'developer', replace_existing=True)
+
+    assert not result['success']
+    assert _snapshot(service.vector_service) == before
@@ -0,0 +1,113 @@
+import threading
+import time
+
+import pytest
+
+from services.deadline import Deadline, DeadlineExceeded
+from services.singleflight import SingleFlight
+
+
+def _wait_until(condition, timeout=5):
+    expires_at = time.monotonic() + timeout
+    while not condition():
+        assert time.monotonic() < expires_at, "condition not reached"
+        time.sleep(0.005)
+
+
+def _call_in_threads(flights, key, fn, count, **kwargs):
+    """Start `count` callers of flights.do, the first as leader; returns their outcomes once done."""
+    outcomes = [None] * count
+
+    def call(i):
+        try:
+            outcomes[i] = ('result', flights.do(key, fn, **kwargs))
+        except Exception as e:
+            outcomes[i] = ('error', e)
+
+    threads = [threading.Thread(target=call, args=(i,)) for i in range(count)]
+    threads[0].start()
+    _wait_until(lambda: flights.summary()['in_flight'] == 1)
+    for thread in threads[1:]:
+        thread.start()
+    _wait_until(lambda: flights.summary()['coalesced'] == count - 1)
+    return threads, outcomes
+
+
+def test_error_reaches_every_caller_and_frees_the_key():
+    flights = SingleFlight('test')
+    release = threading.Event()
+    calls = []
+
+    def fail():
+        calls.append(1)
+        release.wait(5)
+        raise ValueError('upstream failed')
+
+    threads, outcomes = _call_in_threads(flights, 'key', fail, 4)
+    release.set()
+    for thread in threads:
+        thread.join(5)
+
+    assert len(calls) == 1
+    assert [kind for kind, _ in outcomes] == ['error'] * 4
+    assert all(isinstance(error, ValueError) for _, error in outcomes)
+    assert flights.summary()['in_flight'] == 0
+    assert flights.do('key', lambda: 'fresh') == 'fresh'
+
+
+def test_waiter_retries_once_after_a_timed_out_flight():
+    flights = SingleFlight('test')
+    release = threading.Event()
+    calls = []
+
+    def flaky():
+        calls.append(1)
+        if len(calls) == 1:
+            release.wait(5)
+            raise TimeoutError('read timeout')
+        return 'answer'
+
+    threads, outcomes = _call_in_threads(flights, 'key', flaky, 2)
+    release.set()
+    for thread in threads:
+        thread.join(5)
+
+    assert isinstance(outcomes[0][1], TimeoutError)
+    assert outcomes[1] == ('result', 'answer')
+    assert len(calls) == 2
+
+
+def test_expired_caller_does_not_cancel_the_flight_for_others():
+    flights = SingleFlight('test')
+    release = threading.Event()
+
+    def slow():
+        release.wait(5)
+        return 'answer'
+
+    leader_error = []
+
+    def lead():
+        try:
+            flights.do('key', slow, deadline=Deadline(0.05))
+        except DeadlineExceeded as e:
+            leader_error.append(e)
+
+    leader = threading.Thread(target=lead)
+    leader.start()
+    _wait_until(lambda: flights.summary()['in_flight'] == 1)
+    leader.join(5)
+    assert leader_error
+
+    threading.Timer(0.05, release.set).start()
+    assert flights.do('key', slow, deadline=Deadline(5)) == 'answer'
+    assert flights.summary()['calls'] == 1
+
+
+def test_caller_past_its_deadline_raises_without_calling():
+    flights = SingleFlight('test')
+    deadline = Deadline(0)
+
+    with pytest.raises(DeadlineExceeded):
+        flights.do('key', lambda: 'answer', deadline=deadline)
+    assert flights.summary()['calls'] == 0
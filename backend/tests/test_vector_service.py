@@ -0,0 +1,74 @@
+import json
+
+import numpy as np
+import pytest
+
+from services.vector_service import VectorService
+
+
+def _legacy_documents(count):
+    # Documents as written before the store had ids or a write-ahead log
+    return [
+        {
+            'content': f'Old chunk {i}',
+            'source': 'uploaded_document_old.pdf',
+            'metadata': {'filename': 'old.pdf', 'chunk_index': i},
+            'user_role': 'admin'
+        }
+        for i in range(count)
+    ]
+
+
+@pytest.mark.parametrize('embeddings_format', ['json', 'npy'])
+def test_wal_replay_matches_documents_stored_without_ids(store_path, embeddings_format):
+    vectors = np.random.default_rng(0).standard_normal((5, 8)).astype(np.float32)
+    (store_path / 'documents.json').write_text(json.dumps(_legacy_documents(5)))
+    if embeddings_format == 'json':
+        (store_path / 'embeddings.json').write_text(json.dumps(vectors.tolist()))
+    else:
+        vectors /= np.linalg.norm(vectors, axis=1, keepdims=True)
+        np.save(store_path / 'embeddings.npy', vectors)
+
+    store = VectorService()
+    ids = [doc['id'] for doc in store.get_documents()]
+    assert store.update_metadata({ids[0]: {'filename': 'old.pdf', 'chunk_index': 7}}) == 1
+    assert store.delete_ids(ids[3:]) == 2
+
+    restarted = VectorService()
+    assert [doc['id'] for doc in restarted.get_documents()] == ids[:3]
+    assert restarted.get_documents()[0]['metadata']['chunk_index'] == 7
+
+    assert VectorService().delete_document('uploaded_document_old.pdf') == 3
+    assert VectorService().count() == 0
+
+
+def test_compaction_keeps_records_logged_by_other_processes(store_path):
+    vectors = np.random.default_rng(2).standard_normal((4, 8)).tolist()
+    first, second = VectorService(), VectorService()
+
+    assert first.add_documents([{'content': 'From first', 'source': 'github', 'metadata': {}}], vectors[:1]) == 1
+    assert second.add_documents([{'content': 'From second', 'source': 'github', 'metadata': {}}], vectors[1:2]) == 1
+    first.save()
+    assert second.add_documents([{'content': 'After compaction', 'source': 'github', 'metadata': {}}], vectors[2:3]) == 1
+    assert first.delete_document('missing') == 0
+
+    assert first.count() == 3
+    assert sorted(doc['content'] for doc in VectorService().get_documents()) == ['After compaction', 'From first', 'From second']
+
+
+@pytest.mark.parametrize('exact_fallback_rows', ['0', '2048'])
+def test_hnsw_search_fills_limit_for_restrictive_roles(store_path, monkeypatch, exact_fallback_rows):
+    pytest.importorskip('faiss')
+    monkeypatch.setenv('VECTOR_BACKEND', 'faiss')
+    monkeypatch.setenv('FAISS_INDEX_TYPE', 'hnsw')
+    monkeypatch.setenv('FAISS_EXACT_FALLBACK_ROWS', exact_fallback_rows)
+
+    rng = np.random.default_rng(1)
+    store = VectorService()
+    items = [{'content': f'Commit {i}', 'source': 'github', 'metadata': {}} for i in range(2000)]
+    items += [{'content': f'Message {i}', 'source': 'slack-general', 'metadata': {}} for i in range(10)]
+    assert store.add_documents(items, rng.standard_normal((len(items), 16)).tolist()) == len(items)
+    assert store.delete_ids([doc['id'] for doc in store.get_documents()[:200]]) == 200
+
+    rows, _ = store._rank(store._normalize(rng.standard_normal(16)), 10, 'user')
+    assert sorted(store.documents[row]['content'] for row in rows) == [f'Message {i}' for i in range(10)]